@@ -4,7 +4,8 @@ from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 
 from alembic import context
-from database import Base 
+from backend.database import Base
+from backend import models  # noqa: F401  (target_metadata 에 테이블 등록)
 import os
 from dotenv import load_dotenv
 
@@ -17,6 +18,12 @@ config = context.config
 # .env 또는 Railway Variables 에서 DB URL 가져오기
 database_url = os.getenv("DATABASE_URL_SYNC") or os.getenv("DATABASE_URL")
 if database_url:
+    # 마이그레이션은 동기 엔진으로 돌기 때문에 async 드라이버 URL 을 동기 드라이버로 바꿔준다
+    database_url = (
+        database_url.replace("postgres://", "postgresql://", 1)
+        .replace("+asyncpg", "")
+        .replace("+aiosqlite", "")
+    )
     config.set_main_option("sqlalchemy.url", database_url)
 
 # 로깅 설정
@@ -0,0 +1,62 @@
+"""funding_rates: unique (exchange, symbol)
+
+Revision ID: 2a8fa36a35c0
+Revises: 
+Create Date: 2026-10-17 10:12:04.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2a8fa36a35c0'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+
+    # 마이그레이션 도입 전에 만들어진 DB 는 테이블이 이미 있으므로 없을 때만 생성
+    if not sa.inspect(bind).has_table("funding_rates"):
+        op.create_table(
+            "funding_rates",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("symbol", sa.String(), nullable=False),
+            sa.Column("exchange", sa.String(), nullable=False),
+            sa.Column("funding_rate", sa.Float()),
+            sa.Column("next_funding_time", sa.DateTime(timezone=True)),
+            sa.Column("timestamp", sa.DateTime(timezone=True)),
+            sa.UniqueConstraint("exchange", "symbol", name="uq_funding_rates_exchange_symbol"),
+        )
+        op.create_index("ix_funding_rates_id", "funding_rates", ["id"])
+        op.create_index("ix_funding_rates_symbol", "funding_rates", ["symbol"])
+        return
+
+    # 기존 데이터 정리: 키가 비어있는 행 / (exchange, symbol) 중복 행은 최신 id 만 남김
+    op.execute("DELETE FROM funding_rates WHERE exchange IS NULL OR symbol IS NULL")
+    op.execute(
+        "DELETE FROM funding_rates WHERE id NOT IN ("
+        "SELECT MAX(id) FROM funding_rates GROUP BY exchange, symbol)"
+    )
+
+    # SQLite 는 ALTER 로 제약조건을 못 붙이므로 batch 모드(테이블 재생성) 사용
+    with op.batch_alter_table("funding_rates") as batch_op:
+        batch_op.alter_column("symbol", existing_type=sa.String(), nullable=False)
+        batch_op.alter_column("exchange", existing_type=sa.String(), nullable=False)
+        batch_op.create_unique_constraint(
+            "uq_funding_rates_exchange_symbol", ["exchange", "symbol"]
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("funding_rates") as batch_op:
+        batch_op.drop_constraint("uq_funding_rates_exchange_symbol", type_="unique")
+        batch_op.alter_column("exchange", existing_type=sa.String(), nullable=True)
+        batch_op.alter_column("symbol", existing_type=sa.String(), nullable=True)
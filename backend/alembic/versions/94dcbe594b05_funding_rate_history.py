@@ -0,0 +1,41 @@
+"""funding_rate_history: append-only minute history
+
+Revision ID: 94dcbe594b05
+Revises: 2a8fa36a35c0
+Create Date: 2026-10-17 11:03:41.527904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '94dcbe594b05'
+down_revision: Union[str, Sequence[str], None] = '2a8fa36a35c0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Postgres: ts 기준 RANGE 파티션 부모 테이블만 만들고, 월별 파티션은
+    # update_task 가 저장 직전에 CREATE TABLE IF NOT EXISTS ... PARTITION OF 로 만든다.
+    # SQLite 는 파티션 옵션을 무시하고 일반 테이블로 생성된다.
+    op.create_table(
+        "funding_rate_history",
+        sa.Column("exchange", sa.String(16), nullable=False),
+        sa.Column("symbol", sa.String(32), nullable=False),
+        sa.Column("ts", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("funding_rate", sa.Float(), nullable=False),
+        sa.Column("next_funding_time", sa.DateTime(timezone=True)),
+        sa.PrimaryKeyConstraint("exchange", "symbol", "ts", name="pk_funding_rate_history"),
+        postgresql_partition_by="RANGE (ts)",
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Postgres 에서는 부모 테이블을 지우면 파티션도 같이 삭제된다
+    op.drop_table("funding_rate_history")
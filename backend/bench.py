@@ -0,0 +1,263 @@
+import argparse, asyncio, json, logging, os, socket, tempfile, threading, time
+from datetime import datetime
+
+# 오프라인 벤치마크: 로컬 가짜 거래소 서버(fake_exchange)에 update_task / binance_ws / ws_router 를 붙이고
+# /ws/positions/all 클라이언트까지 끝에서 끝으로 잰다. 결과는 JSON 으로 저장해서 실행끼리 비교.
+#   python -m backend.bench --symbols 500 --positions 20 --rate 5 --clients 20 --duration 30
+# - 갱신 시간: refresh_funding_rates(force_rest=True) 를 --refreshes 번 (REST + 파싱 + SQLite 저장)
+# - 틱→클라이언트 지연: 가짜 서버가 마크를 보낸 시각 → 클라이언트가 그 마크가 담긴 프레임을 받은 시각
+# - 틱당 CPU: 서비스 스레드(메인 루프) CPU 시간 / 서비스가 받은 WS 프레임 수
+#   가짜 거래소와 측정 클라이언트는 별도 스레드 루프에서 돌아서 서비스 CPU 에 섞이지 않는다.
+
+# 네트워크 / 실제 키 없이 import 되도록 기본값 (이미 설정돼 있으면 그대로)
+BENCH_DIR = tempfile.mkdtemp(prefix="usdt-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{BENCH_DIR}/bench.db")
+for key in ("BINANCE_API_KEY", "BINANCE_API_SECRET", "BITGET_API_KEY", "BITGET_API_SECRET", "BITGET_API_PASS"):
+    os.environ.setdefault(key, "bench")
+
+import orjson, uvicorn, websocket, websockets
+
+from backend import fanout, exchange_clients, tick_trace, update_task
+from backend.database import engine, Base
+from backend.fake_exchange import FakeMarket, FakeExchange
+from backend.main import app
+from backend.position_store import store
+from backend.routers import binance_ws, ws_router, unified_ws
+
+WARMUP_SEC = 3   # 구독 / 첫 스냅샷이 자리잡을 때까지 측정 제외
+
+log = logging.getLogger("bench")
+
+
+def percentiles(values: list, points=(50, 90, 99)) -> dict:
+    if not values:
+        return {"samples": 0}
+    values = sorted(values)
+    result = {"samples": len(values)}
+    for p in points:
+        result[f"p{p}"] = round(values[min(int(len(values) * p / 100), len(values) - 1)], 3)
+    result["max"] = round(values[-1], 3)
+    result["mean"] = round(sum(values) / len(values), 3)
+    return result
+
+
+def histogram_means(histogram) -> dict:
+    """metrics 히스토그램 → {"라벨.라벨": 평균 ms}"""
+    result = {}
+    for labels, series in histogram.series.items():
+        count = sum(series[:-1])
+        result[".".join(labels)] = round(series[-1] / count * 1000, 3) if count else None
+    return result
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class BenchBitgetWs:
+    """pybitget BitgetWsClient 와 같은 방식(websocket-client 스레드 콜백)으로 가짜 Bitget 에 붙는 연결.
+    ws_router 가 쓰는 subscribe / unsubscribe / close 만 있다."""
+
+    def __init__(self, url: str):
+        self.app = websocket.WebSocketApp(url, on_message=lambda ws, msg: ws_router.on_message(msg))
+        self.opened = threading.Event()
+        self.app.on_open = lambda ws: self.opened.set()
+        threading.Thread(target=self.app.run_forever, daemon=True).start()
+        self.opened.wait(5)
+
+    def send(self, op: str, channels):
+        self.app.send(orjson.dumps({"op": op, "args": [
+            {"instType": c.inst_type, "channel": c.channel, "instId": c.inst_id} for c in channels
+        ]}).decode())
+
+    def subscribe(self, channels, listener=None):
+        self.send("subscribe", channels)
+
+    def unsubscribe(self, channels, listener=None):
+        self.send("unsubscribe", channels)
+
+    def close(self):
+        self.app.close()
+
+
+class ExchangeThread:
+    """가짜 거래소 + 측정 클라이언트를 돌리는 별도 스레드 이벤트 루프"""
+
+    def __init__(self, market: FakeMarket, rate_hz: float):
+        self.market = market
+        self.server = FakeExchange(market, rate_hz)
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.latencies = []       # ms
+        self.frames_received = 0
+        self.bytes_received = 0
+        self.measuring = False
+        threading.Thread(target=self.run, daemon=True).start()
+        self.ready.wait()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.server.start())
+        self.ready.set()
+        self.loop.run_forever()
+
+    def call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def client(self, url: str):
+        """통합 엔드포인트 구독 클라이언트: 마크가 바뀐 행마다 가짜 서버 전송 시각과 비교"""
+        last_marks = {}
+        async with websockets.connect(url, max_size=None) as ws:
+            async for raw in ws:
+                received = time.perf_counter()
+                if not self.measuring:
+                    continue
+                self.frames_received += 1
+                self.bytes_received += len(raw)
+                for row in orjson.loads(raw):
+                    if "msg" in row:
+                        continue
+                    key = (row["exchange"], row["symbol"])
+                    mark = row.get("markPrice")
+                    if mark is None or last_marks.get(key) == mark:
+                        continue
+                    last_marks[key] = mark
+                    sent = self.market.sent_at.get((row["exchange"], row["symbol"], mark))
+                    if sent is not None:
+                        self.latencies.append((received - sent) * 1000)
+
+
+async def run_refreshes(count: int) -> dict:
+    totals, network, parse, db = [], {}, {}, []
+    for _ in range(count):
+        timings = await update_task.refresh_funding_rates(force_rest=True)
+        totals.append(timings["total"] * 1000)
+        db.append(timings.get("db", 0) * 1000)
+        for name in update_task.EXCHANGES:
+            network.setdefault(name, []).append(timings[name].get("network", 0) * 1000)
+            parse.setdefault(name, []).append(timings[name].get("parse", 0) * 1000)
+    return {
+        "total_ms": percentiles(totals),
+        "db_ms": percentiles(db),
+        "network_ms": {name: percentiles(v) for name, v in network.items()},
+        "parse_ms": {name: percentiles(v) for name, v in parse.items()},
+    }
+
+
+async def bench(args) -> dict:
+    market = FakeMarket(args.symbols, args.positions, seed=args.seed)
+    exchange = ExchangeThread(market, args.rate)
+    base, ws_base = exchange.server.base_url, exchange.server.ws_url
+
+    # 서비스 모듈을 가짜 서버로 연결
+    update_task.BINANCE_URL = f"{base}/fapi/v1/premiumIndex"
+    update_task.BITGET_CONTRACTS_URL = f"{base}/api/v2/mix/market/contracts"
+    update_task.BITGET_FUNDING_URL = f"{base}/api/v2/mix/market/current-fund-rate"
+    tick_trace.BINANCE_TIME_URL = f"{base}/fapi/v1/time"
+    tick_trace.BITGET_TIME_URL = f"{base}/api/v2/public/time"
+    binance_ws.MARK_STREAM_URL = f"{ws_base}/stream"
+    binance_ws.USER_STREAM_URL = f"{ws_base}/ws/"
+    client = exchange_clients.ScheduledBinanceClient("bench", "bench")  # create() 는 실서버 ping 이라 직접 생성
+    client.FUTURES_URL = f"{base}/fapi"
+    exchange_clients.binance_client = client
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    # 1) 펀딩레이트 갱신
+    log.info(f"⏱ 펀딩레이트 갱신 {args.refreshes}회")
+    refresh = await run_refreshes(args.refreshes)
+
+    # 2) 포지션 스트림 → 통합 WS 클라이언트
+    clock_task = asyncio.create_task(tick_trace.clock_sync_loop(update_task.get_http_client))
+    fanout.scheduler.start(unified_ws.flush)
+    store.start()
+    ws_router.loop = binance_ws.loop = asyncio.get_running_loop()
+    ws_router.bitget_ws = BenchBitgetWs(f"{ws_base}/bitget")
+    await binance_ws.binance_start()
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    for _ in range(args.clients):
+        exchange.call(exchange.client(f"ws://127.0.0.1:{port}/ws/positions/all"))
+
+    await asyncio.sleep(WARMUP_SEC)
+    frames_before = market.frames
+    flushes_before = fanout.scheduler.flushes
+    cpu_before, process_before = time.thread_time(), time.process_time()
+    exchange.measuring = True
+    await asyncio.sleep(args.duration)
+    exchange.measuring = False
+    service_cpu = time.thread_time() - cpu_before
+    process_cpu = time.process_time() - process_before
+    ticks = market.frames - frames_before
+
+    server.should_exit = True
+    await server_task
+    clock_task.cancel()
+    ws_router.bitget_ws.close()
+    await exchange_clients.close_exchange_clients()
+    await update_task.close_http_client()
+    await asyncio.wrap_future(exchange.call(exchange.server.stop()))
+
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        "refresh": refresh,
+        "tick_to_client_ms": percentiles(exchange.latencies),
+        "tick_stage_mean_ms": histogram_means(tick_trace.latency_seconds),
+        "cpu": {
+            "service_thread_sec": round(service_cpu, 4),
+            "process_sec": round(process_cpu, 4),
+            "ticks": ticks,
+            "ticks_per_sec": round(ticks / args.duration, 1),
+            "service_us_per_tick": round(service_cpu / ticks * 1e6, 2) if ticks else None,
+            "service_utilization_pct": round(service_cpu / args.duration * 100, 1),
+        },
+        "clients": {
+            "frames_received": exchange.frames_received,
+            "bytes_received": exchange.bytes_received,
+            "flushes": fanout.scheduler.flushes - flushes_before,
+        },
+        "ingest": store.stats(),
+        "broadcast": fanout.scheduler.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 가짜 거래소로 갱신 시간 / 틱→클라이언트 지연 / 틱당 CPU 측정")
+    parser.add_argument("--symbols", type=int, default=500, help="거래소별 심볼 수")
+    parser.add_argument("--positions", type=int, default=20, help="양 거래소에 열린 포지션 심볼 수")
+    parser.add_argument("--rate", type=float, default=5, help="마크프라이스 tick 빈도 (Hz, 심볼당)")
+    parser.add_argument("--clients", type=int, default=10, help="/ws/positions/all 클라이언트 수")
+    parser.add_argument("--duration", type=float, default=20, help="측정 시간 (초)")
+    parser.add_argument("--refreshes", type=int, default=5, help="펀딩레이트 갱신 반복 횟수")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default=None, help="결과 JSON 경로 (기본 bench-results/bench-<시각>.json)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    log.setLevel(logging.INFO)
+
+    result = asyncio.run(bench(args))
+
+    out = args.out or os.path.join("bench-results", f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+    latency = result["tick_to_client_ms"]
+    log.info(
+        f"📊 갱신 p50={result['refresh']['total_ms'].get('p50')}ms | "
+        f"틱→클라이언트 p50={latency.get('p50')}ms p99={latency.get('p99')}ms | "
+        f"틱당 CPU={result['cpu']['service_us_per_tick']}µs ({result['cpu']['ticks_per_sec']} 틱/초) → {out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
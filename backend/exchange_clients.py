@@ -0,0 +1,170 @@
+import asyncio, json, logging, os
+import httpx
+from dotenv import load_dotenv
+from binance import AsyncClient as BinanceAsyncClient
+from pybitget import utils as bitget_utils
+from pybitget.enums import (
+    API_URL as BITGET_API_URL, GET, POST,
+    MIX_MARKET_V1_URL, MIX_ACCOUNT_V1_URL, MIX_POSITION_V1_URL, MIX_ORDER_V1_URL,
+)
+from pybitget.exceptions import BitgetAPIException, BitgetRequestException
+from backend import rate_limit
+
+# 주문/포지션 경로에서 쓰는 거래소 async 클라이언트 (프로세스당 하나, 연결 재사용)
+# binance.client.Client / pybitget.Client 는 requests 기반 동기 호출이라 이벤트 루프를 막는다.
+# 모든 REST 호출은 rate_limit 스케줄러에서 예산을 받은 뒤 나간다.
+
+load_dotenv()
+BINANCE_KEY = os.getenv("BINANCE_API_KEY")
+BINANCE_SECRET = os.getenv("BINANCE_API_SECRET")
+BITGET_KEY = os.getenv("BITGET_API_KEY")
+BITGET_SECRET = os.getenv("BITGET_API_SECRET")
+BITGET_PASS = os.getenv("BITGET_API_PASS")
+
+BITGET_TIMEOUT = 5.0
+
+log = logging.getLogger("exchange-clients")
+
+# Binance 선물 엔드포인트별 IP weight (표에 없으면 1)
+BINANCE_WEIGHTS = {
+    "account": 5,
+    "balance": 5,
+    "positionRisk": 5,
+    "premiumIndex": 10,
+    "userTrades": 5,
+}
+
+binance_client = None
+binance_lock = asyncio.Lock()
+bitget_client = None
+
+
+class ScheduledBinanceClient(BinanceAsyncClient):
+    """선물 API 호출 전 rate_limit.binance 에서 weight 를 받고, 응답 헤더로 예산을 보정"""
+
+    async def _request_futures_api(self, method, path, signed=False, version=1, **kwargs):
+        await rate_limit.binance.acquire(BINANCE_WEIGHTS.get(path, 1))
+        return await super()._request_futures_api(method, path, signed, version, **kwargs)
+
+    async def _handle_response(self, response):
+        # 생성 시 ping 등 현물 API 응답은 weight 한도가 달라서 선물(fapi) 응답만 반영
+        if response.url.host.startswith("fapi"):
+            rate_limit.binance.observe(response.status, response.headers)
+        return await super()._handle_response(response)
+
+
+async def get_binance_client() -> BinanceAsyncClient:
+    """공유 Binance AsyncClient 반환 (없으면 생성)"""
+    global binance_client
+    async with binance_lock:
+        if binance_client is None:
+            binance_client = await ScheduledBinanceClient.create(BINANCE_KEY, BINANCE_SECRET)
+    return binance_client
+
+
+class BitgetAsyncClient:
+    """pybitget.Client 와 같은 서명/엔드포인트를 httpx(HTTP/2, keep-alive)로 호출하는 async 버전.
+    주문 경로에서 쓰는 메서드만 같은 이름/인자로 옮겼다."""
+
+    def __init__(self, api_key, secret_key, passphrase):
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.passphrase = passphrase
+        self.http = httpx.AsyncClient(
+            base_url=BITGET_API_URL,
+            http2=True,
+            timeout=BITGET_TIMEOUT,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+        )
+
+    async def request(self, method: str, request_path: str, params: dict):
+        if method == GET and params:
+            request_path = request_path + bitget_utils.parse_params_to_str(params)
+        body = json.dumps(params) if method == POST else ""
+
+        timestamp = bitget_utils.get_timestamp()
+        sign = bitget_utils.sign(
+            bitget_utils.pre_hash(timestamp, method, request_path, body), self.secret_key
+        )
+        header = bitget_utils.get_header(self.api_key, sign.decode(), timestamp, self.passphrase)
+
+        await rate_limit.bitget.acquire()
+        response = await self.http.request(method, request_path, content=body or None, headers=header)
+        rate_limit.bitget.observe(response.status_code, response.headers)
+        if not response.is_success:
+            raise BitgetAPIException(response)
+        try:
+            return response.json()
+        except ValueError:
+            raise BitgetRequestException(f"Invalid Response: {response.text}")
+
+    async def mix_get_accounts(self, productType):
+        return await self.request(GET, MIX_ACCOUNT_V1_URL + "/accounts", {"productType": productType})
+
+    async def mix_get_market_price(self, symbol):
+        return await self.request(GET, MIX_MARKET_V1_URL + "/mark-price", {"symbol": symbol})
+
+    async def mix_get_symbols_info(self, productType):
+        return await self.request(GET, MIX_MARKET_V1_URL + "/contracts", {"productType": productType})
+
+    async def mix_adjust_margintype(self, symbol, marginCoin, marginMode):
+        return await self.request(POST, MIX_ACCOUNT_V1_URL + "/setMarginMode", {
+            "symbol": symbol, "marginCoin": marginCoin, "marginMode": marginMode,
+        })
+
+    async def mix_adjust_leverage(self, symbol, marginCoin, leverage, holdSide=None):
+        params = {"symbol": symbol, "marginCoin": marginCoin, "leverage": leverage}
+        if holdSide is not None:
+            params["holdSide"] = holdSide
+        return await self.request(POST, MIX_ACCOUNT_V1_URL + "/setLeverage", params)
+
+    async def mix_get_single_position(self, symbol, marginCoin=None):
+        params = {"symbol": symbol}
+        if marginCoin is not None:
+            params["marginCoin"] = marginCoin
+        return await self.request(GET, MIX_POSITION_V1_URL + "/singlePosition", params)
+
+    async def mix_place_order(self, symbol, marginCoin, size, side, orderType,
+                              price="", clientOrderId=None, reduceOnly=False, timeInForceValue="normal"):
+        params = {
+            "symbol": symbol,
+            "marginCoin": marginCoin,
+            "price": price,
+            "size": size,
+            "side": side,
+            "orderType": orderType,
+            "reduceOnly": reduceOnly,
+            "timeInForceValue": timeInForceValue,
+        }
+        if clientOrderId is not None:
+            params["clientOid"] = clientOrderId
+        return await self.request(POST, MIX_ORDER_V1_URL + "/placeOrder", params)
+
+    async def mix_get_order_details(self, symbol, orderId=None, clientOrderId=None):
+        params = {"symbol": symbol}
+        if orderId is not None:
+            params["orderId"] = orderId
+        if clientOrderId is not None:
+            params["clientOid"] = clientOrderId
+        return await self.request(GET, MIX_ORDER_V1_URL + "/detail", params)
+
+    async def close(self):
+        await self.http.aclose()
+
+
+def get_bitget_client() -> BitgetAsyncClient:
+    """공유 Bitget async 클라이언트 반환 (없으면 생성)"""
+    global bitget_client
+    if bitget_client is None:
+        bitget_client = BitgetAsyncClient(BITGET_KEY, BITGET_SECRET, BITGET_PASS)
+    return bitget_client
+
+
+async def close_exchange_clients():
+    global binance_client, bitget_client
+    if binance_client is not None:
+        await binance_client.close_connection()
+        binance_client = None
+    if bitget_client is not None:
+        await bitget_client.close()
+        bitget_client = None
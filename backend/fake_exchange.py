@@ -0,0 +1,313 @@
+import asyncio, logging, random, time
+import orjson
+from aiohttp import web, WSMsgType
+
+# 벤치마크용 로컬 Binance / Bitget 대역 서버 (네트워크 없이 같은 포맷의 REST / WS 응답)
+# - REST: premiumIndex, positionRisk, account, listenKey, exchangeInfo, time / contracts, current-fund-rate, public/time
+# - WS: Binance 합친 markPrice 스트림(SUBSCRIBE 제어 프레임), user-data 스트림, Bitget positions + ticker
+# 가격은 tick 마다 랜덤워크. 포지션 심볼의 마크를 보낸 시각을 sent_at 에 남겨서 클라이언트까지 지연을 잰다.
+SENT_AT_TTL_SEC = 30   # sent_at 보관 시간 (오래된 항목은 tick 마다 정리)
+
+log = logging.getLogger("fake-exchange")
+
+
+def symbol_name(i: int) -> str:
+    return f"COIN{i:04d}USDT"
+
+
+class FakeMarket:
+    """심볼 N개의 마크프라이스 / 펀딩레이트 (seed 가 같으면 매번 같은 흐름)"""
+
+    def __init__(self, symbols: int, positions: int, seed: int = 7):
+        self.random = random.Random(seed)
+        self.symbols = [symbol_name(i) for i in range(symbols)]
+        self.position_symbols = self.symbols[:positions]   # 양 거래소에 포지션이 있는 심볼
+        self.marks = {s: self.random.uniform(0.01, 50000) for s in self.symbols}
+        self.entries = dict(self.marks)
+        self.funding = {s: self.random.uniform(-0.001, 0.001) for s in self.symbols}
+        self.next_funding_ms = (int(time.time()) // 28800 + 1) * 28800 * 1000
+        self.sent_at = {}   # {(exchange, symbol, markPrice 문자열): perf_counter}
+        self.ticks = 0
+        self.frames = 0     # WS 로 보낸 프레임 수 (서비스 입장에서 받은 틱)
+
+    def mark_str(self, symbol: str) -> str:
+        return f"{self.marks[symbol]:.8g}"
+
+    def tick(self):
+        self.ticks += 1
+        for s in self.symbols:
+            self.marks[s] *= 1 + self.random.gauss(0, 0.0005)
+            self.funding[s] += self.random.gauss(0, 0.00001)
+        cutoff = time.perf_counter() - SENT_AT_TTL_SEC
+        for key in [k for k, t in self.sent_at.items() if t < cutoff]:
+            del self.sent_at[key]
+
+    def stamp(self, exchange: str, symbol: str, mark: str):
+        self.sent_at.setdefault((exchange, symbol, mark), time.perf_counter())
+
+    # -----------------------------
+    # REST 본문
+    # -----------------------------
+    def premium_index(self) -> list:
+        now = int(time.time() * 1000)
+        return [
+            {
+                "symbol": s, "markPrice": self.mark_str(s), "indexPrice": self.mark_str(s),
+                "lastFundingRate": f"{self.funding[s]:.8f}", "interestRate": "0.00010000",
+                "nextFundingTime": self.next_funding_ms, "time": now,
+            }
+            for s in self.symbols
+        ]
+
+    def position_risk(self) -> list:
+        return [
+            {
+                "symbol": s, "positionAmt": "1.000", "entryPrice": f"{self.entries[s]:.8g}",
+                "markPrice": self.mark_str(s), "unRealizedProfit": "0", "liquidationPrice": "0",
+                "marginType": "cross", "isolatedMargin": "0",
+            }
+            for s in self.position_symbols
+        ]
+
+    def account(self) -> dict:
+        return {"positions": [
+            {"symbol": s, "isolatedMargin": "0", "marginType": "CROSSED"} for s in self.position_symbols
+        ]}
+
+    def exchange_info(self) -> dict:
+        return {"symbols": [
+            {
+                "symbol": s, "quantityPrecision": 3,
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "tickSize": "0.0001"},
+                    {"filterType": "LOT_SIZE", "stepSize": "0.001", "minQty": "0.001"},
+                    {"filterType": "MIN_NOTIONAL", "notional": "5"},
+                ],
+            }
+            for s in self.symbols
+        ]}
+
+    def bitget_contracts(self) -> dict:
+        return {"code": "00000", "data": [
+            {"symbol": s, "baseCoin": s[:-4], "quoteCoin": "USDT", "symbolStatus": "normal"}
+            for s in self.symbols
+        ]}
+
+    def bitget_funding(self) -> dict:
+        return {"code": "00000", "data": [
+            {"symbol": s, "fundingRate": f"{self.funding[s]:.8f}", "nextUpdate": str(self.next_funding_ms)}
+            for s in self.symbols
+        ]}
+
+    # -----------------------------
+    # WS 프레임
+    # -----------------------------
+    def binance_mark_frame(self, symbol: str) -> bytes:
+        mark = self.mark_str(symbol)
+        self.stamp("binance", symbol, mark)
+        return orjson.dumps({
+            "stream": f"{symbol.lower()}@markPrice@1s",
+            "data": {
+                "e": "markPriceUpdate", "E": int(time.time() * 1000), "s": symbol, "p": mark,
+                "r": f"{self.funding[symbol]:.8f}", "T": self.next_funding_ms,
+            },
+        })
+
+    def binance_account_update(self) -> bytes:
+        return orjson.dumps({"e": "ACCOUNT_UPDATE", "E": int(time.time() * 1000), "a": {"P": [
+            {"s": s, "pa": "1.000", "ep": f"{self.entries[s]:.8g}", "up": "0", "mt": "cross", "iw": "0"}
+            for s in self.position_symbols
+        ]}})
+
+    def bitget_positions_frame(self) -> bytes:
+        return orjson.dumps({
+            "action": "snapshot",
+            "arg": {"instType": "UMCBL", "channel": "positions", "instId": "default"},
+            "data": [
+                {
+                    "instId": f"{s}_UMCBL", "holdSide": "short", "total": "1",
+                    "averageOpenPrice": f"{self.entries[s]:.8g}", "upl": "0", "liqPx": "0", "margin": "10",
+                }
+                for s in self.position_symbols
+            ],
+        })
+
+    def bitget_ticker_frame(self, symbol: str) -> bytes:
+        mark = self.mark_str(symbol)
+        self.stamp("bitget", symbol, mark)
+        return orjson.dumps({
+            "action": "snapshot",
+            "arg": {"instType": "mc", "channel": "ticker", "instId": symbol},
+            "data": [{
+                "instId": symbol, "last": mark, "markPrice": mark, "fundingRate": f"{self.funding[symbol]:.8f}",
+                "systemTime": int(time.time() * 1000),
+            }],
+        })
+
+
+class FakeExchange:
+    """aiohttp 서버 하나에 두 거래소 경로를 모두 올린다.
+    Binance REST 는 {base}/fapi, WS 는 {ws}/stream, {ws}/ws/<listenKey>, Bitget 은 {base}/api/v2/..., {ws}/bitget"""
+
+    def __init__(self, market: FakeMarket, rate_hz: float, host: str = "127.0.0.1", port: int = 0):
+        self.market = market
+        self.interval = 1 / rate_hz
+        self.host = host
+        self.port = port
+        self.runner = None
+        self.tick_task = None
+        self.mark_streams = {}   # {ws: 구독 심볼 set}  Binance 합친 스트림
+        self.ticker_streams = {} # {ws: 구독 심볼 set}  Bitget ticker
+        self.sockets = set()     # 열린 WS 전부 (stop 때 서버 쪽에서 닫음)
+        self.rest_requests = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    def json(self, body) -> web.Response:
+        self.rest_requests += 1
+        return web.Response(body=orjson.dumps(body), content_type="application/json")
+
+    # -----------------------------
+    # REST
+    # -----------------------------
+    async def binance_rest(self, request: web.Request) -> web.Response:
+        path = request.match_info["path"]
+        if path == "premiumIndex":
+            return self.json(self.market.premium_index())
+        if path == "positionRisk":
+            return self.json(self.market.position_risk())
+        if path == "account":
+            return self.json(self.market.account())
+        if path == "exchangeInfo":
+            return self.json(self.market.exchange_info())
+        if path == "listenKey":
+            return self.json({"listenKey": "bench"})
+        if path == "time":
+            return self.json({"serverTime": int(time.time() * 1000)})
+        return self.json({})
+
+    async def bitget_contracts(self, request: web.Request) -> web.Response:
+        return self.json(self.market.bitget_contracts())
+
+    async def bitget_funding(self, request: web.Request) -> web.Response:
+        return self.json(self.market.bitget_funding())
+
+    async def bitget_time(self, request: web.Request) -> web.Response:
+        return self.json({"code": "00000", "data": {"serverTime": str(int(time.time() * 1000))}})
+
+    # -----------------------------
+    # WS
+    # -----------------------------
+    async def open_ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.sockets.add(ws)
+        return ws
+
+    async def binance_stream(self, request: web.Request):
+        """합친 markPrice 스트림: SUBSCRIBE / UNSUBSCRIBE 제어 프레임으로 구독 변경"""
+        ws = await self.open_ws(request)
+        subscribed = self.mark_streams[ws] = set()
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                req = orjson.loads(msg.data)
+                symbols = {p.split("@")[0].upper() for p in req.get("params", [])}
+                if req.get("method") == "SUBSCRIBE":
+                    subscribed |= symbols
+                elif req.get("method") == "UNSUBSCRIBE":
+                    subscribed -= symbols
+                await ws.send_str(orjson.dumps({"result": None, "id": req.get("id")}).decode())
+        finally:
+            self.mark_streams.pop(ws, None)
+            self.sockets.discard(ws)
+        return ws
+
+    async def binance_user_stream(self, request: web.Request):
+        ws = await self.open_ws(request)
+        try:
+            await ws.send_str(self.market.binance_account_update().decode())
+            async for _ in ws:
+                pass
+        finally:
+            self.sockets.discard(ws)
+        return ws
+
+    async def bitget_stream(self, request: web.Request):
+        """positions 스냅샷 한 번 + subscribe 한 ticker 채널"""
+        ws = await self.open_ws(request)
+        subscribed = self.ticker_streams[ws] = set()
+        await ws.send_str(self.market.bitget_positions_frame().decode())
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT or msg.data == "ping":
+                    continue
+                req = orjson.loads(msg.data)
+                symbols = {a["instId"] for a in req.get("args", []) if a.get("channel") == "ticker"}
+                if req.get("op") == "subscribe":
+                    subscribed |= symbols
+                elif req.get("op") == "unsubscribe":
+                    subscribed -= symbols
+        finally:
+            self.ticker_streams.pop(ws, None)
+            self.sockets.discard(ws)
+        return ws
+
+    async def tick_loop(self):
+        """rate_hz 로 가격을 움직이고 구독된 심볼마다 프레임 전송 (실제 거래소처럼 심볼당 1프레임)"""
+        while True:
+            started = time.perf_counter()
+            self.market.tick()
+            for streams, make_frame in (
+                (self.mark_streams, self.market.binance_mark_frame),
+                (self.ticker_streams, self.market.bitget_ticker_frame),
+            ):
+                for ws, symbols in list(streams.items()):
+                    # send_str 에서 양보하는 동안 subscribe 처리가 같은 set 을 바꿀 수 있어서 복사본으로
+                    for symbol in list(symbols):
+                        try:
+                            await ws.send_str(make_frame(symbol).decode())
+                            self.market.frames += 1
+                        except ConnectionError:
+                            break
+            await asyncio.sleep(max(self.interval - (time.perf_counter() - started), 0))
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route("*", "/fapi/{version}/{path}", self.binance_rest)
+        app.router.add_get("/api/v2/mix/market/contracts", self.bitget_contracts)
+        app.router.add_get("/api/v2/mix/market/current-fund-rate", self.bitget_funding)
+        app.router.add_get("/api/v2/public/time", self.bitget_time)
+        app.router.add_get("/stream", self.binance_stream)
+        app.router.add_get("/ws/{listen_key}", self.binance_user_stream)
+        app.router.add_get("/bitget", self.bitget_stream)
+
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.tick_task = asyncio.create_task(self.tick_loop(), name="fake-exchange-ticks")
+        log.info(f"🧪 가짜 거래소 서버 시작: {self.base_url} (심볼 {len(self.market.symbols)}개)")
+
+    async def stop(self):
+        if self.tick_task is not None:
+            # 틱 루프가 먼저 죽었으면 그 예외가 여기서 올라온다 (벤치 결과가 조용히 틀어지지 않게)
+            self.tick_task.cancel()
+            try:
+                await self.tick_task
+            except asyncio.CancelledError:
+                pass
+            self.tick_task = None
+        # 서비스 쪽 스트림은 재연결하려고 계속 붙어 있으므로 먼저 닫아야 cleanup 이 기다리지 않는다
+        for ws in list(self.sockets):
+            await ws.close()
+        if self.runner is not None:
+            await self.runner.cleanup()
@@ -0,0 +1,295 @@
+import asyncio, logging, os, time
+from collections import deque
+import orjson
+from backend import metrics, tick_trace
+
+# 포지션/마크프라이스 업데이트를 모아서 최대 BROADCAST_MAX_HZ 로 한 번씩만 재계산 + 전송
+# (틱마다 세 엔드포인트가 각각 전체 목록을 다시 만들던 것을 flush 1회로 합침)
+BROADCAST_MAX_HZ = float(os.getenv("BROADCAST_MAX_HZ", "10"))
+
+# permessage-deflate 는 연결마다 따로 압축해서 클라이언트 수만큼 CPU 를 쓰므로 기본은 끔.
+# 포지션 목록이 커서 대역폭이 더 중요할 때만 WS_PER_MESSAGE_DEFLATE=true 로 켠다 (uvicorn 옵션).
+WS_PER_MESSAGE_DEFLATE = os.getenv("WS_PER_MESSAGE_DEFLATE", "false").lower() in ("1", "true", "yes")
+
+# 클라이언트별 전송 대기열은 한 칸: 못 보낸 프레임은 최신 상태로 덮어쓴다 (conflation).
+# 프레임 하나를 WS_MAX_LAG_SEC 안에 못 보내는 클라이언트는 끊는다 (재접속하면 스냅샷부터 다시 받음).
+WS_MAX_LAG_SEC = float(os.getenv("WS_MAX_LAG_SEC", "5"))
+WS_CLOSE_TIMEOUT_SEC = 1.0
+MAX_NOTICES = 16    # 채널당 쌓아 둘 제어 프레임(오류 응답 등) 수, 넘치면 오래된 것부터 버림
+
+log = logging.getLogger("fanout")
+
+channels = {}   # {websocket: ClientChannel}
+
+
+def encode(payload) -> bytes:
+    return orjson.dumps(payload)
+
+
+class ClientChannel:
+    """웹소켓 클라이언트 1개의 전송 채널 (전송 태스크 하나가 순서대로 보냄).
+    offer(data) 는 한 칸짜리 대기열을 최신 프레임으로 덮어쓰고, take 를 준 채널은
+    보낼 차례에 take() 로 그동안 쌓인 변경분을 합친 프레임을 만든다.
+    notice(data) 는 덮어쓰지 않는 제어 프레임 (구독 오류 응답 등), 상태 프레임보다 먼저 나간다."""
+
+    def __init__(self, websocket, endpoint: str, on_drop=None, take=None, min_interval: float = 0):
+        self.websocket = websocket
+        self.endpoint = endpoint
+        self.on_drop = on_drop          # 끊을 때 엔드포인트 쪽 클라이언트 목록에서 빼는 콜백
+        self.take = take                # () -> bytes | None
+        self.min_interval = min_interval
+        self.latest = None
+        self.since = None               # 아직 못 보낸 가장 오래된 업데이트 시각
+        self.trace = None               # 아직 못 보낸 틱 trace {거래소: (이벤트 ms, 수신 ns, 적용 ns)}
+        self.notices = deque(maxlen=MAX_NOTICES)
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.task = asyncio.create_task(self.run(), name=f"ws-send {endpoint}")
+        self.task.add_done_callback(self.on_task_done)
+
+        # 카운터
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.conflated = 0              # 보내기 전에 다음 업데이트로 덮어쓴(합친) 횟수
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def offer(self, data: bytes = None, trace: dict = None):
+        """보낼 프레임(또는 take 채널이면 변경 알림)을 넣고 바로 반환"""
+        if self.closed:
+            return
+        if data is not None:
+            self.latest = data
+        if trace:
+            self.trace = tick_trace.merge(self.trace, trace)
+        if self.since is None:
+            self.since = time.monotonic()
+        else:
+            self.conflated += 1
+        self.ready.set()
+
+    def notice(self, data: bytes):
+        """합치지 않고 그대로 보낼 제어 프레임"""
+        if self.closed:
+            return
+        self.notices.append(data)
+        self.ready.set()
+
+    def next_frame(self):
+        data, self.latest = self.latest, None
+        if data is None and self.take is not None:
+            data = self.take()
+        return data
+
+    def lag(self) -> float:
+        return time.monotonic() - self.since if self.since is not None else 0.0
+
+    async def send(self, data: bytes) -> bool:
+        """프레임 1개 쓰기. 못 보내면 채널을 닫고 False"""
+        try:
+            await asyncio.wait_for(self.websocket.send_bytes(data), WS_MAX_LAG_SEC)
+        except asyncio.TimeoutError:
+            await self.drop(f"{WS_MAX_LAG_SEC:g}초 안에 전송 못 함")
+            return False
+        except Exception as e:
+            # 이미 끊긴 소켓: 수신 루프도 곧 끊김을 보고 detach 한다
+            log.debug(f"웹소켓 전송 실패 ({self.endpoint}): {e}")
+            self.detach()
+            return False
+
+        self.frames_sent += 1
+        self.bytes_sent += len(data)
+        scheduler.bytes_sent += len(data)
+        metrics.ws_frames.inc(self.endpoint)
+        metrics.ws_bytes.inc(self.endpoint, amount=len(data))
+        return True
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            if self.notices:
+                if not await self.send(self.notices.popleft()):
+                    return
+                if self.notices or self.since is not None:
+                    self.ready.set()   # 남은 제어 프레임 / 기다리던 상태 프레임
+                continue
+
+            since, self.since = self.since, None
+            trace, self.trace = self.trace, None
+            try:
+                data = self.next_frame()
+            except Exception:
+                # 프레임을 못 만들면 이 클라이언트 상태가 어긋난 것: 끊어서 재접속(스냅샷부터) 하게 한다
+                log.error(f"전송 프레임 생성 실패, 연결 종료 ({self.endpoint} {self.websocket.client})", exc_info=True)
+                await self.close(1011)
+                return
+            if data is None:
+                continue
+            if not await self.send(data):
+                return
+
+            self.last_lag = time.monotonic() - since
+            self.max_lag = max(self.max_lag, self.last_lag)
+            if trace:
+                tick_trace.sent(trace)
+
+            if self.min_interval:
+                await asyncio.sleep(self.min_interval)
+
+    def detach(self):
+        """채널 정리 (전송 태스크 종료 + 엔드포인트 목록에서 제거). 여러 번 불러도 됨"""
+        if self.closed:
+            return
+        self.closed = True
+        channels.pop(self.websocket, None)
+        if self.task is not asyncio.current_task():
+            self.task.cancel()
+        if self.on_drop is not None:
+            self.on_drop()
+
+    def on_task_done(self, task: asyncio.Task):
+        """전송 태스크가 예상 못 한 예외로 끝나면 로그를 남기고 채널을 정리 (소켓만 붙어 있는 상태 방지)"""
+        if task.cancelled() or task.exception() is None:
+            return
+        log.error(f"웹소켓 전송 태스크 종료 ({self.endpoint} {self.websocket.client})", exc_info=task.exception())
+        self.detach()
+
+    async def close(self, code: int):
+        self.detach()
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), WS_CLOSE_TIMEOUT_SEC)
+        except Exception:
+            pass
+
+    async def drop(self, reason: str):
+        """밀린 클라이언트를 끊는다 (1013 Try Again Later)"""
+        scheduler.clients_dropped += 1
+        log.warning(f"🐢 느린 클라이언트 끊음 ({self.endpoint} {self.websocket.client}): {reason}")
+        await self.close(1013)
+
+    def stats(self) -> dict:
+        return {
+            "endpoint": self.endpoint,
+            "client": str(self.websocket.client),
+            "lag_ms": round(self.lag() * 1000, 1),
+            "last_lag_ms": round(self.last_lag * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "pending": self.since is not None,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "conflated": self.conflated,
+        }
+
+
+def attach(websocket, endpoint: str, on_drop=None, take=None, min_interval: float = 0) -> ClientChannel:
+    """연결 직후 호출. 이 소켓으로 나가는 프레임은 모두 채널을 거친다"""
+    detach(websocket)
+    channel = ClientChannel(websocket, endpoint, on_drop, take, min_interval)
+    channels[websocket] = channel
+    return channel
+
+
+def detach(websocket):
+    """연결 종료 시 호출"""
+    channel = channels.get(websocket)
+    if channel is not None:
+        channel.detach()
+
+
+def client_stats() -> list[dict]:
+    """클라이언트별 지연 (lag_ms 가 큰 순)"""
+    return sorted((ch.stats() for ch in channels.values()), key=lambda s: s["lag_ms"], reverse=True)
+
+
+def send_all(clients, payload, trace: dict = None) -> int:
+    """이벤트 루프 안에서 호출. payload 는 한 번만 직렬화하고 같은 bytes 를 모든 클라이언트
+    채널에 넣는다 (실제 전송은 채널 태스크가, 밀려 있으면 최신 프레임만). 넣은 프레임 수 반환.
+    trace 는 이 payload 에 새로 들어간 틱 (tick_trace.collect), 전송 시각과 비교해 지연을 기록"""
+    if not clients:
+        return 0
+    if isinstance(payload, bytes):
+        data = payload
+    else:
+        data = encode(payload)
+        scheduler.payloads_encoded += 1
+    sent = 0
+    for ws in list(clients):
+        channel = channels.get(ws)
+        if channel is None:
+            continue  # 아직 attach 전
+        channel.offer(data, trace)
+        sent += 1
+    return sent
+
+
+class BroadcastScheduler:
+    """dirty flag 스케줄러: mark_dirty() 는 어느 스레드에서든 호출 가능하고,
+    루프 태스크가 최소 간격을 지키며 flush() 를 한 번씩 실행한다."""
+
+    def __init__(self, max_hz: float):
+        self.min_interval = 1 / max_hz
+        self.loop = None
+        self.flush = None       # () -> int (보낸 프레임 수)
+        self.wakeup = None
+        self.dirty = False
+
+        # 카운터
+        self.updates_received = 0
+        self.flushes = 0
+        self.payloads_encoded = 0   # 클라이언트 수와 무관하게 flush 당 엔드포인트별 1회
+        self.frames_sent = 0
+        self.bytes_sent = 0         # 실제로 소켓에 쓴 바이트 (덮어쓴 프레임 제외)
+        self.clients_dropped = 0    # WS_MAX_LAG_SEC 를 넘겨 끊은 클라이언트
+
+    def start(self, flush):
+        self.loop = asyncio.get_running_loop()
+        self.flush = flush
+        self.wakeup = asyncio.Event()
+        self.loop.create_task(self.run())
+        log.info(f"브로드캐스트 스케줄러 시작 (최대 {1 / self.min_interval:g}Hz)")
+
+    def mark_dirty(self):
+        self.updates_received += 1
+        if self.dirty or self.loop is None:
+            return
+        self.dirty = True
+        try:
+            in_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop:
+            self.wakeup.set()
+        else:
+            # pybitget 스레드 등 루프 밖에서 호출된 경우
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            self.dirty = False
+            started = time.perf_counter()
+            try:
+                self.frames_sent += self.flush()
+            except Exception as e:
+                log.error(f"브로드캐스트 flush 오류: {e}", exc_info=True)
+            metrics.broadcast_seconds.observe(time.perf_counter() - started)
+            self.flushes += 1
+            await asyncio.sleep(self.min_interval)
+
+    def stats(self) -> dict:
+        return {
+            "max_hz": 1 / self.min_interval,
+            "updates_received": self.updates_received,
+            "flushes": self.flushes,
+            "payloads_encoded": self.payloads_encoded,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "clients": len(channels),
+            "clients_dropped": self.clients_dropped,
+            "max_client_lag_ms": round(max((ch.lag() for ch in channels.values()), default=0) * 1000, 1),
+        }
+
+
+scheduler = BroadcastScheduler(BROADCAST_MAX_HZ)
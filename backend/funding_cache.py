@@ -0,0 +1,247 @@
+import asyncio, hashlib, logging, os, time
+import orjson
+from collections import deque
+from datetime import datetime
+from sqlalchemy.future import select
+from backend.models import FundingRate
+
+# update_task 가 커밋 직후 발행하는 최신 펀딩레이트 스냅샷 (프로세스 내 캐시)
+# live_funding 의 WS 스트림 변경분도 publish_live() 로 짧은 주기마다 합쳐서 발행한다.
+# /api/binance/latest, /api/bitget/latest, /api/gap 은 여기서 미리 직렬화된 bytes 를 그대로 내려준다.
+
+current = None   # 최신 FundingSnapshot (콜드 스타트 전에는 None)
+# 발행할 때마다 1씩 증가. 재시작 후에도 이전 프로세스 버전보다 커지도록 시작값을 현재 시각(ms)으로 잡는다
+version = time.time_ns() // 1_000_000
+load_lock = asyncio.Lock()
+
+# 재접속 이어받기(/ws/gap?since=)용 gap 델타는 개수가 아니라 시간으로 보관한다.
+# 실시간 스트림이 LIVE_PUBLISH_SEC(0.5초)마다 발행하므로 개수로 자르면 몇 분도 못 버틴다.
+DELTA_RETENTION_SEC = int(os.getenv("DELTA_RETENTION_SEC", "900"))
+MAX_DELTAS = 4000                 # 메모리 상한 (0.5초 주기로 15분 = 1800개)
+deltas = deque()                  # [{"version", "changed", "removed"}, ...] 버전 오름차순
+delta_times = deque()             # deltas 와 같은 순서의 발행 시각(monotonic)
+listeners = []                    # publish(snapshot, delta) 마다 호출되는 콜백 (/ws/gap 등)
+
+# 거래소 WS 스트림에서 받은 실시간 펀딩레이트 (publish_live 때 스냅샷에 합침)
+live_pending = {}                 # {exchange: {symbol: row}} 아직 발행 안 된 변경분
+live_seen = {}                    # {exchange: 마지막 수신 시각(monotonic)}
+updated_at = {}                   # {exchange: 마지막으로 값을 받은 시각(epoch 초), REST 든 스트림이든} /metrics 신선도
+
+log = logging.getLogger("funding-cache")
+
+
+def encode(payload) -> bytes:
+    return orjson.dumps(payload)
+
+
+def isoformat(dt):
+    return dt.isoformat() if dt else None
+
+
+def build_gap(rates: dict) -> list[dict]:
+    """Binance / Bitget 양쪽에 있는 심볼의 펀딩레이트 차이"""
+    binance_rates = rates.get("Binance", {})
+    bitget_rates = rates.get("Bitget", {})
+
+    gaps = []
+    for symbol, b_row in binance_rates.items():
+        g_row = bitget_rates.get(symbol)
+        if g_row is None:
+            continue
+        gaps.append({
+            "symbol": symbol,
+            "binance_rate": b_row["funding_rate"],
+            "bitget_rate": g_row["funding_rate"],
+            "gap": b_row["funding_rate"] - g_row["funding_rate"],
+            "next_funding_time": b_row["next_funding_time"],
+        })
+    return gaps
+
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+
+class FundingSnapshot:
+    """한 버전의 펀딩레이트 + 엔드포인트별로 미리 직렬화한 응답 본문.
+    prev 를 주면 내용이 그대로인 view 는 직렬화 / 해시를 다시 하지 않고 물려받는다"""
+
+    def __init__(self, version: int, rates: dict, prev=None):
+        self.version = version
+        self.rates = rates  # {"Binance": {symbol: row}, "Bitget": {symbol: row}}
+        self.gap = build_gap(rates)
+        self.gap_rows = {row["symbol"]: row for row in self.gap}
+        # 버전은 어느 한 거래소 값만 바뀌어도 올라가므로 view 본문 해시로 ETag 를 만든다
+        # (그 view 내용이 같으면 버전이 바뀌어도 304 유지)
+        self.views, self.etags = {}, {}
+        for view, exchange in (("binance", "Binance"), ("bitget", "Bitget")):
+            rows = rates.get(exchange, {})
+            if prev is not None and prev.rates.get(exchange, {}) is rows:
+                self.views[view], self.etags[view] = prev.views[view], prev.etags[view]
+            else:
+                self.views[view] = encode(list(rows.values()))
+                self.etags[view] = body_etag(self.views[view])
+        if prev is not None and prev.gap == self.gap:
+            self.views["gap"], self.etags["gap"] = prev.views["gap"], prev.etags["gap"]
+        else:
+            self.views["gap"] = encode(self.gap)
+            self.etags["gap"] = body_etag(self.views["gap"])
+
+    def etag(self, view: str) -> str:
+        return self.etags[view]
+
+
+def diff_gap(prev, snapshot) -> dict:
+    """이전 스냅샷 대비 바뀐 gap 행과 사라진 심볼"""
+    prev_rows = prev.gap_rows if prev else {}
+    changed = [row for symbol, row in snapshot.gap_rows.items() if prev_rows.get(symbol) != row]
+    removed = [symbol for symbol in prev_rows if symbol not in snapshot.gap_rows]
+    return {"version": snapshot.version, "changed": changed, "removed": removed}
+
+
+def deltas_since(since: int):
+    """since 이후의 델타 목록. 보관 범위를 벗어났거나 모르는 버전이면 None (전체 스냅샷 필요)"""
+    if current is None or since > current.version:
+        return None
+    if since == current.version:
+        return []
+    if not deltas or deltas[0]["version"] > since + 1:
+        return None
+    return [d for d in deltas if d["version"] > since]
+
+
+def to_row(symbol: str, funding_rate: float, next_funding_time) -> dict:
+    return {
+        "symbol": symbol,
+        "funding_rate": funding_rate,
+        "next_funding_time": isoformat(next_funding_time),
+    }
+
+
+def commit(rates: dict) -> FundingSnapshot:
+    """새 버전 스냅샷 발행 + 델타 기록 + 리스너 호출"""
+    global current, version
+    version += 1
+    prev = current
+    current = FundingSnapshot(version, rates, prev)
+
+    delta = diff_gap(prev, current)
+    remember(delta)
+    for listener in listeners:
+        try:
+            listener(current, delta)
+        except Exception as e:
+            log.error(f"스냅샷 리스너 호출 실패: {e}")
+    return current
+
+
+def remember(delta: dict):
+    """이어받기용 델타 보관 (DELTA_RETENTION_SEC 지난 것과 MAX_DELTAS 초과분은 버림)"""
+    now = time.monotonic()
+    deltas.append(delta)
+    delta_times.append(now)
+    while delta_times and (delta_times[0] < now - DELTA_RETENTION_SEC or len(deltas) > MAX_DELTAS):
+        deltas.popleft()
+        delta_times.popleft()
+
+
+def publish(rows_by_exchange: dict) -> FundingSnapshot:
+    """update_task 커밋 직후 호출. 이번에 못 가져온 거래소는 이전 스냅샷 값을 유지.
+    REST 대조 결과가 현재 스냅샷과 같으면 새 버전을 만들지 않는다"""
+    rates = dict(current.rates) if current else {}
+    changed = current is None
+    for exchange, rows in rows_by_exchange.items():
+        new_rows = {
+            r["symbol"]: to_row(r["symbol"], r["funding_rate"], r["next_funding_time"])
+            for r in rows
+        }
+        if new_rows != rates.get(exchange):
+            rates[exchange] = new_rows
+            changed = True
+        # REST 값이 기준이므로 그 이전에 쌓인 실시간 변경분은 버림
+        live_pending.pop(exchange, None)
+    return commit(rates) if changed else current
+
+
+def replicate(new_version: int, rates: dict) -> FundingSnapshot:
+    """웹 워커: ingest 프로세스가 발행한 버전 번호 그대로 새 스냅샷 발행.
+    버전이 이어지지 않으면(재접속 등) 이어받기용 델타를 비워서 ?since= 클라이언트가 스냅샷부터 받게 한다"""
+    global version
+    if current is None or new_version != current.version + 1:
+        deltas.clear()
+        delta_times.clear()
+    version = new_version - 1
+    return commit(rates)
+
+
+def update_live(exchange: str, updates: dict):
+    """WS 스트림 콜백: {symbol: (funding_rate, next_funding_time)} 중 바뀐 것만 대기열에 넣음.
+    거래 가능한 심볼 목록은 REST 스냅샷 기준 (새 상장은 다음 REST 대조 때 들어옴)"""
+    live_seen[exchange] = time.monotonic()
+    updated_at[exchange] = time.time()
+    if current is None:
+        return
+    known = current.rates.get(exchange, {})
+    pending = live_pending.setdefault(exchange, {})
+    for symbol, (funding_rate, next_funding_time) in updates.items():
+        prev = known.get(symbol)
+        if prev is None:
+            continue
+        row = to_row(symbol, funding_rate, next_funding_time)
+        if row != prev:
+            pending[symbol] = row
+        else:
+            pending.pop(symbol, None)
+
+
+def publish_live():
+    """쌓인 실시간 변경분이 있으면 한 번에 새 스냅샷으로 발행 (없으면 아무것도 안 함).
+    바뀐 거래소만 rates dict 를 새로 만들어서 나머지 view 는 이전 직렬화를 그대로 쓴다"""
+    if current is None or not any(live_pending.values()):
+        return None
+    rates = dict(current.rates)
+    for exchange, pending in live_pending.items():
+        if pending:
+            rates[exchange] = {**rates.get(exchange, {}), **pending}
+    live_pending.clear()
+    return commit(rates)
+
+
+def live_fresh(exchange: str, max_age: float) -> bool:
+    """스트림이 max_age 초 안에 데이터를 보냈는지"""
+    return time.monotonic() - live_seen.get(exchange, 0) < max_age
+
+
+def live_rows(exchange: str, now) -> list[dict]:
+    """현재 스냅샷 값을 DB 저장용 행으로 (next_funding_time 은 datetime 으로 복원)"""
+    rows = current.rates.get(exchange, {}) if current else {}
+    return [
+        {
+            "symbol": row["symbol"],
+            "exchange": exchange,
+            "funding_rate": row["funding_rate"],
+            "next_funding_time": datetime.fromisoformat(row["next_funding_time"]) if row["next_funding_time"] else None,
+            "timestamp": now,
+        }
+        for row in rows.values()
+    ]
+
+
+async def load(db) -> FundingSnapshot:
+    """콜드 스타트(첫 갱신 전)에만 DB 에서 한 번 읽어 스냅샷을 만든다"""
+    async with load_lock:
+        if current is not None:
+            return current
+
+        rows = (await db.execute(select(FundingRate))).scalars().all()
+        rows_by_exchange = {}
+        for r in rows:
+            rows_by_exchange.setdefault(r.exchange, []).append({
+                "symbol": r.symbol,
+                "funding_rate": r.funding_rate,
+                "next_funding_time": r.next_funding_time,
+            })
+        # 대기 중에 update_task 가 먼저 발행했다면 그 값을 덮어쓰지 않는다
+        if current is not None:
+            return current
+        return publish(rows_by_exchange)
@@ -0,0 +1,68 @@
+import asyncio, logging, os, signal
+from contextlib import contextmanager
+
+import uvicorn
+from fastapi import FastAPI
+
+from backend import ingest_bus, loop_monitor, rate_limit
+from backend.exchange_clients import close_exchange_clients
+from backend.main import start_ingest, stop_ingest
+from backend.update_task import close_http_client
+from backend.position_store import store
+from backend.routers import monitor
+
+# 수집 전용 프로세스: 거래소 연결을 모두 갖고 ingest 버스로 웹 워커들에 상태를 발행한다
+#   python -m backend.ingest
+#   WEB_CONCURRENCY=4 APP_ROLE=web uvicorn backend.main:app   (워커 수 = WEB_CONCURRENCY, 요청 한도 분배에도 씀)
+logging.basicConfig(level=logging.INFO)
+
+# 스트림 수신 / 적용 / 펀딩 갱신 지표는 이 프로세스에만 쌓이므로 /metrics 와 /api/admin/* 를 따로 연다
+# (웹 워커 /metrics 에는 서빙 쪽 지표만). INGEST_MONITOR_PORT=0 이면 끔
+INGEST_MONITOR_HOST = os.getenv("INGEST_MONITOR_HOST", "127.0.0.1")
+INGEST_MONITOR_PORT = int(os.getenv("INGEST_MONITOR_PORT", "9108"))
+
+log = logging.getLogger("ingest")
+
+monitor_app = FastAPI()
+monitor_app.include_router(monitor.router)
+
+
+class MonitorServer(uvicorn.Server):
+    """종료 신호는 ingest 가 직접 처리 (uvicorn 이 SIGINT / SIGTERM 을 가로채지 않게)"""
+
+    @contextmanager
+    def capture_signals(self):
+        yield
+
+
+async def run():
+    rate_limit.split_for_processes()
+    store.start()
+    loop_monitor.start()
+    server = await ingest_bus.serve()
+    await start_ingest()
+
+    http, http_task = None, None
+    if INGEST_MONITOR_PORT:
+        http = MonitorServer(uvicorn.Config(
+            monitor_app, host=INGEST_MONITOR_HOST, port=INGEST_MONITOR_PORT, lifespan="off", log_level="warning",
+        ))
+        http_task = asyncio.create_task(http.serve())
+        log.info(f"📈 ingest 모니터링: http://{INGEST_MONITOR_HOST}:{INGEST_MONITOR_PORT}/metrics")
+
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    try:
+        await stop.wait()  # 종료 신호(Ctrl+C / SIGTERM)까지
+    finally:
+        if http is not None:
+            http.should_exit = True
+            await http_task
+        server.close()
+        await stop_ingest()
+        await close_http_client()
+        await close_exchange_clients()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
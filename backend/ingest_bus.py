@@ -0,0 +1,185 @@
+import asyncio, logging, os
+import orjson
+from backend import funding_cache, tick_trace
+from backend.position_store import store, StoreSnapshot, snapshot_diff
+
+# 수집(ingest) 프로세스 하나가 거래소 연결을 모두 갖고, 정규화된 포지션/마크/펀딩 변경분을
+# 로컬 Unix 소켓으로 웹 워커들에 발행한다. 웹 워커는 받은 변경분으로 자기 store / funding_cache 를
+# 갱신해서 HTTP / WS 엔드포인트만 서빙 (거래소 연결은 워커 수와 상관없이 한 벌).
+# - APP_ROLE=all (기본)  한 프로세스에서 수집 + 서빙, 기존 동작
+# - python -m backend.ingest  HTTP 없이 수집 + 발행만 (프로세스 하나)
+# - APP_ROLE=web  uvicorn backend.main:app --workers N, 버스 구독 + 서빙만
+# 프레임은 한 줄에 JSON 하나 (NDJSON). 구독자가 붙으면 전체 상태(reset)부터 보낸다.
+APP_ROLE = os.getenv("APP_ROLE", "all").lower()
+INGEST_SOCKET = os.getenv("INGEST_SOCKET", "/tmp/usdt-funding-ingest.sock")
+BUS_MAX_BUFFER = 8 * 1024 * 1024    # 구독자 쓰기 버퍼가 이만큼 밀리면 끊음 (재접속하면 전체 상태부터)
+BUS_LINE_LIMIT = 64 * 1024 * 1024   # 프레임 한 줄 최대 크기
+
+log = logging.getLogger("ingest-bus")
+
+subscribers = set()   # 웹 워커 연결 (StreamWriter)
+rates_sent = {}       # 마지막으로 발행한 펀딩 rates (변경분 계산 기준)
+connected = False     # 웹 워커: 버스 연결 상태
+
+
+def encode(msg: dict) -> bytes:
+    return orjson.dumps(msg) + b"\n"
+
+
+# -----------------------------
+# ingest 쪽 (발행)
+# -----------------------------
+def rates_diff(prev: dict, rates: dict) -> tuple[dict, dict]:
+    """거래소별 바뀐 펀딩 행 / 사라진 심볼"""
+    changed, removed = {}, {}
+    for exchange, rows in rates.items():
+        old = prev.get(exchange, {})
+        rows_changed = {s: row for s, row in rows.items() if old.get(s) is not row and old.get(s) != row}
+        if rows_changed:
+            changed[exchange] = rows_changed
+        gone = [s for s in old if s not in rows]
+        if gone:
+            removed[exchange] = gone
+    return changed, removed
+
+
+def positions_frame(prev: StoreSnapshot, snapshot: StoreSnapshot, reset=False):
+    diff = snapshot_diff(prev, snapshot)
+    if not reset and not (diff["changed"] or diff["removed"]):
+        return None
+    return encode({"t": "positions", "reset": reset, **diff})
+
+
+def funding_frame(prev_rates: dict, snapshot, reset=False) -> bytes:
+    changed, removed = rates_diff(prev_rates, snapshot.rates)
+    return encode({
+        "t": "funding", "reset": reset, "version": snapshot.version,
+        "changed": changed, "removed": removed, "updated_at": funding_cache.updated_at,
+    })
+
+
+def send(frame: bytes):
+    """모든 구독자에게 같은 bytes 를 씀 (직렬화는 한 번)"""
+    for writer in list(subscribers):
+        if writer.transport.get_write_buffer_size() > BUS_MAX_BUFFER:
+            log.warning("🐢 밀린 웹 워커 연결 끊음 (재접속 시 전체 상태부터)")
+            subscribers.discard(writer)
+            writer.close()
+            continue
+        writer.write(frame)
+
+
+def on_positions(prev, snapshot):
+    """position_store 리스너: 배치마다 바뀐 포지션/마크만 발행"""
+    if subscribers:
+        frame = positions_frame(prev, snapshot)
+        if frame:
+            send(frame)
+
+
+def on_funding(snapshot, delta):
+    """funding_cache 리스너: 새 버전마다 바뀐 행만 발행"""
+    global rates_sent
+    if subscribers:
+        send(funding_frame(rates_sent, snapshot))
+    rates_sent = snapshot.rates
+
+
+def on_clock(clock: dict):
+    """tick_trace 리스너: 거래소 시계 차이를 웹 워커에도 (워커는 직접 재지 않음)"""
+    if subscribers:
+        send(encode({"t": "clock", "clock": clock}))
+
+
+async def handle_subscriber(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    # 전체 상태를 쓰고 등록하기까지 await 가 없어서 그 사이 변경분을 놓치지 않는다
+    writer.write(positions_frame(StoreSnapshot(), store.snapshot, reset=True))
+    if funding_cache.current is not None:
+        writer.write(funding_frame({}, funding_cache.current, reset=True))
+    if tick_trace.clock:
+        writer.write(encode({"t": "clock", "clock": tick_trace.clock}))
+    subscribers.add(writer)
+    log.info(f"🔗 웹 워커 구독 (총 {len(subscribers)}개)")
+    try:
+        # 워커 쪽에서 보내는 데이터는 없음, 연결 종료 감지용
+        while await reader.read(1024):
+            pass
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        subscribers.discard(writer)
+        writer.close()
+        log.info(f"🔌 웹 워커 구독 해제 (총 {len(subscribers)}개)")
+
+
+async def serve():
+    """ingest 역할: 버스 서버 시작 + store / funding_cache 리스너 등록"""
+    global rates_sent
+    if os.path.exists(INGEST_SOCKET):
+        os.unlink(INGEST_SOCKET)  # 이전 프로세스가 남긴 소켓 파일
+    server = await asyncio.start_unix_server(handle_subscriber, path=INGEST_SOCKET, limit=BUS_LINE_LIMIT)
+    rates_sent = funding_cache.current.rates if funding_cache.current else {}
+    store.listeners.append(on_positions)
+    funding_cache.listeners.append(on_funding)
+    tick_trace.listeners.append(on_clock)
+    log.info(f"📡 ingest 버스 시작: {INGEST_SOCKET}")
+    return server
+
+
+# -----------------------------
+# 웹 워커 쪽 (구독)
+# -----------------------------
+def apply_funding(msg: dict):
+    current = funding_cache.current
+    rates = {} if msg["reset"] or current is None else dict(current.rates)
+    for exchange, rows in msg["changed"].items():
+        rates[exchange] = {**rates.get(exchange, {}), **rows}
+    for exchange, symbols in msg["removed"].items():
+        rows = dict(rates.get(exchange, {}))
+        for symbol in symbols:
+            rows.pop(symbol, None)
+        rates[exchange] = rows
+    funding_cache.updated_at.update(msg.get("updated_at", {}))
+    funding_cache.replicate(msg["version"], rates)
+
+
+async def subscribe_loop():
+    """web 역할: ingest 버스 구독. 포지션은 store 의 단일 writer 를 거쳐 적용, 끊기면 재접속"""
+    global connected
+    backoff = 1
+    while True:
+        try:
+            reader, writer = await asyncio.open_unix_connection(INGEST_SOCKET, limit=BUS_LINE_LIMIT)
+            connected = True
+            backoff = 1
+            log.info(f"🔗 ingest 버스 연결됨: {INGEST_SOCKET}")
+            dropped = store.dropped
+            try:
+                while line := await reader.readline():
+                    msg = orjson.loads(line)
+                    if msg["t"] == "positions":
+                        store.submit("replica", msg)
+                        if store.dropped != dropped:
+                            # 변경분이 하나라도 버려지면 상태가 어긋나므로 전체 상태부터 다시 받는다
+                            raise ConnectionError("store 큐에서 변경분 드롭, 재동기화")
+                    elif msg["t"] == "funding":
+                        apply_funding(msg)
+                    elif msg["t"] == "clock":
+                        tick_trace.clock.update(msg["clock"])
+            finally:
+                connected = False
+                writer.close()
+            log.error("ingest 버스 연결 끊김, 재접속")
+        except Exception as e:
+            log.error(f"ingest 버스 오류, 재시도: {e}")
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+
+def stats() -> dict:
+    return {
+        "role": APP_ROLE,
+        "socket": INGEST_SOCKET,
+        "subscribers": len(subscribers),
+        "connected": connected,
+    }
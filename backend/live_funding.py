@@ -0,0 +1,181 @@
+import asyncio, logging, os, time
+import orjson
+import websockets
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from backend import funding_cache, metrics, recorder
+
+# 거래소 WS 스트림으로 실시간 펀딩레이트 수신 → funding_cache 실시간 테이블
+# - Binance: !markPrice@arr@1s (전체 심볼, r = 펀딩레이트, T = 다음 펀딩 시각)
+# - Bitget: v2 public ticker 채널 (심볼별 구독, fundingRate / nextFundingTime)
+# 변경분은 LIVE_PUBLISH_SEC 마다 한 번 새 스냅샷으로 발행 (/api/gap, /ws/gap 이 바로 반영)
+BINANCE_FUNDING_URL = "wss://fstream.binance.com/ws/!markPrice@arr@1s"
+BITGET_PUBLIC_URL = "wss://ws.bitget.com/v2/ws/public"
+LIVE_PUBLISH_SEC = float(os.getenv("LIVE_PUBLISH_SEC", "0.5"))
+BITGET_SUBSCRIBE_CHUNK = 100      # subscribe 메시지 하나에 넣는 채널 수
+BITGET_PING_SEC = 25              # 30초 안에 ping 을 안 보내면 서버가 끊음
+
+KST = ZoneInfo("Asia/Seoul")
+
+log = logging.getLogger("live-funding")
+
+bitget_known = set()                       # 마지막으로 본 스냅샷의 Bitget 심볼
+bitget_symbols_changed = asyncio.Event()   # 첫 스냅샷 로드 / REST 대조로 심볼 목록이 바뀌면 set
+
+
+def to_kst(ms) -> datetime:
+    # REST 파싱과 같게 초 단위로 내림 (같은 값이 변경으로 잡히지 않도록)
+    return datetime.fromtimestamp(int(ms) // 1000, tz=KST)
+
+
+# -----------------------------
+# Binance
+# -----------------------------
+def parse_binance_frame(raw) -> dict:
+    updates = {}
+    for item in orjson.loads(raw):
+        symbol = item.get("s", "")
+        if symbol.endswith("USDT") and item.get("r") not in (None, ""):
+            updates[symbol] = (float(item["r"]), to_kst(item["T"]))
+    return updates
+
+
+def handle_binance_frame(raw):
+    funding_cache.update_live("Binance", parse_binance_frame(raw))
+
+
+async def binance_funding_stream():
+    backoff = 1
+    while True:
+        try:
+            async with websockets.connect(BINANCE_FUNDING_URL, ping_interval=20, ping_timeout=20) as ws:
+                log.info("Binance 펀딩레이트 스트림 연결됨")
+                backoff = 1
+                async for raw in ws:
+                    metrics.messages.inc("binance_funding")
+                    recorder.record("binance_funding", raw)
+                    handle_binance_frame(raw)
+        except Exception as e:
+            log.error(f"Binance 펀딩레이트 스트림 오류, 재시도: {e}")
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+
+# -----------------------------
+# Bitget
+# -----------------------------
+def bitget_symbols() -> set:
+    """REST 스냅샷에 있는(거래 가능한) Bitget 심볼"""
+    current = funding_cache.current
+    return set(current.rates.get("Bitget", {})) if current else set()
+
+
+def parse_bitget_frame(raw) -> dict:
+    msg = orjson.loads(raw)
+    if msg.get("arg", {}).get("channel") != "ticker":
+        return {}
+    updates = {}
+    for t in msg.get("data", []):
+        if t.get("fundingRate") not in (None, "") and t.get("nextFundingTime"):
+            updates[t["instId"]] = (float(t["fundingRate"]), to_kst(t["nextFundingTime"]))
+    return updates
+
+
+async def bitget_subscribe(ws, symbols, op: str = "subscribe"):
+    symbols = sorted(symbols)
+    for i in range(0, len(symbols), BITGET_SUBSCRIBE_CHUNK):
+        await ws.send(orjson.dumps({
+            "op": op,
+            "args": [
+                {"instType": "USDT-FUTURES", "channel": "ticker", "instId": s}
+                for s in symbols[i:i + BITGET_SUBSCRIBE_CHUNK]
+            ],
+        }).decode())
+
+
+def on_snapshot(snapshot, delta):
+    """funding_cache 리스너: Bitget 심볼 목록이 바뀌면 구독 동기화를 깨움"""
+    global bitget_known
+    symbols = snapshot.rates.get("Bitget", {}).keys()
+    if symbols != bitget_known:
+        bitget_known = set(symbols)
+        bitget_symbols_changed.set()
+
+
+async def bitget_keepalive(ws):
+    """ping 전송 + 심볼 목록이 바뀔 때마다(연결 직후, 첫 REST 스냅샷, REST 대조) 바로 구독 동기화"""
+    subscribed = set()
+    next_ping = time.monotonic() + BITGET_PING_SEC
+    while True:
+        bitget_symbols_changed.clear()
+        wanted = bitget_symbols()
+        if wanted - subscribed:
+            await bitget_subscribe(ws, wanted - subscribed)
+        if subscribed - wanted:
+            await bitget_subscribe(ws, subscribed - wanted, "unsubscribe")
+        if wanted != subscribed:
+            log.info(f"Bitget ticker 구독 {len(wanted)}개")
+        subscribed = wanted
+        try:
+            await asyncio.wait_for(bitget_symbols_changed.wait(), max(next_ping - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            await ws.send("ping")
+            next_ping = time.monotonic() + BITGET_PING_SEC
+
+
+def handle_bitget_frame(raw):
+    updates = parse_bitget_frame(raw)
+    if updates:
+        funding_cache.update_live("Bitget", updates)
+
+
+async def bitget_read(ws):
+    async for raw in ws:
+        if raw == "pong":
+            continue
+        metrics.messages.inc("bitget_funding")
+        recorder.record("bitget_funding", raw)
+        handle_bitget_frame(raw)
+
+
+async def bitget_funding_stream():
+    backoff = 1
+    while True:
+        try:
+            async with websockets.connect(BITGET_PUBLIC_URL, ping_interval=None) as ws:
+                log.info("Bitget 펀딩레이트 스트림 연결됨")
+                backoff = 1
+                tasks = {asyncio.create_task(bitget_keepalive(ws)), asyncio.create_task(bitget_read(ws))}
+                try:
+                    done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                for task in done:
+                    task.result()  # 예외를 밖으로 올려서 재연결
+                raise ConnectionError("스트림 종료")
+        except Exception as e:
+            log.error(f"Bitget 펀딩레이트 스트림 오류, 재시도: {e}")
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+
+# -----------------------------
+# 발행 루프
+# -----------------------------
+async def publish_loop():
+    """스트림 변경분을 모아서 LIVE_PUBLISH_SEC 마다 한 번 스냅샷 발행"""
+    while True:
+        await asyncio.sleep(LIVE_PUBLISH_SEC)
+        try:
+            funding_cache.publish_live()
+        except Exception as e:
+            log.error(f"실시간 펀딩레이트 발행 오류: {e}", exc_info=True)
+
+
+def start():
+    funding_cache.listeners.append(on_snapshot)
+    loop = asyncio.get_running_loop()
+    loop.create_task(binance_funding_stream())
+    loop.create_task(bitget_funding_stream())
+    loop.create_task(publish_loop())
@@ -0,0 +1,171 @@
+import asyncio, logging, os, signal, sys, threading, time, traceback
+from collections import Counter
+from backend import metrics
+
+# 이벤트 루프 지연 감시 + 샘플링 프로파일러 (재시작 없이 운영 중인 프로세스에서)
+# - 루프 태스크가 LOOP_TICK_SEC 마다 깨어나며 예정보다 늦은 만큼을 지연으로 기록 (/metrics 히스토그램)
+# - 감시 스레드는 그 heartbeat 가 LOOP_STALL_SEC 넘게 멈추면 그 순간 루프 스레드의 스택과
+#   실행 중인 태스크를 로그로 남긴다 (루프가 막혀 있는 동안 잡아야 막은 코드가 보임)
+# - profile() 은 N초 동안 스레드 스택을 hz 로 샘플링해서 folded stack 텍스트로 반환
+#   (flamegraph.pl / inferno / speedscope 에 그대로 넣으면 flamegraph)
+LOOP_TICK_SEC = 0.05
+LOOP_STALL_SEC = float(os.getenv("LOOP_STALL_SEC", "0.25"))
+STALL_STACK_LIMIT = 30   # 로그에 남길 스택 프레임 수 (안쪽부터)
+PROFILE_MAX_SEC = 30     # 프로파일 중에는 루프 스레드가 샘플마다 시그널 핸들러를 돌므로 짧고 성기게
+PROFILE_MAX_HZ = 250
+
+log = logging.getLogger("loop-monitor")
+
+loop = None
+loop_thread_id = None
+beat = 0.0           # heartbeat 태스크가 마지막으로 깨어난 시각 (perf_counter)
+stalls = 0
+max_lag = 0.0
+last_stall = None    # {"at", "lag_ms", "task", "stack"}
+profiling = False
+
+lag_seconds = metrics.Histogram(
+    "event_loop_lag_seconds", "이벤트 루프 스케줄링 지연 (sleep 이 예정보다 늦게 깨어난 시간)",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+metrics.Collected("event_loop_stalls_total", "LOOP_STALL_SEC 넘게 막힌 횟수", lambda: stalls, kind="counter")
+
+
+async def heartbeat():
+    global beat, max_lag
+    while True:
+        expected = time.perf_counter() + LOOP_TICK_SEC
+        await asyncio.sleep(LOOP_TICK_SEC)
+        beat = time.perf_counter()
+        lag = max(beat - expected, 0.0)
+        lag_seconds.observe(lag)
+        max_lag = max(max_lag, lag)
+        if lag >= LOOP_STALL_SEC:
+            log.warning(f"🐌 이벤트 루프 {lag * 1000:.0f}ms 막힘")
+
+
+def task_name(task) -> str:
+    if task is None:
+        return "(태스크 밖 콜백)"
+    return f"{task.get_name()} {task.get_coro().__qualname__}"
+
+
+def watchdog():
+    """별도 스레드: heartbeat 가 멈춘 동안 루프 스레드가 실행 중인 코드를 잡는다 (멈춤당 한 번)"""
+    global stalls, last_stall
+    reported = None
+    while True:
+        time.sleep(LOOP_TICK_SEC)
+        seen = beat
+        if time.perf_counter() - seen < LOOP_TICK_SEC + LOOP_STALL_SEC or reported == seen:
+            continue
+        reported = seen
+        frame = sys._current_frames().get(loop_thread_id)
+        if frame is None:
+            continue
+        stalls += 1
+        stack = traceback.format_stack(frame)[-STALL_STACK_LIMIT:]
+        last_stall = {
+            "at": time.time(),
+            "lag_ms": round((time.perf_counter() - seen - LOOP_TICK_SEC) * 1000, 1),
+            "task": task_name(asyncio.current_task(loop)),
+            "stack": stack,
+        }
+        log.warning(
+            f"🐌 이벤트 루프가 {LOOP_STALL_SEC * 1000:.0f}ms 넘게 막힘, 실행 중: {last_stall['task']}\n"
+            + "".join(stack)
+        )
+
+
+def start():
+    """lifespan 에서 한 번 (루프 안에서 호출)"""
+    global loop, loop_thread_id, beat
+    if loop is not None:
+        return
+    loop = asyncio.get_running_loop()
+    loop_thread_id = threading.get_ident()
+    beat = time.perf_counter()
+    loop.create_task(heartbeat(), name="loop-heartbeat")
+    threading.Thread(target=watchdog, name="loop-watchdog", daemon=True).start()
+    log.info(f"이벤트 루프 감시 시작 (막힘 기준 {LOOP_STALL_SEC * 1000:.0f}ms)")
+
+
+def stats() -> dict:
+    return {
+        "stall_threshold_ms": LOOP_STALL_SEC * 1000,
+        "stalls": stalls,
+        "max_lag_ms": round(max_lag * 1000, 1),
+        "last_stall": last_stall,
+    }
+
+
+# -----------------------------
+# 샘플링 프로파일러
+# -----------------------------
+def short_path(filename: str) -> str:
+    """라이브러리는 패키지 경로부터, 우리 코드는 backend/ 부터, 나머지(표준 라이브러리)는 파일 이름만"""
+    if "site-packages/" in filename:
+        return filename.rsplit("site-packages/", 1)[1]
+    if "/backend/" in filename:
+        return "backend/" + filename.rsplit("/backend/", 1)[1]
+    return os.path.basename(filename)
+
+
+def frame_label(frame) -> str:
+    # 줄 번호 대신 함수 시작 줄로 묶어서 같은 함수 샘플이 한 칸에 모이게 한다
+    code = frame.f_code
+    return f"{code.co_qualname} ({short_path(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def folded_stack(frame, root: str) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.append(root)
+    return ";".join(reversed(labels))
+
+
+def sample_threads(seconds: float, hz: float, counts: Counter):
+    """스레드에서 실행: 루프 밖 스레드(pybitget / 기록 등) 스택을 모은다"""
+    names = {t.ident: t.name for t in threading.enumerate()}
+    me = threading.get_ident()
+    interval = 1 / hz
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident not in (me, loop_thread_id):
+                counts[folded_stack(frame, names.get(ident, f"thread-{ident}"))] += 1
+        time.sleep(interval)
+
+
+async def profile(seconds: float, hz: float, all_threads: bool = False) -> str:
+    """seconds 동안 샘플링해서 'root;...;leaf 개수' 줄로 반환. 동시에 하나만 (실행 중이면 RuntimeError)
+    루프 스레드는 SIGALRM 타이머로 샘플링한다: 핸들러가 루프 스레드에서 중단된 프레임을 그대로 받음.
+    (다른 스레드에서 sys._current_frames() 로 보면 GIL 을 넘겨받는 순간 = select 대기에서만 잡혀서 치우침)
+    wall-clock 기준이라 select 대기(유휴)와 동기 블로킹 호출도 샘플에 그대로 잡힌다."""
+    global profiling
+    if profiling:
+        raise RuntimeError("이미 프로파일링 중")
+    if threading.get_ident() != threading.main_thread().ident:
+        raise RuntimeError("이벤트 루프가 메인 스레드에서 돌 때만 가능 (signal 타이머)")
+    profiling = True
+    seconds, hz = min(max(seconds, 0.1), PROFILE_MAX_SEC), min(max(hz, 1), PROFILE_MAX_HZ)
+    counts = Counter()
+
+    def on_sample(signum, frame):
+        counts[folded_stack(frame, "event-loop")] += 1
+
+    previous = signal.signal(signal.SIGALRM, on_sample)
+    log.info(f"🔬 샘플링 프로파일 시작 ({seconds:g}초, {hz:g}Hz, {'전체 스레드' if all_threads else '이벤트 루프'})")
+    try:
+        signal.setitimer(signal.ITIMER_REAL, 1 / hz, 1 / hz)
+        if all_threads:
+            await asyncio.to_thread(sample_threads, seconds, hz, counts)
+        else:
+            await asyncio.sleep(seconds)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+        profiling = False
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
@@ -3,39 +3,79 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 
-from backend.routers import api, views, private_api, order_api, ws_router, binance_ws, unified_ws
-from backend.update_task import update_loop
-from pybitget.stream import SubscribeReq
+from backend.routers import api, views, private_api, order_api, ws_router, binance_ws, unified_ws, gap_ws, monitor
+from backend.update_task import update_loop, close_http_client, get_http_client
+from backend import fanout, trading_rules, live_funding, ingest_bus, rate_limit, recorder, loop_monitor, tick_trace
+from backend.exchange_clients import close_exchange_clients
+from backend.position_store import store
 
 # ✅ binance_start 불러오기
-from backend.routers.binance_ws import binance_start  
+from backend.routers.binance_ws import binance_start
 
 logging.basicConfig(level=logging.INFO)
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
+
+async def start_ingest():
+    """거래소 스트림 / 폴링 / 펀딩 갱신 시작 (APP_ROLE=all 또는 ingest 프로세스에서만)"""
     loop = asyncio.get_running_loop()
     ws_router.loop = loop
     binance_ws.loop = loop   # Binance도 동일하게 루프 주입
 
-    # Bitget 초기 구독
-    ws_router.bitget_ws.subscribe(
-        [SubscribeReq("umcbl", "positions", "default")],
-        ws_router.on_message
-    )
+    # RECORD_DIR 가 있으면 거래소 원본 프레임 기록 (python -m backend.replay 로 재현)
+    recorder.start()
+
+    # Bitget 초기 구독 (연결될 때까지 블로킹하는 build() 는 스레드에서)
+    await asyncio.to_thread(ws_router.start)
     print("🚀 Bitget positions 구독 시작")
 
-    # ✅ Binance 스타터 실행 (포지션 리프레시 + 마크프라이스 스트림)
+    # ✅ Binance 스타터 실행 (포지션 user-data 스트림 + REST 대조 + 마크프라이스 스트림)
     await binance_start()
     print("🚀 Binance start 실행")
 
+    # 실시간 펀딩레이트 스트림 (매 분 갱신은 DB 배치 저장 + 주기적 REST 대조)
+    live_funding.start()
+
     # 기타 업데이트 루프
     asyncio.create_task(update_loop())
+
+    # 거래소 서버 시계 차이 (틱 지연을 거래소 이벤트 시각부터 재기 위해, 웹 워커는 ingest 버스로 받음)
+    asyncio.create_task(tick_trace.clock_sync_loop(get_http_client))
+
+
+async def stop_ingest():
+    print("🛑 Bitget/ Binance 연결 닫기")
+    ws_router.close()
+    recorder.stop()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 포지션/마크 업데이트를 모아서 세 WS 엔드포인트에 한 번에 전송
+    fanout.scheduler.start(unified_ws.flush)
+
+    # 거래소 스트림 메시지를 루프 태스크 하나에서만 적용 (Bitget 콜백 스레드는 큐에 넣기만 함)
+    store.start()
+
+    # 루프 지연 감시 (LOOP_STALL_SEC 넘게 막히면 막은 코드의 스택을 로그로)
+    loop_monitor.start()
+
+    if ingest_bus.APP_ROLE == "web":
+        # 거래소 연결은 ingest 프로세스가 갖고, 이 워커는 버스로 받은 상태만 서빙
+        # 주문 / 계정 조회 REST 는 워커에서 나가므로 요청 한도를 ingest·다른 워커와 나눠 갖는다
+        rate_limit.split_for_processes()
+        asyncio.create_task(ingest_bus.subscribe_loop())
+    else:
+        await start_ingest()
+
+    # 주문 규칙 인덱스 (심볼별 step / tick / 최소 주문)
+    asyncio.create_task(trading_rules.refresh_loop())
     yield
 
-    print("🛑 앱 종료, Bitget/ Binance 연결 닫기")
-    ws_router.bitget_ws.close()
-    # Binance는 AsyncClient.close_connection() 호출해도 됨
+    print("🛑 앱 종료")
+    if ingest_bus.APP_ROLE != "web":
+        await stop_ingest()
+    await close_http_client()
+    await close_exchange_clients()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -51,8 +91,10 @@ app.include_router(order_api.router, prefix="/api")
 app.include_router(ws_router.router)
 app.include_router(binance_ws.router)
 app.include_router(unified_ws.router)
+app.include_router(gap_ws.router)
+app.include_router(monitor.router)
 
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run("main:app", host="0.0.0.0", port=port)
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=port, ws_per_message_deflate=fanout.WS_PER_MESSAGE_DEFLATE)
\ No newline at end of file
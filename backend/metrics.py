@@ -0,0 +1,138 @@
+import time
+from bisect import bisect_left
+
+# 프로세스 내 계측 + Prometheus 텍스트 포맷 출력 (GET /metrics)
+# 틱 경로에서는 dict / list 원소 하나 더하기만 하고, 문자열 포맷은 스크레이프할 때만 한다.
+# 웹 워커를 여러 개 띄우면(APP_ROLE=web) 워커마다 따로 집계된다 (스크레이프한 워커의 값).
+# 분리 실행에서 스트림 수신 / 적용 / 펀딩 갱신 지표는 ingest 프로세스의 INGEST_MONITOR_PORT /metrics 에 있다.
+PREFIX = "arb_"
+
+# 초 단위 버킷: 틱 경로(메시지 적용 / flush)는 µs~ms, 갱신 / 주문은 ms~s
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+SLOW_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+registry = []   # 출력 순서대로
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def label_str(names, values, extra: str = "") -> str:
+    pairs = [f'{n}="{escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labels = tuple(labels)
+        registry.append(self)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    """증가만 하는 값. inc(*라벨값, amount=1) — 다른 스레드(pybitget)에서 불러도 됨"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        super().__init__(name, help, labels)
+        self.values = {}    # {라벨값 tuple: 값}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{label_str(self.labels, k)} {number(v)}" for k, v in list(self.values.items())]
+
+
+class Histogram(Metric):
+    """고정 버킷 히스토그램. observe 는 bisect 한 번 + 원소 두 개 더하기"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=FAST_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self.series = {}    # {라벨값 tuple: [버킷별 개수..., +Inf 개수, 합계]}
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = []
+        for labels, series in list(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                le = 'le="' + (bound if bound == "+Inf" else f"{bound:g}") + '"'
+                lines.append(f"{self.name}_bucket{label_str(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{label_str(self.labels, labels)} {number(series[-1])}")
+            lines.append(f"{self.name}_count{label_str(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Collected(Metric):
+    """스크레이프 시점에 콜백으로 읽는 값 (기존 stats 카운터, 클라이언트 수, 경과 시간 등).
+    collect() 는 숫자 하나 또는 {라벨값 tuple: 값} 을 반환"""
+
+    def __init__(self, name: str, help: str, collect, labels=(), kind: str = "gauge"):
+        super().__init__(name, help, labels)
+        self.collect = collect
+        self.kind = kind
+
+    def render(self) -> list[str]:
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{label_str(self.labels, k)} {number(v)}" for k, v in values.items() if v is not None]
+
+
+def render() -> str:
+    lines = []
+    for metric in registry:
+        try:
+            body = metric.render()
+        except Exception as e:
+            body = [f"# {metric.name} 수집 실패: {escape(e)}"]
+        lines += metric.header() + body
+    return "\n".join(lines) + "\n"
+
+
+def since(started: float) -> float:
+    """perf_counter 기준 경과 초"""
+    return time.perf_counter() - started
+
+
+# -----------------------------
+# 틱 / 요청 경로에서 직접 올리는 값
+# -----------------------------
+messages = Counter("stream_messages_total", "거래소 스트림에서 받은 프레임 수", ("stream",))
+message_seconds = Histogram(
+    "ingest_message_seconds", "on_message 로 들어온 메시지 1개를 store handler 가 적용한 시간", ("kind",),
+)
+broadcast_seconds = Histogram("broadcast_flush_seconds", "브로드캐스트 flush 1회 (재계산 + 직렬화 + 채널에 넣기)")
+ws_bytes = Counter("ws_sent_bytes_total", "웹소켓 클라이언트에 실제로 쓴 바이트", ("endpoint",))
+ws_frames = Counter("ws_sent_frames_total", "웹소켓 클라이언트에 실제로 쓴 프레임 수", ("endpoint",))
+refresh_seconds = Histogram(
+    "funding_refresh_seconds", "update_loop 펀딩레이트 갱신 단계별 시간 (exchange=all 은 거래소 공통 단계)",
+    ("exchange", "phase"), SLOW_BUCKETS,
+)
+order_stage_seconds = Histogram(
+    "order_stage_seconds", "order_api 주문 단계별 시간", ("endpoint", "stage"), SLOW_BUCKETS,
+)
+orders = Counter("orders_total", "order_api 주문 결과", ("endpoint", "status"))
@@ -1,12 +1,32 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, UniqueConstraint, PrimaryKeyConstraint
 from backend.database import Base
 
 class FundingRate(Base):
     __tablename__ = "funding_rates"
+    __table_args__ = (
+        # 거래소+심볼당 최신 1행만 유지 (bulk upsert 의 ON CONFLICT 대상)
+        UniqueConstraint("exchange", "symbol", name="uq_funding_rates_exchange_symbol"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    symbol = Column(String, index=True)
-    exchange = Column(String)
+    symbol = Column(String, index=True, nullable=False)
+    exchange = Column(String, nullable=False)
     funding_rate = Column(Float)
     next_funding_time = Column(DateTime(timezone=True))
     timestamp = Column(DateTime(timezone=True))
+
+
+class FundingRateHistory(Base):
+    """분 단위 펀딩레이트 이력 (append-only). Postgres 에서는 ts 기준 월별 파티션"""
+    __tablename__ = "funding_rate_history"
+    __table_args__ = (
+        # (exchange, symbol, ts) 가 PK 이자 조회 인덱스. 파티션 키(ts)를 포함해야 함
+        PrimaryKeyConstraint("exchange", "symbol", "ts", name="pk_funding_rate_history"),
+        {"postgresql_partition_by": "RANGE (ts)"},
+    )
+
+    exchange = Column(String(16), nullable=False)
+    symbol = Column(String(32), nullable=False)
+    ts = Column(DateTime(timezone=True), nullable=False)
+    funding_rate = Column(Float, nullable=False)
+    next_funding_time = Column(DateTime(timezone=True))
@@ -0,0 +1,265 @@
+import asyncio, logging, os, time
+from types import MappingProxyType
+from backend import fanout, metrics, tick_trace
+
+# 포지션/마크프라이스 상태의 단일 writer 저장소 (이벤트 루프 소유)
+# - pybitget 스레드 같은 외부 스레드는 submit_threadsafe() 로 원본 메시지만 넣는다
+# - 루프 태스크가 큐를 배치로 꺼내 거래소별 handler 를 실행해 상태를 바꾼다
+# - 읽는 쪽(브로드캐스트 등)은 배치마다 새로 만드는 불변 스냅샷만 본다
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+INGEST_BATCH_SIZE = 500  # 한 번에 꺼내서 적용하는 최대 메시지 수
+
+log = logging.getLogger("position-store")
+
+EMPTY = MappingProxyType({})
+
+
+def to_float(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class PositionRecord:
+    """포지션 1개. 숫자는 수신 시 한 번만 파싱하고, 화면용 원본 문자열은 그대로 둔다.
+    스냅샷끼리 같은 객체를 공유하므로 만든 뒤에는 바꾸지 않는다 (마크 변경은 with_mark 로 새로 만듦).
+    row / unified 는 브로드캐스트 포맷 캐시 (처음 쓸 때 한 번 만들어 둠).
+    trace 는 마지막 마크 틱의 (거래소 이벤트 ms, 수신 ns, 적용 ns), tick_trace 참고."""
+    __slots__ = ("symbol", "base", "side", "sign", "size", "entry", "size_raw", "entry_raw",
+                 "upl_raw", "liq", "margin", "margin_type", "mark", "mark_raw", "upl", "row", "unified", "trace")
+
+    def __init__(self, symbol, base, side, size_raw, entry_raw, upl_raw=None,
+                 liq=None, margin=None, margin_type=None, sign=1, mark_raw=None, trace=None):
+        self.symbol = symbol
+        self.base = base            # 통합 화면 심볼 (PEPEUSDT)
+        self.side = side
+        self.sign = sign            # UPL 방향 (Binance 는 size 에 부호, Bitget 숏은 -1)
+        self.size_raw = size_raw
+        self.entry_raw = entry_raw
+        self.size = to_float(size_raw)
+        self.entry = to_float(entry_raw)
+        self.upl_raw = upl_raw      # 거래소가 준 UPL (마크가 없을 때 사용)
+        self.liq = liq
+        self.margin = margin
+        self.margin_type = margin_type
+        self.trace = trace
+        self.set_mark(mark_raw)
+
+    def set_mark(self, mark_raw):
+        self.mark_raw = mark_raw
+        self.mark = to_float(mark_raw)
+        if self.mark and self.entry and self.size:
+            self.upl = (self.mark - self.entry) * self.size * self.sign
+        else:
+            self.upl = self.upl_raw
+        self.row = None
+        self.unified = None
+
+    def with_mark(self, mark_raw, trace=None) -> "PositionRecord":
+        """마크프라이스만 바뀐 새 레코드 (이 포지션의 UPL 만 다시 계산)"""
+        rec = object.__new__(PositionRecord)
+        for name in PositionRecord.__slots__:
+            setattr(rec, name, getattr(self, name))
+        rec.trace = trace
+        rec.set_mark(mark_raw)
+        return rec
+
+    def same_position(self, other) -> bool:
+        """거래소 값이 같으면 기존 레코드(와 포맷 캐시)를 그대로 쓴다"""
+        return (
+            other is not None
+            and self.size_raw == other.size_raw
+            and self.entry_raw == other.entry_raw
+            and self.upl_raw == other.upl_raw
+            and self.liq == other.liq
+            and self.margin == other.margin
+            and self.margin_type == other.margin_type
+        )
+
+
+def set_mark(positions: dict, keys, mark_raw, trace=None):
+    """해당 키 포지션들만 새 마크로 교체"""
+    for key in keys:
+        rec = positions.get(key)
+        if rec is not None and rec.mark_raw != mark_raw:
+            positions[key] = rec.with_mark(mark_raw, trace)
+
+
+def put_position(positions: dict, key, rec: PositionRecord):
+    """값이 같으면 기존 레코드 유지 (포맷 캐시 재사용)"""
+    if not rec.same_position(positions.get(key)):
+        positions[key] = rec
+
+
+# 스냅샷 상태 맵 (웹 워커 복제 단위). 레코드 맵은 PositionRecord 생성자 인자 목록으로 보낸다
+STATE_MAPS = ("binance_positions", "binance_marks", "bitget_positions", "bitget_pos_to_base", "bitget_marks")
+RECORD_MAPS = ("binance_positions", "bitget_positions")
+RECORD_ARGS = ("symbol", "base", "side", "size_raw", "entry_raw", "upl_raw",
+               "liq", "margin", "margin_type", "sign", "mark_raw", "trace")
+
+
+class StoreSnapshot:
+    """읽기 전용 상태 스냅샷 (MappingProxyType 이라 수정 불가)"""
+    __slots__ = ("version", "binance_positions", "binance_marks",
+                 "bitget_positions", "bitget_pos_to_base", "bitget_marks")
+
+    def __init__(self, version=0, binance_positions=EMPTY, binance_marks=EMPTY,
+                 bitget_positions=EMPTY, bitget_pos_to_base=EMPTY, bitget_marks=EMPTY):
+        self.version = version
+        self.binance_positions = binance_positions    # {symbol: PositionRecord}
+        self.binance_marks = binance_marks            # {symbol: markPrice}
+        self.bitget_positions = bitget_positions      # {(instId, side): PositionRecord}
+        self.bitget_pos_to_base = bitget_pos_to_base  # {(instId, side): base_symbol}
+        self.bitget_marks = bitget_marks              # {base_symbol: markPrice}
+
+
+def snapshot_diff(prev: StoreSnapshot, snapshot: StoreSnapshot) -> dict:
+    """두 스냅샷 사이 바뀐 항목만 (ingest → 웹 워커). 레코드는 값이 바뀔 때만 새 객체라 identity 비교로 충분"""
+    changed, removed = {}, {}
+    for name in STATE_MAPS:
+        old, new = getattr(prev, name), getattr(snapshot, name)
+        items = [
+            [key, [getattr(value, a) for a in RECORD_ARGS] if name in RECORD_MAPS else value]
+            for key, value in new.items()
+            if key not in old or old[key] != value
+        ]
+        gone = [key for key in old if key not in new]
+        if items:
+            changed[name] = items
+        if gone:
+            removed[name] = gone
+    return {"changed": changed, "removed": removed}
+
+
+def apply_replica(st, diff: dict):
+    """웹 워커 handler: ingest 프로세스가 보낸 snapshot_diff 적용 (reset 이면 전체 교체)"""
+    if diff.get("reset"):
+        for name in STATE_MAPS:
+            getattr(st, name).clear()
+    for name, items in diff["changed"].items():
+        target = getattr(st, name)
+        for key, value in items:
+            # 튜플 키 (Bitget (instId, side)) 는 JSON 에서 리스트로 온다
+            key = tuple(key) if isinstance(key, list) else key
+            if name in RECORD_MAPS:
+                rec = value = PositionRecord(*value)
+                if rec.trace:
+                    # 적용 시각은 이 워커 상태에 반영된 시각으로 (버스 구간이 receive_to_apply 에 들어감)
+                    rec.trace = tick_trace.applied(name.split("_")[0], rec.trace[0], rec.trace[1])
+            target[key] = value
+    for name, keys in diff["removed"].items():
+        target = getattr(st, name)
+        for key in keys:
+            target.pop(tuple(key) if isinstance(key, list) else key, None)
+
+
+class PositionStore:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.loop = None
+        self.queue = None
+        self.handlers = {}   # kind → handler(store, data), 루프에서만 실행
+        self.received_ns = 0 # handler 실행 중인 메시지의 수신 시각 (time_ns, submit 시점)
+        self.listeners = []  # 스냅샷 교체마다 listener(prev, snapshot) 호출 (ingest 버스 발행 등)
+
+        # 가변 상태: handler 만 수정 (항상 루프 스레드)
+        self.binance_positions = {}
+        self.binance_marks = {}
+        self.bitget_positions = {}
+        self.bitget_pos_to_base = {}
+        self.bitget_marks = {}
+
+        self.snapshot = StoreSnapshot()
+
+        # 카운터
+        self.received = 0
+        self.applied = 0
+        self.dropped = 0
+        self.errors = 0
+        self.batches = 0
+        self.max_batch = 0
+
+    def register(self, kind: str, handler):
+        self.handlers[kind] = handler
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.loop.create_task(self.run())
+
+    # -----------------------------
+    # ingest
+    # -----------------------------
+    def submit(self, kind: str, data):
+        """루프 안에서 호출 (Binance 태스크 등)"""
+        self.enqueue(kind, data, time.time_ns())
+
+    def submit_threadsafe(self, kind: str, data):
+        """외부 스레드에서 호출 (pybitget 콜백). 루프에 넣기만 하고 바로 반환"""
+        if self.loop is None:
+            self.dropped += 1
+            return
+        self.loop.call_soon_threadsafe(self.enqueue, kind, data, time.time_ns())
+
+    def enqueue(self, kind: str, data, received_ns: int):
+        self.received += 1
+        if self.queue.full():
+            # 밀리면 가장 오래된 메시지를 버림 (포지션/티커 모두 최신 값이 이전 값을 덮음)
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait((kind, data, received_ns))
+
+    async def run(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < INGEST_BATCH_SIZE and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            for kind, data, self.received_ns in batch:
+                started = time.perf_counter()
+                try:
+                    self.handlers[kind](self, data)
+                    self.applied += 1
+                except Exception as e:
+                    self.errors += 1
+                    log.error(f"{kind} 메시지 적용 오류: {e}", exc_info=True)
+                metrics.message_seconds.observe(time.perf_counter() - started, kind)
+
+            self.batches += 1
+            self.max_batch = max(self.max_batch, len(batch))
+            prev = self.snapshot
+            self.publish()
+            for listener in self.listeners:
+                try:
+                    listener(prev, self.snapshot)
+                except Exception as e:
+                    log.error(f"스냅샷 리스너 호출 실패: {e}")
+            fanout.scheduler.mark_dirty()
+
+    def publish(self):
+        """현재 상태를 복사해서 새 불변 스냅샷으로 교체"""
+        self.snapshot = StoreSnapshot(
+            version=self.snapshot.version + 1,
+            binance_positions=MappingProxyType(dict(self.binance_positions)),
+            binance_marks=MappingProxyType(dict(self.binance_marks)),
+            bitget_positions=MappingProxyType(dict(self.bitget_positions)),
+            bitget_pos_to_base=MappingProxyType(dict(self.bitget_pos_to_base)),
+            bitget_marks=MappingProxyType(dict(self.bitget_marks)),
+        )
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "applied": self.applied,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "batches": self.batches,
+            "max_batch": self.max_batch,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "queue_size": self.maxsize,
+        }
+
+
+store = PositionStore(INGEST_QUEUE_SIZE)
+store.register("replica", apply_replica)
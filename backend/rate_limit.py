@@ -0,0 +1,170 @@
+import asyncio, contextvars, heapq, itertools, logging, os, time
+from contextlib import contextmanager
+
+# 거래소별 요청 스케줄러 (주문 / 계정 조회 / 펀딩 갱신 / 포지션 대조 등 모든 REST 호출이 여기를 거친다)
+# - 토큰 버킷: 창(window) 당 허용 weight 를 일정 속도로 채우고, 응답의 used-weight 헤더로 서버 값에 맞춘다
+# - 우선순위: 주문 > 계정 조회 > 백그라운드. 낮은 우선순위는 예산 일부를 남겨두고 먼저 멈춘다
+# - 429 / 418 을 받으면 Retry-After 동안 모든 요청을 멈춘다 (밴 연장 방지)
+ORDER, ACCOUNT, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {ORDER: "order", ACCOUNT: "account", BACKGROUND: "background"}
+RESERVE = {ORDER: 0.0, ACCOUNT: 0.1, BACKGROUND: 0.25}   # 우선순위별로 남겨둘 예산 비율
+
+BINANCE_WEIGHT_LIMIT = int(os.getenv("BINANCE_WEIGHT_LIMIT", "2400"))   # USDⓈ-M 선물 IP weight / 1분
+BITGET_RATE_LIMIT = int(os.getenv("BITGET_RATE_LIMIT", "20"))           # 요청 수 / 1초
+
+# 분리 실행(python -m backend.ingest + APP_ROLE=web 워커 N개)에서는 프로세스마다 스케줄러가 따로라
+# 거래소 한도를 프로세스 수(워커 N + ingest 1)로 나눠 갖는다. WEB_CONCURRENCY 는 uvicorn --workers 기본값과 같은 변수.
+# RATE_LIMIT_SHARE(0~1)를 주면 그 비율을 그대로 쓴다
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+RATE_LIMIT_SHARE = os.getenv("RATE_LIMIT_SHARE")
+
+current_priority = contextvars.ContextVar("request_priority", default=BACKGROUND)
+
+log = logging.getLogger("rate-limit")
+
+
+@contextmanager
+def priority(level: int):
+    """이 블록(과 여기서 띄운 태스크)에서 나가는 거래소 요청의 우선순위 지정"""
+    token = current_priority.set(level)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+async def order_priority():
+    """FastAPI 라우터 의존성: 주문 요청 처리 중 나가는 호출은 주문 우선순위"""
+    current_priority.set(ORDER)
+
+
+async def account_priority():
+    current_priority.set(ACCOUNT)
+
+
+class RateLimitScheduler:
+    def __init__(self, name: str, capacity: int, window: float, used_weight_header: str = None):
+        self.name = name
+        self.limit = capacity        # 거래소(IP) 전체 한도
+        self.window = window
+        self.capacity = capacity     # 이 프로세스 몫 (set_share)
+        self.refill_rate = capacity / window
+        self.used_weight_header = used_weight_header
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.banned_until = 0.0
+        self.cond = asyncio.Condition()
+        self.waiters = []            # heap [(priority, seq)]
+        self.seq = itertools.count()
+
+        # 카운터
+        self.granted = {level: 0 for level in PRIORITY_NAMES}
+        self.throttled = 0           # 바로 못 나가고 기다린 요청 수
+        self.max_wait_ms = 0.0
+        self.server_used = None      # 마지막으로 본 used-weight 헤더 값
+        self.rate_limited = 0        # 429 / 418 받은 횟수
+
+    def set_share(self, share: float):
+        """이 프로세스가 쓸 한도 비율 (분리 실행에서 프로세스끼리 나눠 가짐)"""
+        self.capacity = self.limit * share
+        self.refill_rate = self.capacity / self.window
+        self.tokens = min(self.tokens, self.capacity)
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    async def acquire(self, weight: int = 1, level: int = None):
+        """weight 만큼 예산이 생길 때까지 대기 (같은 우선순위는 도착 순서대로)"""
+        level = current_priority.get() if level is None else level
+        entry = (level, next(self.seq))
+        floor = self.capacity * RESERVE[level]
+        started = time.monotonic()
+
+        async with self.cond:
+            heapq.heappush(self.waiters, entry)
+            try:
+                while True:
+                    self.refill()
+                    now = time.monotonic()
+                    is_head = self.waiters[0] == entry
+                    if is_head and now >= self.banned_until and self.tokens - weight >= floor:
+                        break
+
+                    if now < self.banned_until:
+                        delay = self.banned_until - now
+                    elif is_head:
+                        delay = max((weight + floor - self.tokens) / self.refill_rate, 0.01)
+                    else:
+                        delay = None  # 앞 요청이 나가면 notify 로 깨어남
+                    try:
+                        await asyncio.wait_for(self.cond.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                # 취소된 요청은 대기열에서 빼고 다음 요청을 깨움
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+                self.cond.notify_all()
+                raise
+
+            heapq.heappop(self.waiters)
+            self.tokens -= weight
+            self.cond.notify_all()
+
+        waited_ms = (time.monotonic() - started) * 1000
+        self.granted[level] += 1
+        if waited_ms >= 1:
+            self.throttled += 1
+            self.max_wait_ms = max(self.max_wait_ms, waited_ms)
+
+    def observe(self, status: int, headers):
+        """응답 헤더로 남은 예산을 서버 기준에 맞추고, 429 / 418 이면 Retry-After 동안 멈춤"""
+        if self.used_weight_header:
+            used = headers.get(self.used_weight_header)
+            if used is not None:
+                self.server_used = int(used)
+                self.refill()
+                # used-weight 는 IP 전체(다른 프로세스 포함) 사용량이라 전체 한도에서 뺀 만큼만 남음
+                self.tokens = min(self.tokens, self.limit - self.server_used)
+
+        if status in (418, 429):
+            retry_after = headers.get("Retry-After")
+            pause = float(retry_after) if retry_after else (60.0 if status == 418 else 1.0)
+            self.banned_until = max(self.banned_until, time.monotonic() + pause)
+            self.tokens = 0.0
+            self.rate_limited += 1
+            log.warning(f"⛔ {self.name} {status} 응답 → {pause:g}초 동안 요청 중단")
+
+    def stats(self) -> dict:
+        self.refill()
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for level, _ in self.waiters:
+            queued[PRIORITY_NAMES[level]] += 1
+        return {
+            "limit": self.limit,
+            "capacity": round(self.capacity, 1),
+            "budget": round(self.tokens, 1),
+            "budget_pct": round(self.tokens / self.capacity * 100, 1),
+            "server_used_weight": self.server_used,
+            "queued": queued,
+            "granted": {PRIORITY_NAMES[level]: n for level, n in self.granted.items()},
+            "throttled": self.throttled,
+            "max_wait_ms": round(self.max_wait_ms, 1),
+            "rate_limited": self.rate_limited,
+            "paused_for_sec": round(max(self.banned_until - time.monotonic(), 0), 1),
+        }
+
+
+binance = RateLimitScheduler("Binance", BINANCE_WEIGHT_LIMIT, 60, "X-MBX-USED-WEIGHT-1M")
+bitget = RateLimitScheduler("Bitget", BITGET_RATE_LIMIT, 1)
+schedulers = {"Binance": binance, "Bitget": bitget}
+
+
+def split_for_processes():
+    """분리 실행의 ingest / 웹 워커 프로세스 시작 시 호출: 각자 한도의 1/(워커 수 + 1) 만 쓴다"""
+    share = float(RATE_LIMIT_SHARE) if RATE_LIMIT_SHARE else 1 / (WEB_CONCURRENCY + 1)
+    for scheduler in schedulers.values():
+        scheduler.set_share(share)
+    log.info(f"거래소 요청 한도 {share:.0%} 사용 (웹 워커 {WEB_CONCURRENCY}개 + ingest 와 나눔)")
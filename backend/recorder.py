@@ -0,0 +1,140 @@
+import glob, gzip, logging, os, queue, threading, time
+import orjson
+
+# 거래소 스트림 원본 프레임 기록 (RECORD_DIR 를 설정했을 때만, 기본은 꺼짐)
+# 한 줄 = [수신 시각(ns), 소스, 원본 프레임] 을 gzip NDJSON 으로 쓰고, 크기/시간 기준으로 파일을 돌린다.
+# 기록은 큐에 넣기만 하고 압축/쓰기는 전용 스레드가 해서 이벤트 루프 / pybitget 스레드를 막지 않는다.
+# 되돌려 보기는 python -m backend.replay (같은 handler 에 1x / Nx / 최대 속도로 다시 넣음)
+RECORD_DIR = os.getenv("RECORD_DIR")
+RECORD_ROTATE_MB = float(os.getenv("RECORD_ROTATE_MB", "64"))      # 압축 전 기준
+RECORD_ROTATE_SEC = int(os.getenv("RECORD_ROTATE_SEC", "3600"))
+RECORD_KEEP_FILES = int(os.getenv("RECORD_KEEP_FILES", "48"))
+RECORD_FLUSH_SEC = 5      # 이 간격으로 gzip sync flush (프로세스가 죽어도 그때까지는 읽힘)
+FILE_PATTERN = "frames-*.ndjson.gz"
+
+log = logging.getLogger("recorder")
+
+enabled = False
+frames = queue.SimpleQueue()
+recorded = 0
+dropped = 0
+writer = None
+
+
+def record(source: str, raw):
+    """수신 직후 호출 (어느 스레드에서든). 꺼져 있으면 아무것도 안 함"""
+    if enabled:
+        frames.put((time.time_ns(), source, raw))
+
+
+class FrameWriter(threading.Thread):
+    def __init__(self, directory: str):
+        super().__init__(name="frame-recorder", daemon=True)
+        self.directory = directory
+        self.file = None
+        self.path = None
+        self.opened_at = 0.0
+        self.written = 0
+        self.flushed_at = 0.0
+        self.stopping = False
+
+    def open_next(self):
+        self.close_file()
+        now = time.time()
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}"
+        self.path = os.path.join(self.directory, f"frames-{stamp}.ndjson.gz")
+        self.file = gzip.open(self.path, "ab")
+        self.opened_at = self.flushed_at = time.monotonic()
+        self.written = 0
+        log.info(f"📼 프레임 기록 파일: {self.path}")
+        # 오래된 파일 정리 (이름에 시각이 있어서 정렬 = 시간순)
+        for old in sorted(glob.glob(os.path.join(self.directory, FILE_PATTERN)))[:-RECORD_KEEP_FILES]:
+            os.remove(old)
+
+    def close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def run(self):
+        global recorded, dropped
+        self.open_next()
+        while not (self.stopping and frames.empty()):
+            try:
+                batch = [frames.get(timeout=1)]
+            except queue.Empty:
+                batch = []
+            while not frames.empty() and len(batch) < 1000:
+                batch.append(frames.get_nowait())
+
+            lines = []
+            for ts, source, raw in batch:
+                if isinstance(raw, bytes):
+                    raw = raw.decode()
+                lines.append(orjson.dumps([ts, source, raw]))
+            try:
+                if lines:
+                    data = b"\n".join(lines) + b"\n"
+                    self.file.write(data)
+                    self.written += len(data)
+                    recorded += len(lines)
+
+                now = time.monotonic()
+                if self.written >= RECORD_ROTATE_MB * 1024 * 1024 or now - self.opened_at >= RECORD_ROTATE_SEC:
+                    self.open_next()
+                elif now - self.flushed_at >= RECORD_FLUSH_SEC:
+                    self.file.flush()
+                    self.flushed_at = now
+            except OSError as e:
+                dropped += len(lines)
+                log.error(f"프레임 기록 실패: {e}")
+        self.close_file()
+
+
+def start():
+    """RECORD_DIR 가 있으면 기록 시작"""
+    global enabled, writer
+    if not RECORD_DIR or writer is not None:
+        return
+    os.makedirs(RECORD_DIR, exist_ok=True)
+    writer = FrameWriter(RECORD_DIR)
+    writer.start()
+    enabled = True
+    log.info(f"📼 거래소 원본 프레임 기록 시작: {RECORD_DIR}")
+
+
+def stop():
+    """남은 프레임을 쓰고 파일을 닫음"""
+    global enabled, writer
+    if writer is None:
+        return
+    enabled = False
+    writer.stopping = True
+    writer.join(timeout=10)
+    writer = None
+
+
+def stats() -> dict:
+    return {
+        "enabled": enabled,
+        "dir": RECORD_DIR,
+        "file": writer.path if writer else None,
+        "recorded": recorded,
+        "dropped": dropped,
+        "queued": frames.qsize(),
+    }
+
+
+def read(paths):
+    """기록 파일들을 시간순으로 읽어 (ts_ns, source, raw) 반환. 끝이 잘린 파일(비정상 종료)은 읽을 수 있는 데까지"""
+    files = []
+    for path in paths:
+        files += sorted(glob.glob(os.path.join(path, FILE_PATTERN))) if os.path.isdir(path) else [path]
+    for path in files:
+        try:
+            with gzip.open(path, "rb") as f:
+                for line in f:
+                    ts, source, raw = orjson.loads(line)
+                    yield ts, source, raw
+        except (EOFError, gzip.BadGzipFile, orjson.JSONDecodeError) as e:
+            log.warning(f"{path}: 잘린 기록 파일, 여기까지만 사용 ({e})")
@@ -0,0 +1,149 @@
+import argparse, asyncio, json, logging, os, tempfile, time
+import orjson
+from collections import Counter
+from datetime import datetime
+
+# recorder 로 남긴 원본 프레임을 네트워크 없이 같은 handler 에 다시 넣는다 (재현 / 성능 회귀 / 오프라인 프로파일링)
+#   python -m backend.replay recordings/ --speed 1      기록된 간격 그대로
+#   python -m backend.replay frames-*.ndjson.gz --speed 10
+#   python -m backend.replay recordings/ --speed 0      최대 속도 (처리량 측정)
+# 끝나면 처리량 / 서비스 CPU / store·브로드캐스트 카운터를 JSON 으로 출력 (--out 이면 파일로)
+
+# 네트워크 / 실제 키 없이 import 되도록 기본값 (이미 설정돼 있으면 그대로)
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='usdt-replay-')}/replay.db")
+for key in ("BINANCE_API_KEY", "BINANCE_API_SECRET", "BITGET_API_KEY", "BITGET_API_SECRET", "BITGET_API_PASS"):
+    os.environ.setdefault(key, "replay")
+
+from backend import fanout, funding_cache, live_funding, recorder
+from backend.position_store import store, INGEST_BATCH_SIZE
+from backend.routers import binance_ws, unified_ws
+
+MAX_SPEED_YIELD_EVERY = 200   # 최대 속도일 때도 이 프레임 수마다 루프에 양보 (store / flush 태스크 실행)
+
+log = logging.getLogger("replay")
+
+
+def seed_funding(exchange: str, updates: dict):
+    """기록에는 REST 스냅샷이 없어서 처음 보는 심볼은 스냅샷에 먼저 넣는다 (update_live 는 아는 심볼만 받음)"""
+    current = funding_cache.current
+    known = current.rates.get(exchange, {}) if current else {}
+    missing = {s: v for s, v in updates.items() if s not in known}
+    if missing:
+        rates = dict(current.rates) if current else {}
+        rates[exchange] = {**known, **{s: funding_cache.to_row(s, *v) for s, v in missing.items()}}
+        funding_cache.commit(rates)
+
+
+def replay_binance_funding(raw):
+    seed_funding("Binance", live_funding.parse_binance_frame(raw))
+    live_funding.handle_binance_frame(raw)
+
+
+def replay_bitget_funding(raw):
+    seed_funding("Bitget", live_funding.parse_bitget_frame(raw))
+    live_funding.handle_bitget_frame(raw)
+
+
+def replay_binance_positions(raw):
+    """REST 대조 스냅샷 {symbol: [pos, margin, margin_type]} 을 같은 handler 로"""
+    store.submit("binance_positions", orjson.loads(raw))
+
+
+# 기록 소스 → 실서비스와 같은 처리 경로 (Bitget 은 on_message 가 넣는 것과 같은 store 큐로)
+HANDLERS = {
+    "bitget": lambda raw: store.submit("bitget", raw),
+    "binance_positions": replay_binance_positions,
+    "binance_marks": binance_ws.handle_mark_frame,
+    "binance_user": binance_ws.handle_user_event,
+    "binance_funding": replay_binance_funding,
+    "bitget_funding": replay_bitget_funding,
+}
+
+
+async def replay(paths, speed: float) -> dict:
+    store.start()
+    fanout.scheduler.start(unified_ws.flush)
+    publisher = asyncio.create_task(live_funding.publish_loop())
+
+    counts = Counter()
+    errors = Counter()
+    first_ts = last_ts = None
+    started = time.perf_counter()
+    cpu_before = time.thread_time()
+
+    for i, (ts, source, raw) in enumerate(recorder.read(paths)):
+        if first_ts is None:
+            first_ts = ts
+        last_ts = ts
+
+        if speed > 0:
+            delay = (ts - first_ts) / 1e9 / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif i % MAX_SPEED_YIELD_EVERY == 0 or store.queue.qsize() >= INGEST_BATCH_SIZE:
+            await asyncio.sleep(0)
+
+        handler = HANDLERS.get(source)
+        if handler is None:
+            errors[f"unknown:{source}"] += 1
+            continue
+        try:
+            handler(raw)
+            counts[source] += 1
+        except Exception as e:
+            errors[source] += 1
+            log.debug(f"{source} 프레임 처리 오류: {e}")
+
+    # 큐에 남은 메시지와 마지막 변경분까지 반영
+    while store.queue.qsize():
+        await asyncio.sleep(0.01)
+    funding_cache.publish_live()
+    wall = time.perf_counter() - started
+    cpu = time.thread_time() - cpu_before
+    await asyncio.sleep(fanout.scheduler.min_interval)
+    publisher.cancel()
+
+    frames = sum(counts.values())
+    span = (last_ts - first_ts) / 1e9 if first_ts is not None else 0
+    snapshot = store.snapshot
+    return {
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "paths": list(paths),
+        "speed": speed or "max",
+        "frames": dict(counts),
+        "errors": dict(errors),
+        "recorded_span_sec": round(span, 3),
+        "wall_sec": round(wall, 3),
+        "speedup": round(span / wall, 2) if wall else None,
+        "frames_per_sec": round(frames / wall, 1) if wall else None,
+        "service_cpu_sec": round(cpu, 4),
+        "cpu_us_per_frame": round(cpu / frames * 1e6, 2) if frames else None,
+        "ingest": store.stats(),
+        "broadcast": fanout.scheduler.stats(),
+        "final_state": {
+            "binance_positions": len(snapshot.binance_positions),
+            "bitget_positions": len(snapshot.bitget_positions),
+            "funding_version": funding_cache.current.version if funding_cache.current else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="기록된 거래소 프레임을 같은 handler 에 다시 넣어 재현")
+    parser.add_argument("paths", nargs="+", help="기록 파일 또는 RECORD_DIR 디렉터리")
+    parser.add_argument("--speed", type=float, default=1.0, help="재생 배속 (1 = 기록 간격 그대로, 0 = 최대 속도)")
+    parser.add_argument("--out", default=None, help="결과 JSON 파일 (없으면 표준 출력)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    result = asyncio.run(replay(args.paths, args.speed))
+    body = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(body)
+    else:
+        print(body)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,85 @@
-from fastapi import APIRouter, Depends
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from backend.models import FundingRate
-from backend.database import get_db
+from backend.models import FundingRateHistory
+from backend.database import get_db, SessionLocal
+from backend import funding_cache
 
 router = APIRouter()
 
+HISTORY_CHUNK_ROWS = 2000  # /api/history 가 DB 커서에서 한 번에 꺼내 보내는 행 수
+
+
+def snapshot_response(request: Request, snapshot, view: str) -> Response:
+    """미리 직렬화된 스냅샷 본문 + ETag. If-None-Match 가 맞으면 304"""
+    etag = snapshot.etag(view)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(snapshot.views[view], media_type="application/json", headers=headers)
+
+
+# DB 는 콜드 스타트(첫 갱신 전) 때만 조회하고, 이후에는 update_task 가 발행한 스냅샷을 사용
 @router.get("/api/binance/latest")
-async def get_binance_latest(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(FundingRate).where(FundingRate.exchange == "Binance"))
-    rows = result.scalars().all()
-    return [
-        {
-            "symbol": r.symbol,
-            "funding_rate": r.funding_rate,
-            "next_funding_time": r.next_funding_time.isoformat() if r.next_funding_time else None
-        }
-        for r in rows
-    ]
+async def get_binance_latest(request: Request, db: AsyncSession = Depends(get_db)):
+    snapshot = funding_cache.current or await funding_cache.load(db)
+    return snapshot_response(request, snapshot, "binance")
 
 @router.get("/api/bitget/latest")
-async def get_bitget_latest(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(FundingRate).where(FundingRate.exchange == "Bitget"))
-    rows = result.scalars().all()
-    return [
-        {
-            "symbol": r.symbol,
-            "funding_rate": r.funding_rate,
-            "next_funding_time": r.next_funding_time.isoformat() if r.next_funding_time else None
-        }
-        for r in rows
-    ]
+async def get_bitget_latest(request: Request, db: AsyncSession = Depends(get_db)):
+    snapshot = funding_cache.current or await funding_cache.load(db)
+    return snapshot_response(request, snapshot, "bitget")
 
 @router.get("/api/gap")
-async def get_gap(db: AsyncSession = Depends(get_db)):
-    binance_rows = {r.symbol: r for r in (await db.execute(
-        select(FundingRate).where(FundingRate.exchange == "Binance")
-    )).scalars().all()}
-
-    bitget_rows = {r.symbol: r for r in (await db.execute(
-        select(FundingRate).where(FundingRate.exchange == "Bitget")
-    )).scalars().all()}
-
-    gaps = []
-    for symbol, b_row in binance_rows.items():
-        if symbol in bitget_rows:
-            g_row = bitget_rows[symbol]
-            gap = b_row.funding_rate - g_row.funding_rate
-            gaps.append({
-                "symbol": symbol,
-                "binance_rate": b_row.funding_rate,
-                "bitget_rate": g_row.funding_rate,
-                "gap": gap,
-                "next_funding_time": b_row.next_funding_time.isoformat() if b_row.next_funding_time else None
-            })
-    return gaps
\ No newline at end of file
+async def get_gap(request: Request, db: AsyncSession = Depends(get_db)):
+    snapshot = funding_cache.current or await funding_cache.load(db)
+    return snapshot_response(request, snapshot, "gap")
+
+
+@router.get("/api/history")
+async def get_history(
+    start: datetime,
+    end: Optional[datetime] = None,
+    exchange: Optional[str] = None,
+    symbol: Optional[str] = None,
+):
+    """펀딩레이트 이력을 NDJSON 으로 스트리밍 (한 줄 = 한 행, 전체를 메모리에 올리지 않음)"""
+    stmt = select(
+        FundingRateHistory.exchange,
+        FundingRateHistory.symbol,
+        FundingRateHistory.ts,
+        FundingRateHistory.funding_rate,
+        FundingRateHistory.next_funding_time,
+    ).where(FundingRateHistory.ts >= start)
+    if end is not None:
+        stmt = stmt.where(FundingRateHistory.ts < end)
+    if exchange:
+        stmt = stmt.where(FundingRateHistory.exchange == exchange)
+    if symbol:
+        stmt = stmt.where(FundingRateHistory.symbol == symbol)
+    stmt = stmt.order_by(
+        FundingRateHistory.exchange, FundingRateHistory.symbol, FundingRateHistory.ts
+    ).execution_options(yield_per=HISTORY_CHUNK_ROWS)
+
+    async def stream_rows():
+        # 응답이 끝날 때까지 커서를 열어둬야 하므로 요청 의존성(get_db) 대신 자체 세션 사용
+        async with SessionLocal() as db:
+            result = await db.stream(stmt)
+            async for rows in result.partitions():
+                yield "".join(
+                    json.dumps({
+                        "exchange": r.exchange,
+                        "symbol": r.symbol,
+                        "ts": r.ts.isoformat(),
+                        "funding_rate": r.funding_rate,
+                        "next_funding_time": r.next_funding_time.isoformat() if r.next_funding_time else None,
+                    }) + "\n"
+                    for r in rows
+                )
+
+    return StreamingResponse(stream_rows(), media_type="application/x-ndjson")
@@ -1,20 +1,31 @@
 import os, asyncio, json, logging
+import orjson
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from dotenv import load_dotenv
-from binance import AsyncClient
-from backend.routers import unified_ws
+from backend import fanout, metrics, recorder, tick_trace
+from backend.exchange_clients import get_binance_client
+from backend.position_store import store, PositionRecord, put_position, set_mark, to_float
 import websockets
 
 router = APIRouter()
 active_clients = set()
 loop = None  # run_coroutine_threadsafe에 사용할 이벤트 루프
 
-# 상태
-last_positions = {}        # {symbol: pos(dict)}
-last_mark_prices = {}      # {symbol: markPrice(str)}
-subscribed_symbols = set() # 현재 마크프라이스 스트림에 구독 중인 심볼들
+# 상태 (포지션 / markPrice 는 position_store 가 보관)
+subscribed_symbols = set() # 마크프라이스를 받아야 하는 심볼들 (열린 포지션)
 symbols_changed = asyncio.Event()  # 구독 집합 변경 알림
 
+# 연결 하나를 유지하고 SUBSCRIBE / UNSUBSCRIBE 제어 프레임으로 구독만 바꾼다
+MARK_STREAM_URL = "wss://fstream.binance.com/stream"
+
+# 포지션은 user-data 스트림(listenKey) 이벤트로 즉시 반영하고, REST 는 초기 스냅샷 + 느린 대조에만 쓴다
+USER_STREAM_URL = "wss://fstream.binance.com/ws/"
+LISTEN_KEY_KEEPALIVE_SEC = 30 * 60   # listenKey 는 60분 유효, 30분마다 연장
+RECONCILE_SEC = int(os.getenv("BINANCE_RECONCILE_SEC", "300"))  # REST 대조 주기
+RECONCILE_DEBOUNCE_SEC = 2           # 체결 직후 대조 요청을 모으는 시간
+reconcile_requested = asyncio.Event()
+hedge_mode_warned = False            # 헤지 모드 이벤트 경고는 한 번만
+
 log = logging.getLogger("binance-positions")
 log.setLevel(logging.INFO)
 
@@ -26,198 +37,329 @@ if not all([BINANCE_KEY, BINANCE_SECRET]):
     raise RuntimeError("환경변수 BINANCE_API_KEY, BINANCE_API_SECRET 를 설정하세요.")
 
 
-def normalize_position(pos: dict):
-    """REST 포지션 데이터를 짧은 키로 맞춤"""
-    return {
-        "pa": pos.get("positionAmt"),        # position amount (string, 부호로 방향)
-        "ep": pos.get("entryPrice"),         # entry price (string)
-        "up": pos.get("unRealizedProfit"),   # unrealized PnL (string)
-        "l": pos.get("liquidationPrice"),    # liquidation price (string)
-        "iw": pos.get("isolatedMargin"),     # isolated margin (string, Cross면 None)
-        "mt": pos.get("marginType"),         # margin type (ISOLATED / CROSSED)
-    }
+def position_record(symbol: str, pa, ep, up, liq, margin, margin_type, mark_raw=None) -> PositionRecord:
+    """Binance 포지션 → 레코드 (size 에 부호가 있어서 sign=1)"""
+    return PositionRecord(
+        symbol, symbol, None, pa, ep, upl_raw=up, liq=liq,
+        margin=margin, margin_type=margin_type, mark_raw=mark_raw,
+    )
+
+
+def normalize_position(pos: dict, margin=None, margin_type=None, mark_raw=None) -> PositionRecord:
+    """REST 포지션 데이터 → 레코드"""
+    return position_record(
+        pos["symbol"],
+        pos.get("positionAmt"),        # position amount (string, 부호로 방향)
+        pos.get("entryPrice"),         # entry price (string)
+        pos.get("unRealizedProfit"),   # unrealized PnL (string)
+        pos.get("liquidationPrice"),   # liquidation price (string)
+        margin,                        # isolated margin (string, Cross면 None)
+        margin_type,                   # margin type (ISOLATED / CROSSED)
+        mark_raw,
+    )
+
+
+def position_row(rec: PositionRecord) -> dict:
+    """/ws/binance 포맷 (레코드에 캐시)"""
+    if rec.row is None:
+        if rec.size > 0:
+            side = "LONG"
+        elif rec.size < 0:
+            side = "SHORT"
+        else:
+            side = "FLAT"
+        rec.row = {
+            "exchange": "binance",
+            "symbol": rec.symbol,
+            "side": side,
+            "size": rec.size,
+            "upl": rec.upl,
+            "entryPrice": rec.entry,
+            "markPrice": rec.mark_raw,
+            "liqPrice": rec.liq,
+            "margin": rec.margin,
+            "marginType": rec.margin_type,
+        }
+        if tick_trace.WS_TRACE_TIMESTAMPS and rec.trace:
+            rec.row["ts"] = tick_trace.row_stamps(rec.trace)
+    return rec.row
+
+
+def build_positions(snapshot=None) -> list[dict]:
+    """포지션 + markPrice + 실시간 UPL 합친 목록 (/ws/binance 포맷, 통합 포맷의 원본).
+    UPL 은 마크가 바뀐 포지션만 레코드 단위로 다시 계산돼 있어서 여기서는 캐시된 행만 모은다."""
+    snapshot = snapshot or store.snapshot
+    return [position_row(rec) for rec in snapshot.binance_positions.values()]
 
 
 def broadcast():
-    """포지션 + markPrice + 실시간 UPL 합쳐서 브로드캐스트"""
-    merged = []
-
-    # last_positions 이 비어있으면 바로 메시지 반환
-    if not last_positions:
-        merged = [{"msg": "현재 열린 포지션이 없습니다."}]
+    """변경 알림만 남기고, 실제 재계산/전송은 fanout 스케줄러가 모아서 처리"""
+    fanout.scheduler.mark_dirty()
+
+
+# -----------------------------
+# position_store handler (루프 태스크에서 실행, 단일 writer)
+# -----------------------------
+def sync_mark_symbols(st):
+    """열린 포지션 심볼만 마크프라이스 구독 (바뀐 심볼만 SUBSCRIBE / UNSUBSCRIBE)"""
+    global subscribed_symbols
+    new_set = set(st.binance_positions)
+    if new_set != subscribed_symbols:
+        subscribed_symbols = new_set
+        symbols_changed.set()
+        log.info(f"구독 심볼 변경: {new_set}")
+
+
+def apply_positions(st, updated: dict):
+    """REST 스냅샷으로 열린 포지션 전체 교체"""
+    # 닫힌 포지션 제거
+    for sym in set(st.binance_positions) - set(updated):
+        st.binance_positions.pop(sym, None)
+        st.binance_marks.pop(sym, None)
+
+    # 열린/유지 포지션 업데이트 (값이 같으면 기존 레코드 유지)
+    for sym, pos in updated.items():
+        pos, margin, margin_type = pos
+        put_position(st.binance_positions, sym, normalize_position(
+            pos, margin, margin_type, st.binance_marks.get(sym)
+        ))
+    sync_mark_symbols(st)
+
+
+def apply_account_update(st, changed: list):
+    """ACCOUNT_UPDATE 의 바뀐 포지션만 반영 (원웨이 모드 기준, 심볼당 포지션 1개).
+    헤지 모드 포지션(ps=LONG/SHORT)은 심볼 키 하나에 두 방향을 담을 수 없어서 반영하지 않는다
+    (한쪽 pa=0 이 다른 쪽 포지션을 지우지 않도록). 대신 REST 대조를 요청한다"""
+    global hedge_mode_warned
+    hedged = [p["s"] for p in changed if p.get("ps", "BOTH") != "BOTH"]
+    if hedged:
+        if not hedge_mode_warned:
+            hedge_mode_warned = True
+            log.warning(f"헤지 모드 포지션 이벤트는 지원하지 않아 무시하고 REST 대조로만 반영합니다: {hedged}")
+        reconcile_requested.set()
+
+    for p in changed:
+        sym = p["s"]
+        if p.get("ps", "BOTH") != "BOTH":
+            continue
+        if to_float(p.get("pa")) == 0:
+            st.binance_positions.pop(sym, None)
+            st.binance_marks.pop(sym, None)
+            continue
+
+        prev = st.binance_positions.get(sym)
+        put_position(st.binance_positions, sym, position_record(
+            sym, p.get("pa"), p.get("ep"), p.get("up"),
+            prev.liq if prev else None,   # 청산가는 이벤트에 없어서 다음 REST 대조 때 채움
+            p.get("iw"), p.get("mt"), st.binance_marks.get(sym),
+        ))
+    sync_mark_symbols(st)
+
+
+def apply_mark_frame(st, data):
+    """파싱한 markPrice 스트림 프레임 적용 (열린 포지션 심볼만, 그 포지션의 UPL 만 재계산)"""
+    # 합친 스트림 형태: dict(payload.data) / arr 스트림: list
+    if isinstance(data, dict) and "data" in data:
+        items = [data["data"]]
+    elif isinstance(data, list):
+        items = data
     else:
-        for symbol, pos in last_positions.items():
-            mark = last_mark_prices.get(symbol)
-
-            # 안전 변환
-            try:
-                size = float(pos.get("pa") or 0)
-            except Exception:
-                size = 0.0
-
-            try:
-                entry = float(pos.get("ep") or 0)
-            except Exception:
-                entry = 0.0
-
-            upl = pos.get("up")
-
-            # 방향
-            if size > 0:
-                side = "LONG"
-            elif size < 0:
-                side = "SHORT"
-            else:
-                side = "FLAT"
-
-            # UPL 재계산
-            try:
-                if mark is not None and entry != 0 and size != 0:
-                    m = float(mark)
-                    upl = (m - entry) * size if size > 0 else (entry - m) * abs(size)
-            except Exception as e:
-                log.error(f"Binance UPL 계산 오류: {e}")
-
-            merged.append({
-                "exchange": "binance",
-                "symbol": symbol,
-                "side": side,
-                "size": size,
-                "upl": upl,
-                "entryPrice": entry,
-                "markPrice": mark,
-                "liqPrice": pos.get("l"),
-                "margin": pos.get("iw"),
-                "marginType": pos.get("mt"),
-            })
-
-    if loop is None:
-        log.warning("이벤트 루프가 설정되지 않았습니다. WebSocket 전송에 실패할 수 있습니다.")
-
-    for ws in list(active_clients):
+        return
+
+    for item in items:
+        if item.get("e") == "markPriceUpdate":
+            sym = item.get("s")
+            if sym in st.binance_positions:
+                st.binance_marks[sym] = item.get("p")
+                # E = 거래소 이벤트 시각(ms), 수신 시각은 store 가 submit 때 찍어 둔 값
+                trace = tick_trace.applied("binance", item.get("E"), st.received_ns)
+                set_mark(st.binance_positions, (sym,), item.get("p"), trace)
+
+
+store.register("binance_positions", apply_positions)
+store.register("binance_account", apply_account_update)
+store.register("binance_marks", apply_mark_frame)
+
+
+async def reconcile_positions():
+    """REST 스냅샷으로 전체 포지션 대조 (초기 상태 / 누락 이벤트 / 청산가 보정)"""
+    client = await get_binance_client()
+
+    # 전체 포지션 + 계정 정보
+    all_positions = await client.futures_position_information()
+    account_info = await client.futures_account()
+
+    margin_map = {p["symbol"]: p.get("isolatedMargin") for p in account_info["positions"]}
+    margin_type_map = {p["symbol"]: p.get("marginType") for p in account_info["positions"]}
+
+    updated = {}
+
+    for pos in all_positions:
+        sym = pos["symbol"]  # 예: PEPEUSDT
         try:
-            asyncio.run_coroutine_threadsafe(ws.send_json(merged), loop)
-        except Exception as e:
-            log.error(f"웹소켓 전송 실패: {e}")
+            amt = float(pos.get("positionAmt") or 0)
+        except Exception:
+            amt = 0.0
 
-    # ✅ 통합 브로드캐스트도 호출
-    try:
-        unified_ws.broadcast()
-    except Exception:
-        pass
+        if amt != 0:
+            updated[sym] = (pos, margin_map.get(sym), margin_type_map.get(sym))
 
+    # 리플레이가 같은 포지션에서 시작하도록 REST 스냅샷도 기록 (마크 프레임은 열린 포지션에만 적용됨)
+    if recorder.enabled:
+        recorder.record("binance_positions", orjson.dumps(updated))
+    # 상태 변경은 position_store 에 맡김 (적용 후 브로드캐스트, 포지션이 모두 닫혔을 때도 메시지 내려감)
+    store.submit("binance_positions", updated)
 
-async def refresh_positions_periodic(interval_sec: int = 3):
-    """주기적으로 REST 스냅샷을 갱신해서 닫힌 포지션 제거 및 구독 집합 동기화"""
-    global last_positions, last_mark_prices, subscribed_symbols
 
+async def reconcile_loop():
+    """시작 시 한 번, 이후 RECONCILE_SEC 마다 또는 체결/재연결 직후 요청이 오면 REST 대조"""
     while True:
         try:
-            client = await AsyncClient.create(BINANCE_KEY, BINANCE_SECRET)
+            await reconcile_positions()
+        except Exception as e:
+            log.error(f"포지션 대조 오류: {e}")
+
+        try:
+            await asyncio.wait_for(reconcile_requested.wait(), timeout=RECONCILE_SEC)
+            await asyncio.sleep(RECONCILE_DEBOUNCE_SEC)
+        except asyncio.TimeoutError:
+            pass
+        reconcile_requested.clear()
+
+
+async def keepalive_listen_key(listen_key: str):
+    client = await get_binance_client()
+    while True:
+        await asyncio.sleep(LISTEN_KEY_KEEPALIVE_SEC)
+        await client.futures_stream_keepalive(listen_key)
+        log.info("listenKey 연장")
+
+
+def handle_user_event(raw):
+    """user-data 이벤트 1개 처리 (리플레이도 같은 경로)"""
+    event = orjson.loads(raw)
+    kind = event.get("e")
+
+    if kind == "ACCOUNT_UPDATE":
+        changed = event.get("a", {}).get("P", [])
+        if changed:
+            store.submit("binance_account", changed)
+
+    elif kind == "ORDER_TRADE_UPDATE":
+        # 포지션 수량은 뒤따르는 ACCOUNT_UPDATE 로 반영되고, 청산가만 REST 로 보정
+        if event.get("o", {}).get("x") == "TRADE":
+            reconcile_requested.set()
+
+    elif kind == "listenKeyExpired":
+        raise ConnectionError("listenKey 만료")
 
-            # 전체 포지션 + 계정 정보
-            all_positions = await client.futures_position_information()
-            account_info = await client.futures_account()
-            await client.close_connection()
 
-            margin_map = {p["symbol"]: p.get("isolatedMargin") for p in account_info["positions"]}
-            margin_type_map = {p["symbol"]: p.get("marginType") for p in account_info["positions"]}
+async def read_user_events(ws):
+    async for raw in ws:
+        metrics.messages.inc("binance_user")
+        recorder.record("binance_user", raw)
+        handle_user_event(raw)
 
-            updated = {}
 
-            for pos in all_positions:
-                sym = pos["symbol"]  # 예: PEPEUSDT
+async def user_data_stream():
+    """listenKey 기반 user-data 스트림으로 포지션 변경을 즉시 반영. 오류 시 새 listenKey 로 재연결."""
+    backoff = 1
+
+    while True:
+        try:
+            client = await get_binance_client()
+            listen_key = await client.futures_stream_get_listen_key()
+
+            async with websockets.connect(USER_STREAM_URL + listen_key, ping_interval=20, ping_timeout=20) as ws:
+                log.info("user-data 스트림 연결됨")
+                backoff = 1
+                # 연결 전후로 놓친 이벤트가 있을 수 있어 한 번 대조
+                reconcile_requested.set()
+
+                tasks = {asyncio.create_task(keepalive_listen_key(listen_key)), asyncio.create_task(read_user_events(ws))}
                 try:
-                    amt = float(pos.get("positionAmt") or 0)
-                except Exception:
-                    amt = 0.0
-
-                if amt != 0:
-                    norm = normalize_position(pos)
-                    norm["iw"] = margin_map.get(sym)
-                    norm["mt"] = margin_type_map.get(sym)
-                    updated[sym] = norm
-
-            # 닫힌 포지션 제거
-            to_remove = set(last_positions.keys()) - set(updated.keys())
-            for sym in to_remove:
-                last_positions.pop(sym, None)
-                last_mark_prices.pop(sym, None)
-
-            # 열린/유지 포지션 업데이트
-            for sym, norm in updated.items():
-                last_positions[sym] = norm
-
-            # ✅ 구독 집합 동기화: 열린 포지션 심볼만 구독
-            new_set = set(last_positions.keys())
-            if new_set != subscribed_symbols:
-                subscribed_symbols = new_set
-                symbols_changed.set()  # 스트림 재구성 요청
-                log.info(f"구독 심볼 변경: {new_set}")
-
-            # ✅ 변경사항 브로드캐스트 (포지션이 모두 닫혔을 때도 메시지 내려감)
-            broadcast()
+                    done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                for task in done:
+                    task.result()  # 예외를 밖으로 올려서 재연결
+                raise ConnectionError("스트림 종료")
 
         except Exception as e:
-            log.error(f"포지션 갱신 오류: {e}")
+            log.error(f"user-data 스트림 오류, 재시도: {e}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+def mark_stream_name(symbol: str) -> str:
+    return f"{symbol.lower()}@markPrice@1s"
+
 
-        await asyncio.sleep(interval_sec)
+async def sync_subscriptions(ws):
+    """subscribed_symbols 가 바뀔 때마다 서버 쪽 구독 집합과의 차이만 SUBSCRIBE / UNSUBSCRIBE"""
+    active = set()  # 이 연결에서 서버에 구독된 심볼
+    request_id = 0
+
+    while True:
+        symbols_changed.clear()
+        wanted = set(subscribed_symbols)
+
+        for method, symbols in (("SUBSCRIBE", wanted - active), ("UNSUBSCRIBE", active - wanted)):
+            if not symbols:
+                continue
+            request_id += 1
+            await ws.send(json.dumps({
+                "method": method,
+                "params": [mark_stream_name(sym) for sym in sorted(symbols)],
+                "id": request_id,
+            }))
+            log.info(f"마크프라이스 {method} (id={request_id}): {symbols}")
+
+        active = wanted
+        await symbols_changed.wait()
+
+
+def handle_mark_frame(raw):
+    """마크프라이스 스트림 프레임 1개 처리 (리플레이도 같은 경로)"""
+    # 합친 스트림 이벤트는 {"stream": ..., "data": ...}, 나머지는 제어 프레임 응답 {"result", "id"}
+    # (키 순서 / 공백에 기대지 않도록 파싱해서 키로 구분, 파싱은 여기서 한 번만)
+    msg = orjson.loads(raw)
+    if isinstance(msg, dict) and "stream" in msg:
+        store.submit("binance_marks", msg)
+        return
+
+    if isinstance(msg, dict) and (msg.get("error") or msg.get("result") is not None):
+        log.error(f"마크프라이스 구독 응답 오류: {msg}")
+
+
+async def read_mark_frames(ws):
+    async for raw in ws:
+        metrics.messages.inc("binance_marks")
+        recorder.record("binance_marks", raw)
+        handle_mark_frame(raw)
 
 
 async def mark_price_stream():
-    """심볼별 합친 스트림으로 마크프라이스 수신. 구독 집합 변경 시 재연결."""
+    """연결 하나로 마크프라이스 수신. 구독 변경은 제어 프레임으로, 재연결은 실제 오류 때만."""
     backoff = 1
 
-    async def build_stream_url(symbols):
-        # 심볼 없으면 전체 arr 스트림 사용 (유휴 상태)
-        if not symbols:
-            return "wss://fstream.binance.com/ws/!markPrice@arr@1s"
-        streams = [f"{sym.lower()}@markPrice@1s" for sym in symbols]
-        joined = "/".join(streams)
-        return f"wss://fstream.binance.com/stream?streams={joined}"
-
     while True:
         try:
-            # 현재 구독 집합 확인 및 이벤트 리셋
-            current = set(subscribed_symbols)
-            symbols_changed.clear()
-
-            url = await build_stream_url(current)
-            async with websockets.connect(url, ping_interval=20, ping_timeout=20) as ws:
-                log.info(f"마크프라이스 수신 시작 (구독 {len(current)}개): {current or 'ALL'}")
+            async with websockets.connect(MARK_STREAM_URL, ping_interval=20, ping_timeout=20) as ws:
+                log.info("마크프라이스 스트림 연결됨")
                 backoff = 1
 
-                while True:
-                    # 구독 변경 이벤트가 오면 재연결하여 재구독
-                    if symbols_changed.is_set():
-                        log.info("구독 변경 감지 → 스트림 재구성")
-                        break
-
-                    raw = await ws.recv()
-                    data = json.loads(raw)
-
-                    updated = False
-
-                    # 합친 스트림 형태: dict(payload.data)
-                    if isinstance(data, dict) and "data" in data:
-                        item = data["data"]
-                        if item.get("e") == "markPriceUpdate":
-                            sym = item.get("s")
-                            if sym in last_positions:
-                                last_mark_prices[sym] = item.get("p")
-                                updated = True
-
-                    # arr 스트림: list의 각 item
-                    elif isinstance(data, list):
-                        for item in data:
-                            if item.get("e") == "markPriceUpdate":
-                                sym = item.get("s")
-                                if sym in last_positions:
-                                    last_mark_prices[sym] = item.get("p")
-                                    updated = True
-
-                    if updated:
-                        broadcast()
+                # 재연결 시 구독도 처음부터 다시 맞춘다 (서버 구독은 연결 단위)
+                tasks = {asyncio.create_task(sync_subscriptions(ws)), asyncio.create_task(read_mark_frames(ws))}
+                try:
+                    done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                for task in done:
+                    task.result()  # 예외를 밖으로 올려서 재연결
+                raise ConnectionError("스트림 종료")
 
         except Exception as e:
             log.error(f"markPrice 스트림 오류, 재시도: {e}")
@@ -227,8 +369,9 @@ async def mark_price_stream():
 
 async def binance_start():
     """백그라운드 태스크를 올려 Bitget 스타일로 동작"""
-    # 포지션 리프레시 + 스트림 병행
-    asyncio.create_task(refresh_positions_periodic(interval_sec=3))
+    # 포지션 REST 대조 + user-data 스트림 + 마크프라이스 스트림 병행
+    asyncio.create_task(reconcile_loop())
+    asyncio.create_task(user_data_stream())
     asyncio.create_task(mark_price_stream())
 
 
@@ -236,6 +379,7 @@ async def binance_start():
 async def positions_ws(websocket: WebSocket):
     global loop
     await websocket.accept()
+    fanout.attach(websocket, "/ws/binance", on_drop=lambda: active_clients.discard(websocket))
     active_clients.add(websocket)
     loop = asyncio.get_running_loop()
     log.info(f"🌐 Binance 클라이언트 연결됨: {websocket.client}")
@@ -244,9 +388,11 @@ async def positions_ws(websocket: WebSocket):
     broadcast()
 
     try:
+        # 클라이언트 메시지는 쓰지 않음, 연결 종료를 바로 감지하기 위한 수신 루프
         while True:
-           
-            await asyncio.sleep(10)
+            await websocket.receive_text()
     except WebSocketDisconnect:
         log.info(f"🔌 Binance 클라이언트 연결 해제: {websocket.client}")
-        active_clients.discard(websocket)
\ No newline at end of file
+    finally:
+        active_clients.discard(websocket)
+        fanout.detach(websocket)
@@ -0,0 +1,102 @@
+import logging
+from typing import Optional
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from backend import fanout, funding_cache
+from backend.database import SessionLocal
+
+router = APIRouter()
+active_clients = {}   # {websocket: GapClient} 클라이언트별 못 보낸 변경분
+
+log = logging.getLogger("gap-stream")
+
+
+def snapshot_frame(snapshot) -> bytes:
+    return fanout.encode({"type": "snapshot", "version": snapshot.version, "rows": snapshot.gap})
+
+
+def delta_frame(delta: dict) -> bytes:
+    return fanout.encode({"type": "delta", **delta})
+
+
+class GapClient:
+    """/ws/gap 클라이언트 1개: 못 보낸 델타를 심볼별 최신 행으로 합쳐 둔다.
+    느린 클라이언트도 대기열이 심볼 수 이상으로 커지지 않고, 보낼 차례에 델타 한 프레임만 나간다."""
+
+    def __init__(self):
+        self.needs_snapshot = False
+        self.version = None
+        self.changed = {}    # {symbol: row}
+        self.removed = set()
+
+    def merge(self, delta: dict):
+        for row in delta["changed"]:
+            self.changed[row["symbol"]] = row
+            self.removed.discard(row["symbol"])
+        for symbol in delta["removed"]:
+            self.changed.pop(symbol, None)
+            self.removed.add(symbol)
+        self.version = delta["version"]
+
+    def take(self):
+        if self.needs_snapshot:
+            # 스냅샷은 보낼 시점의 최신 버전으로 (그 사이 델타는 이미 들어 있음)
+            self.needs_snapshot, self.changed, self.removed = False, {}, set()
+            return snapshot_frame(funding_cache.current)
+        if not (self.changed or self.removed):
+            return None
+        frame = delta_frame({
+            "version": self.version,
+            "changed": list(self.changed.values()),
+            "removed": list(self.removed),
+        })
+        self.changed, self.removed = {}, set()
+        return frame
+
+
+def on_publish(snapshot, delta):
+    """update_task 가 스냅샷을 발행하면 바뀐 행을 각 클라이언트 변경분에 합치고 전송 채널을 깨움"""
+    if not active_clients or not (delta["changed"] or delta["removed"]):
+        return
+    for websocket, client in active_clients.items():
+        client.merge(delta)
+        channel = fanout.channels.get(websocket)
+        if channel is not None:
+            channel.offer()
+
+
+funding_cache.listeners.append(on_publish)
+
+
+@router.websocket("/ws/gap")
+async def gap_stream_ws(websocket: WebSocket, since: Optional[int] = None):
+    """접속 시 전체 gap 스냅샷, 이후 갱신마다 바뀐 행만 전송.
+    재접속 때 ?since=<마지막 버전> 을 주면 놓친 델타만 이어서 보낸다."""
+    await websocket.accept()
+    log.info(f"🌐 GAP 클라이언트 연결됨: {websocket.client} (since={since})")
+
+    if funding_cache.current is None:
+        async with SessionLocal() as db:
+            await funding_cache.load(db)
+
+    # 초기 프레임 계산과 등록 사이에 await 가 없어서 그 사이 발행된 델타를 놓치지 않는다
+    client = GapClient()
+    missed = funding_cache.deltas_since(since) if since is not None else None
+    if missed is None:
+        client.needs_snapshot = True
+    else:
+        for delta in missed:
+            client.merge(delta)
+    active_clients[websocket] = client
+    channel = fanout.attach(websocket, "/ws/gap", on_drop=lambda: active_clients.pop(websocket, None), take=client.take)
+    channel.offer()
+
+    try:
+        # 클라이언트 메시지는 쓰지 않음, 연결 종료 감지용
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        log.info(f"🔌 GAP 클라이언트 연결 해제: {websocket.client}")
+    finally:
+        active_clients.pop(websocket, None)
+        fanout.detach(websocket)
@@ -0,0 +1,94 @@
+import hmac, os, time
+from collections import Counter
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from backend import fanout, funding_cache, ingest_bus, loop_monitor, metrics, rate_limit
+from backend.position_store import store
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# /api/admin/* 는 X-Admin-Token 헤더(또는 ?token=)가 ADMIN_TOKEN 과 맞아야 한다.
+# 루프 스레드에 SIGALRM 을 걸고 스택을 그대로 보여주므로 ADMIN_TOKEN 이 없으면 아예 닫혀 있다 (404)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+# -----------------------------
+# 스크레이프 시점에 읽는 값 (틱 경로에 비용 없음)
+# -----------------------------
+def clients_by_endpoint() -> dict:
+    counts = Counter(ch.endpoint for ch in list(fanout.channels.values()))
+    return {(endpoint,): n for endpoint, n in counts.items()}
+
+
+def max_lag_by_endpoint() -> dict:
+    lags = {}
+    for ch in list(fanout.channels.values()):
+        lags[(ch.endpoint,)] = max(lags.get((ch.endpoint,), 0.0), ch.lag())
+    return lags
+
+
+def funding_staleness() -> dict:
+    now = time.time()
+    return {(exchange,): now - ts for exchange, ts in funding_cache.updated_at.items()}
+
+
+metrics.Collected("ws_clients", "웹소켓 엔드포인트별 연결된 클라이언트 수", clients_by_endpoint, ("endpoint",))
+metrics.Collected("ws_client_max_lag_seconds", "엔드포인트별 가장 밀린 클라이언트의 미전송 업데이트 대기 시간", max_lag_by_endpoint, ("endpoint",))
+metrics.Collected("ws_clients_dropped_total", "WS_MAX_LAG_SEC 를 넘겨 끊은 클라이언트", lambda: fanout.scheduler.clients_dropped, kind="counter")
+metrics.Collected("broadcast_updates_total", "브로드캐스트 변경 알림 수 (flush 로 합쳐짐)", lambda: fanout.scheduler.updates_received, kind="counter")
+metrics.Collected("ingest_received_total", "position_store 큐에 들어온 메시지", lambda: store.received, kind="counter")
+metrics.Collected("ingest_dropped_total", "큐가 가득 차서 버린 메시지", lambda: store.dropped, kind="counter")
+metrics.Collected("ingest_errors_total", "handler 적용 중 오류", lambda: store.errors, kind="counter")
+metrics.Collected("ingest_queue_depth", "position_store 큐에 쌓인 메시지", lambda: store.queue.qsize() if store.queue else 0)
+metrics.Collected("funding_staleness_seconds", "거래소별 마지막으로 펀딩레이트를 받은 뒤 지난 시간 (REST 또는 스트림)", funding_staleness, ("exchange",))
+metrics.Collected("funding_version", "발행된 펀딩레이트 스냅샷 버전", lambda: funding_cache.current.version if funding_cache.current else None)
+metrics.Collected(
+    "ratelimit_budget", "거래소별 남은 요청 예산 (이 프로세스 몫 기준, weight / 요청 수)",
+    lambda: {(name,): s.stats()["budget"] for name, s in rate_limit.schedulers.items()}, ("exchange",),
+)
+metrics.Collected(
+    "ratelimit_responses_total", "429 / 418 응답 수",
+    lambda: {(name,): s.rate_limited for name, s in rate_limit.schedulers.items()}, ("exchange",), kind="counter",
+)
+metrics.Collected("ingest_bus_connected", "web 역할: ingest 버스 연결 여부", lambda: int(ingest_bus.connected) if ingest_bus.APP_ROLE == "web" else None)
+
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus 텍스트 포맷"""
+    return Response(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def check_admin(header_token: Optional[str], query_token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404)
+    token = header_token or query_token or ""
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="admin token 필요")
+
+
+@router.get("/api/admin/loop")
+async def loop_stats(x_admin_token: Optional[str] = Header(None), token: Optional[str] = None):
+    """이벤트 루프 지연 / 막힘 횟수 / 마지막 막힘 스택"""
+    check_admin(x_admin_token, token)
+    return loop_monitor.stats()
+
+
+@router.get("/api/admin/profile")
+async def sampling_profile(
+    seconds: float = Query(10, gt=0, le=loop_monitor.PROFILE_MAX_SEC),
+    hz: float = Query(100, ge=1, le=loop_monitor.PROFILE_MAX_HZ),
+    threads: str = Query("loop", pattern="^(loop|all)$"),
+    x_admin_token: Optional[str] = Header(None),
+    token: Optional[str] = None,
+):
+    """seconds 동안 스택 샘플링 → folded stack 텍스트 (flamegraph.pl / speedscope 로 바로 열림)
+    threads=loop 은 이벤트 루프 스레드만, all 은 pybitget / 기록 스레드 등 전부"""
+    check_admin(x_admin_token, token)
+    try:
+        body = await loop_monitor.profile(seconds, hz, all_threads=threads == "all")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(body, media_type="text/plain; charset=utf-8")
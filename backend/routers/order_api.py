@@ -1,10 +1,16 @@
-from fastapi import APIRouter
-from binance.client import Client as BinanceClient
-from pybitget import Client as BitgetClient
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
-import os
+import asyncio
+import json
 import logging
+import os
+import time
+from decimal import Decimal
+from backend.exchange_clients import get_binance_client, get_bitget_client
+from backend import metrics, rate_limit, trading_rules
+from backend.trading_rules import to_str
 
 # 기본 로거 설정
 logging.basicConfig(
@@ -13,20 +19,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+# 주문 요청에서 나가는 거래소 호출은 rate_limit 스케줄러에서 백그라운드 갱신보다 먼저 처리
+router = APIRouter(dependencies=[Depends(rate_limit.order_priority)])
 
-# Binance 클라이언트
-binance_client = BinanceClient(
-    os.getenv("BINANCE_API_KEY"),
-    os.getenv("BINANCE_API_SECRET")
-)
-
-# Bitget 클라이언트
-bitget_client = BitgetClient(
-    os.getenv("BITGET_API_KEY"),
-    os.getenv("BITGET_API_SECRET"),
-    passphrase=os.getenv("BITGET_API_PASS")
-)
+# 거래소 클라이언트는 exchange_clients 의 공유 async 클라이언트 사용 (이벤트 루프를 막지 않음)
 
 # ✅ 요청 바디 모델 정의
 class OrderRequest(BaseModel):
@@ -38,83 +34,95 @@ class OrderRequest(BaseModel):
     marginMode: str = "isolated"
 
 
-def adjust_to_step(value: float, step: float) -> float:
-    """주어진 stepSize에 맞게 수량/가격을 내림 조정"""
-    return (value // step) * step
+def stage(endpoint: str, name: str, since: float) -> float:
+    """단계 소요시간을 /metrics 에 기록하고 지금 시각(다음 단계 시작점)을 반환"""
+    now = time.perf_counter()
+    metrics.order_stage_seconds.observe(now - since, endpoint, name)
+    return now
+
+
+def finish(endpoint: str, status: str, started: float):
+    """주문 요청 1건 종료: 전체 소요시간 + 결과 카운트"""
+    stage(endpoint, "total", started)
+    metrics.orders.inc(endpoint, status)
+
+
+async def ignore_errors(coro):
+    """gather 안에서 실패해도 되는 설정 호출용 (예외를 삼키고 None)"""
+    try:
+        return await coro
+    except Exception:
+        return None
 
 
 # -------------------------------
 # Binance 주문
 # -------------------------------
+async def binance_close_position(client, symbol: str, want_long: bool):
+    """포지션 조회 후 반대 방향 reduceOnly 시장가 주문 (해당 방향 포지션 없으면 None)"""
+    positions = await client.futures_position_information(symbol=symbol)
+    pos = next((p for p in positions if p["symbol"] == symbol), None)
+    if not pos:
+        return None
+    # 거래소가 준 수량 문자열 그대로 (float 을 거치면 1e-05 같은 지수 표기 / 반올림 오차)
+    amt = Decimal(pos["positionAmt"])
+    if (want_long and amt > 0) or (not want_long and amt < 0):
+        return await client.futures_create_order(
+            symbol=symbol, side="SELL" if want_long else "BUY", type="MARKET",
+            quantity=to_str(abs(amt)), reduceOnly=True
+        )
+    return None
+
+
 @router.post("/binance/order")
 async def binance_order(req: OrderRequest):
+    started = time.perf_counter()
     try:
-        ticker = binance_client.futures_symbol_ticker(symbol=req.symbol)
-        current_price = float(ticker["price"])
-
-        info = binance_client.futures_exchange_info()
-        symbol_info = next(s for s in info["symbols"] if s["symbol"] == req.symbol)
-
-        lot_size = next(f for f in symbol_info["filters"] if f["filterType"] == "LOT_SIZE")
-        step_size = float(lot_size["stepSize"])
-
-        notional_filter = next(f for f in symbol_info["filters"] if f["filterType"] == "MIN_NOTIONAL")
-        min_notional = float(notional_filter["notional"])
-
-        raw_qty = req.usdAmount / current_price
-        quantity = adjust_to_step(raw_qty, step_size)
-
-        if quantity * current_price < min_notional and req.side in ["BUY", "SELL"]:
-            return {"status": "error", "message": f"주문 금액이 최소 요구치({min_notional} USDT) 미만입니다."}
+        client = await get_binance_client()
+
+        # 서로 의존하지 않는 조회/설정은 동시에 (가격, 심볼 규칙, 레버리지/마진 모드)
+        ticker, rule, _, _ = await asyncio.gather(
+            client.futures_symbol_ticker(symbol=req.symbol),
+            trading_rules.get_rule("Binance", req.symbol),
+            client.futures_change_leverage(symbol=req.symbol, leverage=req.leverage),
+            # 이미 같은 마진 모드면 에러가 나므로 무시
+            ignore_errors(client.futures_change_margin_type(symbol=req.symbol, marginType=req.marginMode.upper())),
+        )
+        submitted = stage("binance", "prepare", started)
+        current_price = Decimal(ticker["price"])
+        quantity = rule.quantity(req.usdAmount, current_price)
 
-        # 레버리지/마진 모드 설정
-        binance_client.futures_change_leverage(symbol=req.symbol, leverage=req.leverage)
-        try:
-            binance_client.futures_change_margin_type(symbol=req.symbol, marginType=req.marginMode.upper())
-        except Exception:
-            pass
+        if quantity * current_price < rule.min_notional and req.side in ["BUY", "SELL"]:
+            finish("binance", "rejected", started)
+            return {"status": "error", "message": f"주문 금액이 최소 요구치({rule.min_notional} USDT) 미만입니다."}
 
         order = None
 
         # -------------------------------
         # 진입 (롱/숏) → MARKET
         # -------------------------------
-        if req.side == "BUY":
-            order = binance_client.futures_create_order(
-                symbol=req.symbol, side="BUY", type="MARKET", quantity=quantity
-            )
-        elif req.side == "SELL":
-            order = binance_client.futures_create_order(
-                symbol=req.symbol, side="SELL", type="MARKET", quantity=quantity
+        if req.side in ["BUY", "SELL"]:
+            order = await client.futures_create_order(
+                symbol=req.symbol, side=req.side, type="MARKET", quantity=to_str(quantity)
             )
 
         # -------------------------------
         # close (롱/숏) → 포지션 조회 후 반대 주문
         # -------------------------------
         elif req.side == "CLOSE_LONG":
-            positions = binance_client.futures_position_information(symbol=req.symbol)
-            pos = next((p for p in positions if p["symbol"] == req.symbol), None)
-            if pos and float(pos["positionAmt"]) > 0:
-                qty = abs(float(pos["positionAmt"]))
-                order = binance_client.futures_create_order(
-                    symbol=req.symbol, side="SELL", type="MARKET",
-                    quantity=qty, reduceOnly=True
-                )
+            order = await binance_close_position(client, req.symbol, want_long=True)
 
         elif req.side == "CLOSE_SHORT":
-            positions = binance_client.futures_position_information(symbol=req.symbol)
-            pos = next((p for p in positions if p["symbol"] == req.symbol), None)
-            if pos and float(pos["positionAmt"]) < 0:
-                qty = abs(float(pos["positionAmt"]))
-                order = binance_client.futures_create_order(
-                    symbol=req.symbol, side="BUY", type="MARKET",
-                    quantity=qty, reduceOnly=True
-                )
-
-        logger.info(f"[BINANCE] 주문 성공: {req.symbol} {req.side} → {order}")
-        return {"status": "success", "order": order}
+            order = await binance_close_position(client, req.symbol, want_long=False)
+
+        stage("binance", "submit", submitted)
+        finish("binance", "success", started)
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"[BINANCE] 주문 성공 ({latency_ms}ms): {req.symbol} {req.side} → {order}")
+        return {"status": "success", "order": order, "latency_ms": latency_ms}
 
     except Exception as e:
+        finish("binance", "error", started)
         logger.error(f"[BINANCE] 주문 실패: {req.symbol} {req.side} {req.usdAmount}USDT → {e}")
         return {"status": "error", "message": str(e)}
 
@@ -122,42 +130,62 @@ async def binance_order(req: OrderRequest):
 # -------------------------------
 # Bitget 주문
 # -------------------------------
+async def bitget_setup(client, req: OrderRequest):
+    """마진 모드 → 레버리지 순서로 설정 (레버리지 holdSide 가 마진 모드에 따라 달라서 순서 유지)"""
+    # 마진 모드 설정 (포지션 없을 때만 가능)
+    resp = await client.mix_adjust_margintype(
+        symbol=req.symbol,
+        marginCoin="USDT",
+        marginMode="fixed" #isolated = fixed, cross = crossed로 써야함
+    )
+    if resp.get("code") != "00000":
+        logger.error(f"[BITGET] 마진 모드 변경 실패: {resp}")
+    else:
+        logger.info(f"[BITGET] 마진 모드 변경 성공: {req.symbol} → {req.marginMode.lower()}")
+
+    # 레버리지 설정
+    await client.mix_adjust_leverage(
+        symbol=req.symbol,
+        marginCoin="USDT",
+        leverage=str(req.leverage),
+        holdSide="long" if req.side.upper() in ["BUY", "CLOSE_SHORT"] else "short"
+    )
+
+
+async def bitget_close_position(client, symbol: str, side: str):
+    """포지션 조회 후 close_long / close_short 시장가 주문 (포지션 없으면 None)"""
+    pos = await client.mix_get_single_position(symbol=symbol, marginCoin="USDT")
+    positions = pos.get("data", [])
+    if positions:
+        qty = Decimal(positions[0].get("total") or "0")
+        if qty > 0:
+            return await client.mix_place_order(
+                symbol=symbol, marginCoin="USDT",
+                size=to_str(qty), side=side,
+                orderType="market", reduceOnly="true"
+            )
+    return None
+
+
 @router.post("/bitget/order")
 async def bitget_order(req: OrderRequest):
+    started = time.perf_counter()
     try:
-        ticker = bitget_client.mix_get_market_price(symbol=req.symbol)
-        current_price = float(ticker["data"]["markPrice"])
-
-        symbols_info = bitget_client.mix_get_symbols_info("umcbl")
-        symbol_info = next(s for s in symbols_info["data"] if s["symbol"] == req.symbol)
-
-        min_trade_num = float(symbol_info.get("minTradeNum", 0))
-        quantity_place = int(symbol_info.get("quantityPlace") or symbol_info.get("volumePlace", 0))
-
-        raw_size = req.usdAmount / current_price
-        size = round(raw_size, quantity_place)
-
-        if size < min_trade_num and req.side in ["BUY", "SELL"]:
-            return {"status": "error", "message": f"주문 수량이 최소 요구치({min_trade_num}) 미만입니다."}
+        client = get_bitget_client()
 
-        # 마진 모드 설정 (포지션 없을 때만 가능)
-        resp = bitget_client.mix_adjust_margintype(
-            symbol=req.symbol,
-            marginCoin="USDT",
-            marginMode="fixed" #isolated = fixed, cross = crossed로 써야함
-        )
-        if resp.get("code") != "00000":
-            logger.error(f"[BITGET] 마진 모드 변경 실패: {resp}")
-        else:
-            logger.info(f"[BITGET] 마진 모드 변경 성공: {req.symbol} → {req.marginMode.lower()}")
-
-        # 레버리지 설정
-        bitget_client.mix_adjust_leverage(
-            symbol=req.symbol,
-            marginCoin="USDT",
-            leverage=str(req.leverage),
-            holdSide="long" if req.side.upper() in ["BUY", "CLOSE_SHORT"] else "short"
+        # 가격 / 심볼 규칙 조회와 마진·레버리지 설정을 동시에
+        ticker, rule, _ = await asyncio.gather(
+            client.mix_get_market_price(symbol=req.symbol),
+            trading_rules.get_rule("Bitget", req.symbol),
+            bitget_setup(client, req),
         )
+        submitted = stage("bitget", "prepare", started)
+        current_price = Decimal(ticker["data"]["markPrice"])
+        size = rule.quantity(req.usdAmount, current_price)
+
+        if size < rule.min_qty and req.side in ["BUY", "SELL"]:
+            finish("bitget", "rejected", started)
+            return {"status": "error", "message": f"주문 수량이 최소 요구치({rule.min_qty}) 미만입니다."}
 
         order = None
 
@@ -165,15 +193,15 @@ async def bitget_order(req: OrderRequest):
         # 진입 (롱/숏) → MARKET
         # -------------------------------
         if req.side.upper() == "BUY":
-            order = bitget_client.mix_place_order(
+            order = await client.mix_place_order(
                 symbol=req.symbol, marginCoin="USDT",
-                size=str(size), side="open_long",
+                size=to_str(size), side="open_long",
                 orderType="market"
             )
         elif req.side.upper() == "SELL":
-            order = bitget_client.mix_place_order(
+            order = await client.mix_place_order(
                 symbol=req.symbol, marginCoin="USDT",
-                size=str(size), side="open_short",
+                size=to_str(size), side="open_short",
                 orderType="market"
             )
 
@@ -181,32 +209,321 @@ async def bitget_order(req: OrderRequest):
         # close(롱/숏) → 포지션 조회 후 반대 주문
         # -------------------------------
         elif req.side.upper() == "CLOSE_LONG":
-            pos = bitget_client.mix_get_single_position(symbol=req.symbol, marginCoin="USDT")
-            positions = pos.get("data", [])
-            if positions:
-                qty = float(positions[0].get("total", 0))
-                if qty > 0:
-                    order = bitget_client.mix_place_order(
-                        symbol=req.symbol, marginCoin="USDT",
-                        size=str(qty), side="close_long",
-                        orderType="market", reduceOnly="true"
-                    )
+            order = await bitget_close_position(client, req.symbol, "close_long")
 
         elif req.side.upper() == "CLOSE_SHORT":
-            pos = bitget_client.mix_get_single_position(symbol=req.symbol, marginCoin="USDT")
-            positions = pos.get("data", [])
-            if positions:
-                qty = float(positions[0].get("total", 0))
-                if qty > 0:
-                    order = bitget_client.mix_place_order(
-                        symbol=req.symbol, marginCoin="USDT",
-                        size=str(qty), side="close_short",
-                        orderType="market", reduceOnly="true"
-                    )
-
-        logger.info(f"[BITGET] 주문 성공: {req.symbol} {req.side} → {order}")
-        return {"status": "success", "order": order}
+            order = await bitget_close_position(client, req.symbol, "close_short")
+
+        stage("bitget", "submit", submitted)
+        finish("bitget", "success", started)
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"[BITGET] 주문 성공 ({latency_ms}ms): {req.symbol} {req.side} → {order}")
+        return {"status": "success", "order": order, "latency_ms": latency_ms}
 
     except Exception as e:
+        finish("bitget", "error", started)
         logger.error(f"[BITGET] 주문 실패: {req.symbol} {req.side} {req.usdAmount}USDT → {e}")
-        return {"status": "error", "message": str(e)}
\ No newline at end of file
+        return {"status": "error", "message": str(e)}
+
+
+# -------------------------------
+# 양 거래소 동시 주문 (펀딩 차익 진입)
+# -------------------------------
+class ArbOrderRequest(BaseModel):
+    symbol: str          # 기준 심볼 (예: BTCUSDT), Bitget 은 BTCUSDT_UMCBL 로 변환
+    usdAmount: float     # 한쪽 다리 기준 명목 금액 (USDT)
+    direction: str       # BINANCE_LONG (Binance 롱 + Bitget 숏) / BITGET_LONG (Bitget 롱 + Binance 숏)
+    leverage: int = 10
+    marginMode: str = "isolated"
+    unwind: bool = True  # 한쪽만 체결되면 체결된 쪽을 reduceOnly 로 되돌림
+
+
+ARB_SIDES = {
+    # direction: (Binance side, Bitget side)
+    "BINANCE_LONG": ("BUY", "open_short"),
+    "BITGET_LONG": ("SELL", "open_long"),
+}
+
+
+# 한쪽만 체결돼 되돌릴 때 체결 수량이 응답에 아직 없으면 주문 조회를 다시 해 보는 횟수 / 간격
+UNWIND_POLLS = 5
+UNWIND_POLL_SEC = 0.2
+
+
+def arb_quantity(usd_amount, price, *rules) -> Decimal:
+    """두 거래소 stepSize 를 모두 만족하는 공통 수량 (두 step 의 최소공배수 단위로 내림)"""
+    step = trading_rules.common_step(*(rule.step_size for rule in rules))
+    return trading_rules.quantize(Decimal(str(usd_amount)) / Decimal(str(price)), step)
+
+
+async def timed_leg(coro, t0: float) -> dict:
+    """전송 시각 / 응답(ack) 시각 기록. 예외는 결과에 담아서 다른 다리 결과와 같이 처리"""
+    sent = time.perf_counter()
+    try:
+        result = {"order": await coro}
+    except Exception as e:
+        result = {"error": str(e)}
+    acked = time.perf_counter()
+    result["send_ms"] = round((sent - t0) * 1000, 2)
+    result["latency_ms"] = round((acked - sent) * 1000, 2)
+    return result
+
+
+async def binance_filled_qty(client, symbol: str, order_id):
+    return (await client.futures_get_order(symbol=symbol, orderId=order_id)).get("executedQty")
+
+
+async def bitget_filled_qty(client, symbol: str, order_id):
+    return (await client.mix_get_order_details(symbol, orderId=order_id)).get("data", {}).get("filledQty")
+
+
+async def filled_quantity(leg: dict, poll) -> Decimal:
+    """되돌릴 체결 수량. 응답에 없거나 0 이면 (ack 직후라 아직 반영 전) 주문을 다시 조회하고,
+    끝까지 0 이하면 되돌릴 수 없으므로 예외 (수량 0 주문은 거래소가 거부해서 포지션이 그대로 남음)"""
+    qty = Decimal((leg.get("fill") or {}).get("qty") or "0")
+    for _ in range(UNWIND_POLLS):
+        if qty > 0:
+            break
+        await asyncio.sleep(UNWIND_POLL_SEC)
+        qty = Decimal(await poll() or "0")
+    if qty <= 0:
+        raise ValueError("체결 수량을 확인하지 못해 되돌리지 못했습니다 (포지션 수동 확인 필요)")
+    return qty
+
+
+async def binance_unwind(client, symbol: str, side: str, quantity: str):
+    return await client.futures_create_order(
+        symbol=symbol, side="SELL" if side == "BUY" else "BUY", type="MARKET",
+        quantity=quantity, reduceOnly=True
+    )
+
+
+async def bitget_unwind(client, symbol: str, side: str, size: str):
+    return await client.mix_place_order(
+        symbol=symbol, marginCoin="USDT", size=size,
+        side="close_long" if side == "open_long" else "close_short",
+        orderType="market", reduceOnly="true"
+    )
+
+
+@router.post("/arb/order")
+async def arb_order(req: ArbOrderRequest):
+    """Binance / Bitget 주문을 같은 수량으로 동시에 전송하고 다리별 지연/체결을 보고"""
+    started = time.perf_counter()
+    direction = req.direction.upper()
+    if direction not in ARB_SIDES:
+        return {"status": "error", "message": f"direction 은 {list(ARB_SIDES)} 중 하나여야 합니다."}
+    binance_side, bitget_side = ARB_SIDES[direction]
+    binance_symbol = req.symbol.upper()
+    bitget_symbol = f"{binance_symbol}_UMCBL"
+
+    try:
+        binance = await get_binance_client()
+        bitget = get_bitget_client()
+
+        # 주문 전 준비는 전부 동시에: 가격, 규칙, 양쪽 레버리지/마진 모드
+        bitget_req = OrderRequest(
+            symbol=bitget_symbol, side="BUY" if bitget_side == "open_long" else "SELL",
+            usdAmount=req.usdAmount, leverage=req.leverage, marginMode=req.marginMode,
+        )
+        ticker, binance_rule, bitget_rule, _, _, _ = await asyncio.gather(
+            binance.futures_symbol_ticker(symbol=binance_symbol),
+            trading_rules.get_rule("Binance", binance_symbol),
+            trading_rules.get_rule("Bitget", bitget_symbol),
+            binance.futures_change_leverage(symbol=binance_symbol, leverage=req.leverage),
+            ignore_errors(binance.futures_change_margin_type(symbol=binance_symbol, marginType=req.marginMode.upper())),
+            bitget_setup(bitget, bitget_req),
+        )
+        stage("arb", "prepare", started)
+        price = Decimal(ticker["price"])
+        quantity = arb_quantity(req.usdAmount, price, binance_rule, bitget_rule)
+
+        if quantity * price < binance_rule.min_notional:
+            finish("arb", "rejected", started)
+            return {"status": "error", "message": f"주문 금액이 Binance 최소 요구치({binance_rule.min_notional} USDT) 미만입니다."}
+        if quantity < bitget_rule.min_qty:
+            finish("arb", "rejected", started)
+            return {"status": "error", "message": f"주문 수량이 Bitget 최소 요구치({bitget_rule.min_qty}) 미만입니다."}
+        qty = to_str(quantity)
+
+        # 양쪽 주문 동시 전송 (다리 간 시차 최소화)
+        t0 = time.perf_counter()
+        binance_leg, bitget_leg = await asyncio.gather(
+            timed_leg(binance.futures_create_order(
+                symbol=binance_symbol, side=binance_side, type="MARKET",
+                quantity=qty, newOrderRespType="RESULT"
+            ), t0),
+            timed_leg(bitget.mix_place_order(
+                symbol=bitget_symbol, marginCoin="USDT", size=qty,
+                side=bitget_side, orderType="market"
+            ), t0),
+        )
+        acked = stage("arb", "legs", t0)
+        for name, leg in (("binance", binance_leg), ("bitget", bitget_leg)):
+            metrics.order_stage_seconds.observe(leg["latency_ms"] / 1000, "arb", f"{name}_ack")
+        skew_ms = round(abs(binance_leg["send_ms"] - bitget_leg["send_ms"]), 2)
+        ack_skew_ms = round(abs(
+            (binance_leg["send_ms"] + binance_leg["latency_ms"]) - (bitget_leg["send_ms"] + bitget_leg["latency_ms"])
+        ), 2)
+
+        # 체결 정보: Binance 는 RESULT 응답에, Bitget 은 주문 상세 조회로
+        if "order" in binance_leg:
+            order = binance_leg["order"]
+            binance_leg["fill"] = {"qty": order.get("executedQty"), "avgPrice": order.get("avgPrice"), "status": order.get("status")}
+        if "order" in bitget_leg:
+            if bitget_leg["order"].get("code") != "00000":
+                bitget_leg["error"] = bitget_leg.pop("order")
+            else:
+                order_id = bitget_leg["order"]["data"]["orderId"]
+                try:
+                    detail = (await bitget.mix_get_order_details(bitget_symbol, orderId=order_id)).get("data", {})
+                    bitget_leg["fill"] = {"qty": detail.get("filledQty"), "avgPrice": detail.get("priceAvg"), "status": detail.get("state")}
+                except Exception as e:
+                    bitget_leg["fill"] = {"error": str(e)}
+        unwind_started = stage("arb", "fill", acked)
+
+        result = {
+            "quantity": qty,
+            "binance": binance_leg,
+            "bitget": bitget_leg,
+            "skew_ms": skew_ms,
+            "ack_skew_ms": ack_skew_ms,
+        }
+
+        # 한쪽만 성공 → 체결된 다리 되돌리기
+        failed = [name for name, leg in (("binance", binance_leg), ("bitget", bitget_leg)) if "error" in leg]
+        if len(failed) == 1 and req.unwind:
+            try:
+                if failed[0] == "bitget":
+                    order_id = binance_leg["order"].get("orderId")
+                    filled = await filled_quantity(binance_leg, lambda: binance_filled_qty(binance, binance_symbol, order_id))
+                    result["unwind"] = {"binance": await binance_unwind(binance, binance_symbol, binance_side, to_str(filled))}
+                else:
+                    order_id = bitget_leg["order"]["data"]["orderId"]
+                    filled = await filled_quantity(bitget_leg, lambda: bitget_filled_qty(bitget, bitget_symbol, order_id))
+                    result["unwind"] = {"bitget": await bitget_unwind(bitget, bitget_symbol, bitget_side, to_str(filled))}
+                logger.warning(f"[ARB] {failed[0]} 주문 실패 → 반대 다리 되돌림: {result['unwind']}")
+            except Exception as e:
+                result["unwind"] = {"error": str(e)}
+                logger.error(f"[ARB] 되돌림 실패, 한쪽 포지션만 남음: {req.symbol} → {e}")
+            stage("arb", "unwind", unwind_started)
+
+        result["status"] = "success" if not failed else "error"
+        finish("arb", result["status"], started)
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(
+            f"[ARB] {binance_symbol} {direction} {qty} → 실패={failed or '없음'}, "
+            f"skew={skew_ms}ms, 총 {result['latency_ms']}ms"
+        )
+        return result
+
+    except Exception as e:
+        finish("arb", "error", started)
+        logger.error(f"[ARB] 주문 실패: {req.symbol} {direction} {req.usdAmount}USDT → {e}")
+        return {"status": "error", "message": str(e)}
+
+
+# -------------------------------
+# 일괄 주문 (리밸런싱)
+# -------------------------------
+# 거래소별 동시 실행 수 / 초당 주문 수 제한 (주문 1건 = 설정 + 조회 + 주문 여러 요청)
+BATCH_LIMITS = {
+    "binance": (int(os.getenv("BATCH_CONCURRENCY_BINANCE", "8")), float(os.getenv("BATCH_RATE_BINANCE", "10"))),
+    "bitget": (int(os.getenv("BATCH_CONCURRENCY_BITGET", "4")), float(os.getenv("BATCH_RATE_BITGET", "4"))),
+}
+MAX_BATCH_ORDERS = 100
+
+
+class BatchOrderItem(OrderRequest):
+    exchange: str   # binance / bitget
+
+
+class BatchOrderRequest(BaseModel):
+    orders: list[BatchOrderItem]
+
+
+class OrderThrottle:
+    """동시 실행 수(semaphore) + 시작 간격(초당 rate) 제한. 프로세스 전체에서 거래소별로 공유"""
+
+    def __init__(self, concurrency: int, rate: float):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1 / rate
+        self.next_start = 0.0
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        # 다음 시작 가능 시각을 먼저 예약하고 그때까지 대기
+        now = time.monotonic()
+        start = max(now, self.next_start)
+        self.next_start = start + self.interval
+        if start > now:
+            try:
+                await asyncio.sleep(start - now)
+            except BaseException:
+                # 대기 중 취소(클라이언트 끊김 등)되면 __aexit__ 가 불리지 않으므로 여기서 자리 반납.
+                # 뒤에 예약한 요청이 없으면 예약한 시작 시각도 돌려준다
+                if self.next_start == start + self.interval:
+                    self.next_start = start
+                self.semaphore.release()
+                raise
+
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
+
+
+throttles = {name: OrderThrottle(*limits) for name, limits in BATCH_LIMITS.items()}
+batch_tasks = set()   # 실행 중인 일괄 주문 태스크 (응답 스트림이 닫혀도 GC 되지 않게 강한 참조 유지)
+ORDER_HANDLERS = {"binance": binance_order, "bitget": bitget_order}
+
+
+async def run_batch_item(index: int, item: BatchOrderItem) -> dict:
+    exchange = item.exchange.lower()
+    head = {"index": index, "exchange": exchange, "symbol": item.symbol, "side": item.side}
+    if exchange not in ORDER_HANDLERS:
+        return {**head, "status": "error", "message": f"지원하지 않는 거래소: {item.exchange}"}
+
+    async with throttles[exchange]:
+        req = OrderRequest(**item.model_dump(exclude={"exchange"}))
+        return {**head, **(await ORDER_HANDLERS[exchange](req))}
+
+
+@router.post("/batch/order")
+async def batch_order(req: BatchOrderRequest):
+    """주문 목록을 거래소별 제한 안에서 동시에 실행하고, 끝나는 순서대로 NDJSON 한 줄씩 전송"""
+    if len(req.orders) > MAX_BATCH_ORDERS:
+        return {"status": "error", "message": f"한 번에 최대 {MAX_BATCH_ORDERS}건까지 가능합니다."}
+
+    async def stream_results():
+        started = time.perf_counter()
+        # 태스크로 띄워서 클라이언트가 중간에 끊어도 시작한 주문은 끝까지 보낸다 (결과만 버려짐).
+        # 참조는 batch_tasks 가 들고 있어서 이 제너레이터가 닫혀도 태스크는 살아 있다
+        tasks = [asyncio.create_task(run_batch_item(i, item)) for i, item in enumerate(req.orders)]
+        for task in tasks:
+            batch_tasks.add(task)
+            task.add_done_callback(batch_tasks.discard)
+        ok = failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if result.get("status") == "success":
+                    ok += 1
+                else:
+                    failed += 1
+                yield json.dumps(result, default=str) + "\n"
+        except (GeneratorExit, asyncio.CancelledError):
+            # 응답 스트림만 닫힘: 남은 주문은 취소하지 않는다
+            pending = sum(not task.done() for task in tasks)
+            logger.warning(f"[BATCH] 클라이언트 연결 종료, 남은 {pending}건은 계속 실행")
+            raise
+
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"[BATCH] {len(tasks)}건 완료: 성공 {ok}, 실패 {failed}, {elapsed_ms}ms")
+        yield json.dumps({"done": True, "ok": ok, "failed": failed, "elapsed_ms": elapsed_ms}) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@router.get("/ratelimit/stats")
+async def ratelimit_stats():
+    """거래소별 남은 요청 예산 / 대기열 / 429 횟수"""
+    return {name: scheduler.stats() for name, scheduler in rate_limit.schedulers.items()}
@@ -1,29 +1,15 @@
-import os
-from fastapi import APIRouter
-from dotenv import load_dotenv
-from binance.client import Client as BinanceClient
-from pybitget import Client as BitgetClient
+from fastapi import APIRouter, Depends
+from backend import rate_limit
+from backend.exchange_clients import get_binance_client, get_bitget_client
 
-load_dotenv()
-router = APIRouter()
-
-# Binance Client
-binance_client = BinanceClient(
-    os.getenv("BINANCE_API_KEY"),
-    os.getenv("BINANCE_API_SECRET")
-)
-
-# Bitget Client (api_key, secret_key, passphrase)
-bitget_client = BitgetClient(
-    os.getenv("BITGET_API_KEY"),
-    os.getenv("BITGET_API_SECRET"),
-    passphrase=os.getenv("BITGET_API_PASS")
-)
+# 거래소 호출은 공유 async 클라이언트로 (rate_limit 스케줄러에서 계정 조회 우선순위)
+router = APIRouter(dependencies=[Depends(rate_limit.account_priority)])
 
 # Binance 계정 조회
 @router.get("/binance/account")
 async def binance_account():
-    account_info = binance_client.futures_account()
+    client = await get_binance_client()
+    account_info = await client.futures_account()
     balances = [
         {
             "asset": a["asset"],
@@ -43,7 +29,7 @@ async def binance_account():
 @router.get("/bitget/account")
 async def bitget_account():
     try:
-        res = bitget_client.mix_get_accounts(productType="UMCBL")
+        res = await get_bitget_client().mix_get_accounts(productType="UMCBL")
         if "data" not in res:
             return {
                 "totalWalletBalance": 0,
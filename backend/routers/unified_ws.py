@@ -1,120 +1,305 @@
 import asyncio
 import logging
+import math
+import orjson
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
 # Binance / Bitget 모듈 import
+from backend import fanout, ingest_bus, recorder, tick_trace
+from backend.position_store import store
 from backend.routers import binance_ws, ws_router as bitget_ws
 
 router = APIRouter()
-active_clients = set()
+active_clients = set()   # 구독 메시지를 안 보낸 클라이언트: 매번 전체 목록 (기존 동작)
 loop = None
 
+# 구독 메시지를 보낸 클라이언트: 관심 있는 (거래소, 심볼) 의 바뀐 행만 델타로
+subscribers = {}         # {websocket: Subscriber}
+symbol_index = {}        # {(exchange, symbol): {Subscriber}}, 전체는 "*"
+last_rows = {}           # 마지막 flush 때의 {row_key: row} (델타 기준)
+
 log = logging.getLogger("unified-positions")
 
 
-def build_unified_positions():
-    """Binance + Bitget 포지션을 공통 포맷으로 합쳐서 반환"""
-    merged = []
-
-    # ✅ Binance 포맷
-    for symbol, pos in binance_ws.last_positions.items():
-        mark = binance_ws.last_mark_prices.get(symbol)
-        try:
-            size = float(pos.get("pa") or 0)
-        except Exception:
-            size = 0.0
-        try:
-            entry = float(pos.get("ep") or 0)
-        except Exception:
-            entry = 0.0
-
-        if size > 0:
-            side = "LONG"
-        elif size < 0:
-            side = "SHORT"
-        else:
-            side = "FLAT"
-
-        upl = pos.get("up")
-        try:
-            if mark and entry and size:
-                m = float(mark)
-                upl = (m - entry) * size if size > 0 else (entry - m) * abs(size)
-        except Exception:
-            pass
-
-        merged.append({
-            "exchange": "binance",
-            "symbol": symbol,
-            "side": side,
-            "size": size,
-            "upl": upl,
-            "entryPrice": entry,
-            "markPrice": mark,
-            "liqPrice": pos.get("l"),
-            "margin": pos.get("iw"),
-        })
-
-    # ✅ Bitget 포맷
-    for (instId, side), pos in bitget_ws.last_positions.items():
-        base_symbol = bitget_ws.pos_to_base.get((instId, side))
-        mark_price = bitget_ws.last_mark_prices.get(base_symbol)
-        upl = None
-        try:
-            entry = float(pos.get("averageOpenPrice", 0))
-            size = float(pos.get("total", 0))
-            if mark_price and entry and size:
-                mark = float(mark_price)
-                if side == "long":
-                    upl = (mark - entry) * size
-                elif side == "short":
-                    upl = (entry - mark) * size
-        except Exception:
-            pass
-
-        merged.append({
-            "exchange": "bitget",
-            "symbol": base_symbol,
-            "side": side.upper(),
-            "size": pos.get("total"),
-            "upl": upl if upl is not None else pos.get("upl"),
-            "entryPrice": pos.get("averageOpenPrice"),
-            "markPrice": mark_price,
-            "liqPrice": pos.get("liqPx"),
-            "margin": pos.get("margin"),
-        })
+NO_POSITIONS_MSG = "현재 열린 포지션이 없습니다."
+SUBSCRIBE_EXCHANGES = ("binance", "bitget")
+SUBSCRIBE_MAX_SYMBOLS = 1000
+UNIFIED_KEYS = ("exchange", "symbol", "side", "size", "upl", "entryPrice", "markPrice", "liqPrice", "margin", "ts")
+
+
+def unified_row(rec, exchange: str, row: dict) -> dict:
+    """거래소별 행 → 공통 포맷 (레코드에 캐시, UPL 등 재계산 없음)"""
+    if rec.unified is None:
+        rec.unified = {
+            **{k: row[k] for k in UNIFIED_KEYS if k in row},
+            "exchange": exchange,
+            "symbol": rec.base,
+            "side": row["side"].upper(),
+        }
+    return rec.unified
+
+
+def to_unified(snapshot=None) -> list[dict]:
+    """Binance + Bitget 레코드의 캐시된 공통 포맷 행을 모음"""
+    snapshot = snapshot or store.snapshot
+    merged = [
+        unified_row(rec, "binance", binance_ws.position_row(rec))
+        for rec in snapshot.binance_positions.values()
+    ]
+    merged += [
+        unified_row(rec, "bitget", bitget_ws.position_row(rec))
+        for rec in snapshot.bitget_positions.values()
+    ]
 
     if not merged:
-        merged = [{"msg": "현재 열린 포지션이 없습니다."}]
+        merged = [{"msg": NO_POSITIONS_MSG}]
     return merged
 
 
+def row_key(row: dict) -> str:
+    return f"{row['exchange']}:{row['symbol']}:{row['side']}"
+
+
+def unified_map(snapshot) -> dict:
+    """{row_key: 공통 포맷 행}. 값이 안 바뀐 포지션은 이전 flush 와 같은 dict 객체"""
+    return {row_key(row): row for row in to_unified(snapshot) if "msg" not in row}
+
+
+class Subscriber:
+    """구독 클라이언트 1개: 필터 + 아직 못 보낸 변경분 (같은 키는 최신 값으로 덮어씀)"""
+
+    def __init__(self, websocket: WebSocket, exchanges, symbols, max_hz):
+        self.websocket = websocket
+        self.exchanges = set(exchanges)
+        self.symbols = set(symbols)
+        self.min_interval = 1 / max_hz if max_hz else 0
+        self.changed = {}
+        self.removed = set()
+        self.snapshot = None     # 구독 직후 보낼 필터된 전체 행
+        self.channel = None      # fanout 전송 채널 (보낼 차례에 take() 로 프레임을 만든다)
+
+    def index_keys(self):
+        for exchange in self.exchanges or ("*",):
+            for symbol in self.symbols or ("*",):
+                yield exchange, symbol
+
+    def wants(self, row: dict) -> bool:
+        return ((not self.exchanges or row["exchange"] in self.exchanges)
+                and (not self.symbols or row["symbol"] in self.symbols))
+
+    def take(self):
+        """전송 채널이 보낼 차례에 호출: 그동안 쌓인 변경분을 프레임 하나로"""
+        if self.snapshot is not None:
+            # 스냅샷 이후 쌓인 변경분은 스냅샷에 합쳐서 한 프레임으로
+            rows = {**self.snapshot, **self.changed}
+            for key in self.removed:
+                rows.pop(key, None)
+            self.snapshot, self.changed, self.removed = None, {}, set()
+            return fanout.encode({"type": "snapshot", "rows": list(rows.values())})
+        if self.changed or self.removed:
+            frame = {"type": "delta", "changed": list(self.changed.values()), "removed": list(self.removed)}
+            self.changed, self.removed = {}, set()
+            return fanout.encode(frame)
+        return None
+
+
+def interested(exchange: str, symbol: str) -> set:
+    subs = set()
+    for key in ((exchange, symbol), (exchange, "*"), ("*", symbol), ("*", "*")):
+        subs |= symbol_index.get(key, set())
+    return subs
+
+
+def string_list(msg: dict, key: str) -> list[str]:
+    value = msg.get(key)
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"{key} 는 문자열 목록이어야 합니다")
+    return value
+
+
+def parse_subscribe(msg: dict) -> tuple[set, set, float]:
+    """구독 메시지 검증 → (거래소, 심볼, max_hz). 잘못되면 ValueError (클라이언트에 error 프레임으로 응답)"""
+    exchanges = {e.lower() for e in string_list(msg, "exchanges")}
+    unknown = exchanges - set(SUBSCRIBE_EXCHANGES)
+    if unknown:
+        raise ValueError(f"지원하지 않는 거래소: {sorted(unknown)} (가능: {list(SUBSCRIBE_EXCHANGES)})")
+    symbols = {s.upper() for s in string_list(msg, "symbols")}
+    if len(symbols) > SUBSCRIBE_MAX_SYMBOLS:
+        raise ValueError(f"symbols 는 최대 {SUBSCRIBE_MAX_SYMBOLS}개까지 가능합니다")
+
+    max_hz = msg.get("max_hz")
+    if max_hz is not None:
+        if isinstance(max_hz, bool) or not isinstance(max_hz, (int, float)) or not math.isfinite(max_hz) or max_hz <= 0:
+            raise ValueError("max_hz 는 0보다 큰 숫자여야 합니다")
+        # 브로드캐스트 flush 빈도보다 자주 보낼 일은 없으므로 그 이상은 제한 없음(0)과 같음
+        max_hz = 0 if max_hz >= fanout.BROADCAST_MAX_HZ else max_hz
+    return exchanges, symbols, max_hz
+
+
+def subscribe(websocket: WebSocket, exchanges: set, symbols: set, max_hz) -> Subscriber:
+    """구독 등록 (다시 보내면 필터 교체). 델타 기준 상태 그대로 스냅샷을 보내야 이후 델타와 맞는다"""
+    global last_rows
+    unsubscribe(websocket)
+    if not subscribers:
+        last_rows = unified_map(store.snapshot)
+
+    sub = Subscriber(websocket, exchanges, symbols, max_hz)
+    subscribers[websocket] = sub
+    for key in sub.index_keys():
+        symbol_index.setdefault(key, set()).add(sub)
+    active_clients.discard(websocket)
+
+    sub.snapshot = {key: row for key, row in last_rows.items() if sub.wants(row)}
+    # 같은 채널을 델타 모드로 전환 (아직 못 보낸 전체 목록 프레임은 버림)
+    sub.channel = fanout.channels.get(websocket)
+    if sub.channel is not None:
+        sub.channel.latest = None
+        sub.channel.take = sub.take
+        sub.channel.min_interval = sub.min_interval  # 클라이언트가 요청한 최대 갱신 빈도
+    return sub
+
+
+def unsubscribe(websocket: WebSocket):
+    sub = subscribers.pop(websocket, None)
+    if sub is None:
+        return
+    for key in sub.index_keys():
+        clients = symbol_index.get(key)
+        if clients:
+            clients.discard(sub)
+            if not clients:
+                del symbol_index[key]
+
+
+def release(websocket: WebSocket):
+    active_clients.discard(websocket)
+    unsubscribe(websocket)
+
+
+def route(snapshot, traces: dict = None) -> int:
+    """이전 flush 대비 바뀐 행만 관심 있는 구독자에게 넘김. 깨운 구독자 수 반환"""
+    global last_rows
+    current = unified_map(snapshot)
+    touched = {}   # {Subscriber: 바뀐 행의 거래소들}
+
+    for key, row in current.items():
+        if last_rows.get(key) is not row:
+            for sub in interested(row["exchange"], row["symbol"]):
+                sub.changed[key] = row
+                sub.removed.discard(key)
+                touched.setdefault(sub, set()).add(row["exchange"])
+
+    for key in last_rows.keys() - current.keys():
+        exchange, symbol, _ = key.split(":")
+        for sub in interested(exchange, symbol):
+            sub.changed.pop(key, None)
+            sub.removed.add(key)
+            touched.setdefault(sub, set())
+
+    last_rows = current
+    for sub, exchanges in touched.items():
+        if sub.channel is not None:
+            sub.channel.offer(trace=tick_trace.only(traces or {}, exchanges))
+    return len(touched)
+
+
+def build_unified_positions():
+    """Binance + Bitget 포지션을 공통 포맷으로 합쳐서 반환"""
+    return to_unified(store.snapshot)
+
+
+def flush() -> int:
+    """fanout 스케줄러가 호출: 거래소별 목록을 한 번만 만들고 세 엔드포인트가 공유"""
+    snapshot = store.snapshot  # 같은 버전의 상태로 세 엔드포인트를 만든다
+    traces = tick_trace.collect(snapshot)  # 지난 flush 이후 적용된 마크 틱 (지연 측정용)
+    binance_rows = binance_ws.build_positions(snapshot)
+    bitget_rows = bitget_ws.build_positions(snapshot)
+
+    sent = 0
+    if binance_ws.active_clients:
+        sent += fanout.send_all(
+            binance_ws.active_clients, binance_rows or [{"msg": NO_POSITIONS_MSG}],
+            tick_trace.only(traces, ("binance",)),
+        )
+    if bitget_ws.active_clients:
+        sent += fanout.send_all(
+            bitget_ws.active_clients, bitget_rows or {"msg": NO_POSITIONS_MSG},
+            tick_trace.only(traces, ("bitget",)),
+        )
+    if active_clients:
+        sent += fanout.send_all(active_clients, to_unified(snapshot), traces)
+    if subscribers:
+        sent += route(snapshot, traces)
+    return sent
+
+
 def broadcast():
-    """모든 클라이언트에 통합 포지션 전송"""
-    merged = build_unified_positions()
-    for ws in list(active_clients):
-        try:
-            asyncio.run_coroutine_threadsafe(ws.send_json(merged), loop)
-        except Exception:
-            active_clients.discard(ws)
+    """모든 클라이언트에 통합 포지션 전송 (스케줄러로 모아서)"""
+    fanout.scheduler.mark_dirty()
+
+
+@router.get("/api/broadcast/stats")
+async def broadcast_stats():
+    """받은 업데이트 수 vs 실제 flush / 전송 프레임 수"""
+    return fanout.scheduler.stats()
+
+
+@router.get("/api/broadcast/clients")
+async def broadcast_clients():
+    """클라이언트별 전송 지연 / 덮어쓴 프레임 수 (느린 소비자 확인용)"""
+    return fanout.client_stats()
+
+
+@router.get("/api/ingest/stats")
+async def ingest_stats():
+    """거래소 스트림 수신/적용/드롭 카운터와 큐 깊이 (+ ingest 버스 상태)"""
+    return {**store.stats(), "bus": ingest_bus.stats(), "recorder": recorder.stats(), "clock": tick_trace.stats()}
 
 
 @router.websocket("/ws/positions/all")
 async def unified_positions_ws(websocket: WebSocket):
+    """기본은 갱신마다 전체 목록. 클라이언트가
+    {"op": "subscribe", "exchanges": ["binance"], "symbols": ["BTCUSDT"], "max_hz": 2}
+    를 보내면 {"type": "snapshot", "rows": [...]} 한 번 뒤로
+    {"type": "delta", "changed": [...], "removed": ["binance:BTCUSDT:LONG", ...]}
+    형식으로 관심 있는 포지션의 변경분만 보낸다 (빈 목록 / 생략 = 전체).
+    구독 메시지가 잘못되면 {"type": "error", "op": "subscribe", "message": ...} 로 응답 (연결 유지)."""
     global loop
     await websocket.accept()
+    channel = fanout.attach(websocket, "/ws/positions/all", on_drop=lambda: release(websocket))
     active_clients.add(websocket)
     loop = asyncio.get_running_loop()
     log.info(f"🌐 통합 클라이언트 연결됨: {websocket.client}")
 
     # 최초 상태 푸시
     merged = build_unified_positions()
-    await websocket.send_json(merged)
+    channel.offer(fanout.encode(merged))
 
     try:
-        # 별도의 sleep 루프는 필요 없음 → 연결만 유지
         while True:
-            await asyncio.sleep(60)
+            try:
+                msg = orjson.loads(await websocket.receive_text())
+            except orjson.JSONDecodeError:
+                continue
+            if not isinstance(msg, dict):
+                continue
+            if msg.get("op") == "subscribe":
+                try:
+                    exchanges, symbols, max_hz = parse_subscribe(msg)
+                except ValueError as e:
+                    # 연결은 유지하고 이전 구독(또는 전체 목록) 그대로
+                    channel.notice(fanout.encode({"type": "error", "op": "subscribe", "message": str(e)}))
+                    continue
+                sub = subscribe(websocket, exchanges, symbols, max_hz)
+                log.info(
+                    f"📡 통합 구독: {websocket.client} 거래소={sub.exchanges or '전체'} "
+                    f"심볼={sub.symbols or '전체'} max_hz={max_hz or '제한 없음'}"
+                )
+                channel.offer()  # 필터에 맞는 현재 행을 snapshot 프레임으로 전송
     except WebSocketDisconnect:
         log.info(f"🔌 통합 클라이언트 해제: {websocket.client}")
-        active_clients.discard(websocket)
\ No newline at end of file
+    finally:
+        release(websocket)
+        fanout.detach(websocket)
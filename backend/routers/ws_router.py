@@ -1,16 +1,16 @@
-import os, json, asyncio, logging
+import os, asyncio, logging
+import orjson
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from dotenv import load_dotenv
 from pybitget.stream import BitgetWsClient, handel_error, SubscribeReq
-from backend.routers import unified_ws 
+from backend import fanout, metrics, recorder, tick_trace
+from backend.position_store import store, PositionRecord, put_position, set_mark
 
 router = APIRouter()
 active_clients = set()
 loop = None
-last_positions = {}         # {(instId, side): pos}
-last_mark_prices = {}
-pos_to_base = {}            # (instId, side) → ticker 심볼 매핑
-subscribed_symbols = set()  # ticker 채널에 구독한 심볼(PEPEUSDT 등)
+subscribed_symbols = set()  # ticker 채널에 구독한 심볼(PEPEUSDT 등), 루프에서만 변경
+# 포지션 / markPrice / (instId, side) → ticker 심볼 매핑은 position_store 가 보관
 
 log = logging.getLogger("positions-ticker")
 
@@ -23,132 +23,149 @@ API_PASS = os.getenv("BITGET_API_PASS")
 if not all([API_KEY, API_SECRET, API_PASS]):
     raise RuntimeError("환경변수 BITGET_API_KEY, BITGET_API_SECRET, BITGET_API_PASS 를 설정하세요.")
 
-# Bitget WebSocket 클라이언트
-bitget_ws = (
-    BitgetWsClient(
-        api_key=API_KEY,
-        api_secret=API_SECRET,
-        passphrase=API_PASS,
-        verbose=True,
+# Bitget WebSocket 클라이언트 (거래소 연결을 갖는 프로세스에서만 start() 로 연결, 웹 워커는 None)
+bitget_ws = None
+
+
+def start():
+    """Bitget WS 연결 + positions 채널 구독. build() 가 연결될 때까지 블로킹이라 스레드에서 호출"""
+    global bitget_ws
+    bitget_ws = (
+        BitgetWsClient(
+            api_key=API_KEY,
+            api_secret=API_SECRET,
+            passphrase=API_PASS,
+            verbose=True,
+        )
+        .error_listener(handel_error)
+        .build()
     )
-    .error_listener(handel_error)
-    .build()
-)
+    bitget_ws.subscribe([SubscribeReq("umcbl", "positions", "default")], on_message)
 
-def broadcast():
-    """포지션 + markPrice + 실시간 UPL 합쳐서 브로드캐스트"""
-    merged = []
-    for (pos_symbol, side), pos in last_positions.items():
-        base_symbol = pos_to_base.get((pos_symbol, side))
-        mark_price = last_mark_prices.get(base_symbol)
-
-        # upl 실시간 계산
-        upl = None
-        try:
-            entry = float(pos.get("averageOpenPrice", 0))
-            size = float(pos.get("total", 0))
-            if mark_price and entry and size:
-                mark = float(mark_price)
-                if side == "long":
-                    upl = (mark - entry) * size
-                elif side == "short":
-                    upl = (entry - mark) * size
-        except Exception as e:
-            log.error(f"UPL 계산 오류: {e}")
-
-        merged.append({
-            "symbol": pos_symbol,   # 예: PEPEUSDT_UMCBL
-            "side": side,
-            "size": pos.get("total"),
-            "upl": upl if upl is not None else pos.get("upl"),
-            "entryPrice": pos.get("averageOpenPrice"),
-            "markPrice": mark_price,
-            "liqPrice": pos.get("liqPx"),
-            "margin": pos.get("margin"),
-        })
-
-    if not merged:
-        merged = {"msg": "현재 열린 포지션이 없습니다."}
-
-    for ws in list(active_clients):
-        asyncio.run_coroutine_threadsafe(ws.send_json(merged), loop)
-    
-    try:
-        unified_ws.broadcast()
-    except Exception as e:
-        log.error(f"통합 브로드캐스트 호출 실패: {e}")
+
+def close():
+    if bitget_ws is not None:
+        bitget_ws.close()
+
+
+def position_row(rec: PositionRecord) -> dict:
+    """/ws/positions 포맷 (레코드에 캐시)"""
+    if rec.row is None:
+        rec.row = {
+            "symbol": rec.symbol,   # 예: PEPEUSDT_UMCBL
+            "side": rec.side,
+            "size": rec.size_raw,
+            "upl": rec.upl,
+            "entryPrice": rec.entry_raw,
+            "markPrice": rec.mark_raw,
+            "liqPrice": rec.liq,
+            "margin": rec.margin,
+        }
+        if tick_trace.WS_TRACE_TIMESTAMPS and rec.trace:
+            rec.row["ts"] = tick_trace.row_stamps(rec.trace)
+    return rec.row
 
 
+def build_positions(snapshot=None) -> list[dict]:
+    """포지션 + markPrice + 실시간 UPL 합친 목록 (/ws/positions 포맷, 통합 포맷의 원본).
+    UPL 은 ticker 가 온 심볼의 레코드만 다시 계산돼 있어서 여기서는 캐시된 행만 모은다."""
+    snapshot = snapshot or store.snapshot
+    return [position_row(rec) for rec in snapshot.bitget_positions.values()]
+
+
+def broadcast():
+    """변경 알림만 남기고, 실제 재계산/전송은 fanout 스케줄러가 모아서 처리"""
+    fanout.scheduler.mark_dirty()
 
 
 def on_message(message: str):
-    global last_positions, last_mark_prices, subscribed_symbols, pos_to_base
-    try:
-        data = json.loads(message)
-        arg = data.get("arg", {})
-        channel = arg.get("channel")
-        payload = data.get("data", [])
-
-        # ✅ 포지션 채널
-        if channel == "positions":
-            current_keys = set()
-            for pos in payload:
-                instId = pos["instId"]              # 예: "PEPEUSDT_UMCBL"
-                base_symbol = instId.split("_")[0]  # "PEPEUSDT"
-                side = pos["holdSide"]              # "long" 또는 "short"
-
-                key = (instId, side)
-                last_positions[key] = pos
-                pos_to_base[key] = base_symbol
-                current_keys.add(key)
-
-                # 새 심볼이면 ticker 채널 구독
-                if base_symbol not in subscribed_symbols:
+    """pybitget 스레드에서 호출됨: 파싱/상태 변경 없이 원본 메시지를 루프 큐에 넣기만 한다"""
+    metrics.messages.inc("bitget")
+    recorder.record("bitget", message)
+    store.submit_threadsafe("bitget", message)
+
+
+def apply_message(st, message: str):
+    """position_store 루프 태스크에서 실행 (단일 writer)"""
+    data = orjson.loads(message)
+    arg = data.get("arg", {})
+    channel = arg.get("channel")
+    payload = data.get("data", [])
+
+    # ✅ 포지션 채널
+    if channel == "positions":
+        current_keys = set()
+        for pos in payload:
+            instId = pos["instId"]              # 예: "PEPEUSDT_UMCBL"
+            base_symbol = instId.split("_")[0]  # "PEPEUSDT"
+            side = pos["holdSide"]              # "long" 또는 "short"
+
+            key = (instId, side)
+            put_position(st.bitget_positions, key, PositionRecord(
+                instId, base_symbol, side, pos.get("total"), pos.get("averageOpenPrice"),
+                upl_raw=pos.get("upl"), liq=pos.get("liqPx"), margin=pos.get("margin"),
+                sign=-1 if side == "short" else 1, mark_raw=st.bitget_marks.get(base_symbol),
+            ))
+            st.bitget_pos_to_base[key] = base_symbol
+            current_keys.add(key)
+
+            # 새 심볼이면 ticker 채널 구독 (연결이 없는 리플레이에서는 구독 집합만 맞춘다)
+            if base_symbol not in subscribed_symbols:
+                if bitget_ws is not None:
                     bitget_ws.subscribe(
                         [SubscribeReq("mc", "ticker", base_symbol)], on_message
                     )
-                    subscribed_symbols.add(base_symbol)
-
-            # 사라진 포지션 제거
-            removed = {k for k in list(last_positions) if k not in current_keys}
-            for key in removed:
-                base_symbol = pos_to_base.pop(key, None)
-                last_positions.pop(key, None)
-                # ticker 구독 해제는 심볼 단위로만
-                if base_symbol and base_symbol in subscribed_symbols:
-                    # 다른 방향 포지션이 남아있으면 유지
-                    still_has = any(bs == base_symbol for bs in pos_to_base.values())
-                    if not still_has:
+                subscribed_symbols.add(base_symbol)
+
+        # 사라진 포지션 제거
+        removed = {k for k in st.bitget_positions if k not in current_keys}
+        for key in removed:
+            base_symbol = st.bitget_pos_to_base.pop(key, None)
+            st.bitget_positions.pop(key, None)
+            # ticker 구독 해제는 심볼 단위로만
+            if base_symbol and base_symbol in subscribed_symbols:
+                # 다른 방향 포지션이 남아있으면 유지
+                still_has = any(bs == base_symbol for bs in st.bitget_pos_to_base.values())
+                if not still_has:
+                    if bitget_ws is not None:
                         bitget_ws.unsubscribe(
                             [SubscribeReq("mc", "ticker", base_symbol)], on_message
                         )
-                        subscribed_symbols.remove(base_symbol)
-                        last_mark_prices.pop(base_symbol, None)
+                    subscribed_symbols.remove(base_symbol)
+                    st.bitget_marks.pop(base_symbol, None)
+
+    # ✅ ticker 채널 (markPrice 포함)
+    elif channel == "ticker":
+        for t in payload:
+            instId = t["instId"]  # 예: "PEPEUSDT"
+            st.bitget_marks[instId] = t.get("markPrice")
+            # 이 심볼 포지션(롱/숏)만 UPL 재계산
+            keys = [key for key, base in st.bitget_pos_to_base.items() if base == instId]
+            if keys:
+                # systemTime (없으면 메시지 ts) = 거래소 이벤트 시각(ms)
+                trace = tick_trace.applied("bitget", t.get("systemTime") or data.get("ts"), st.received_ns)
+                set_mark(st.bitget_positions, keys, t.get("markPrice"), trace)
 
-            broadcast()
 
-        # ✅ ticker 채널 (markPrice 포함)
-        elif channel == "ticker":
-            for t in payload:
-                instId = t["instId"]  # 예: "PEPEUSDT"
-                last_mark_prices[instId] = t.get("markPrice")
-            broadcast()
+store.register("bitget", apply_message)
 
-    except Exception as e:
-        log.error(f"메시지 파싱 오류: {e}", exc_info=True)
 
 @router.websocket("/ws/positions")
 async def positions_ws(websocket: WebSocket):
     await websocket.accept()
+    fanout.attach(websocket, "/ws/positions", on_drop=lambda: active_clients.discard(websocket))
     active_clients.add(websocket)
     log.info(f"🌐 클라이언트 연결됨: {websocket.client}")
 
-    if last_positions:
+    if store.snapshot.bitget_positions:
         broadcast()
 
     try:
+        # 클라이언트 메시지는 쓰지 않음, 연결 종료를 바로 감지하기 위한 수신 루프
         while True:
-            await asyncio.sleep(10)
+            await websocket.receive_text()
     except WebSocketDisconnect:
         log.info(f"🔌 클라이언트 연결 해제: {websocket.client}")
-        active_clients.discard(websocket)
\ No newline at end of file
+    finally:
+        active_clients.discard(websocket)
+        fanout.detach(websocket)
@@ -10,6 +10,7 @@ let fundingData = [];
 let originalOrder = []; // 원래 순서 저장
 let sortColumn = null;
 let sortDirection = "none"; // "asc" | "desc" | "none"
+let countdownCells = []; // [td, nextFundingTime] — 매초 카운트다운만 갱신
 
 // 헤더 요소
 const thSymbol = document.getElementById("thSymbol");
@@ -46,29 +47,40 @@ function toggleSort(column, thEl) {
   renderTable();
 }
 
-// ✅ DB API에서 데이터 불러오기
-async function fetchGapData() {
-  const res = await fetch("/api/gap");
-  if (!res.ok) return;
-  const json = await res.json();
-
-    fundingData = json.map(d => {
-    const binanceRate = d.binance_rate * 100;
-    const bitgetRate = d.bitget_rate * 100;
-
-    return {
-        symbol: d.symbol,
-        binance_rate: binanceRate,
-        bitget_rate: bitgetRate,
-        gap: Math.abs(binanceRate - bitgetRate), // ✅ 절대값 GAP
-        nextFundingTime: d.next_funding_time ? new Date(d.next_funding_time).getTime() : null
-    };
-    });
-
+// ✅ /ws/gap 스트림: 접속 시 전체 스냅샷, 이후엔 바뀐 행(델타)만 수신
+const WS_URL = `${location.protocol === "https:" ? "wss" : "ws"}://${location.host}/ws/gap`;
+const rowsBySymbol = new Map();
+let lastVersion = null;   // 재접속 시 ?since= 로 넘겨서 놓친 델타만 받음
+let reconnectDelay = 1000;
+const decoder = new TextDecoder(); // 서버는 한 번 직렬화한 JSON 을 바이너리 프레임으로 보냄
+
+function toRow(d) {
+  const binanceRate = d.binance_rate * 100;
+  const bitgetRate = d.bitget_rate * 100;
+
+  return {
+    symbol: d.symbol,
+    binance_rate: binanceRate,
+    bitget_rate: bitgetRate,
+    gap: Math.abs(binanceRate - bitgetRate), // ✅ 절대값 GAP
+    nextFundingTime: d.next_funding_time ? new Date(d.next_funding_time).getTime() : null
+  };
+}
 
-  if (originalOrder.length === 0) {
-    originalOrder = fundingData.map(d => d.symbol);
+function applyMessage(msg) {
+  if (msg.type === "snapshot") {
+    rowsBySymbol.clear();
+    msg.rows.forEach(d => rowsBySymbol.set(d.symbol, toRow(d)));
+  } else if (msg.type === "delta") {
+    msg.changed.forEach(d => rowsBySymbol.set(d.symbol, toRow(d)));
+    msg.removed.forEach(symbol => rowsBySymbol.delete(symbol));
   }
+  lastVersion = msg.version;
+  fundingData = [...rowsBySymbol.values()];
+
+  // 새 심볼은 원래 순서 맨 뒤에 붙임
+  const known = new Set(originalOrder);
+  fundingData.forEach(d => { if (!known.has(d.symbol)) originalOrder.push(d.symbol); });
 
   renderTable();
   statusEl.style.display = "none";
@@ -81,6 +93,29 @@ async function fetchGapData() {
   }
 }
 
+function connect() {
+  const url = lastVersion === null ? WS_URL : `${WS_URL}?since=${lastVersion}`;
+  const ws = new WebSocket(url);
+  ws.binaryType = "arraybuffer";
+
+  ws.onopen = () => { reconnectDelay = 1000; };
+
+  ws.onmessage = (event) => {
+    try {
+      applyMessage(JSON.parse(typeof event.data === "string" ? event.data : decoder.decode(event.data)));
+    } catch (e) {
+      console.error("메시지 파싱 오류:", e);
+    }
+  };
+
+  ws.onclose = () => {
+    setTimeout(connect, reconnectDelay);
+    reconnectDelay = Math.min(reconnectDelay * 2, 10000);
+  };
+
+  ws.onerror = () => ws.close();
+}
+
 
 // 테이블 렌더링
 function renderTable() {
@@ -105,7 +140,7 @@ function renderTable() {
   }
 
   bodyEl.innerHTML = "";
-  const now = Date.now();
+  countdownCells = [];
 
   rows.forEach(row => {
     const tr = document.createElement("tr");
@@ -126,15 +161,7 @@ function renderTable() {
     tdGap.className = row.gap >= 0 ? "positive" : "negative";
 
     const tdTime = document.createElement("td");
-    if (row.nextFundingTime) {
-      let remainingMs = Math.max(row.nextFundingTime - now, 0);
-      const hours = String(Math.floor(remainingMs / (1000 * 60 * 60))).padStart(2, '0');
-      const minutes = String(Math.floor((remainingMs % (1000 * 60 * 60)) / (1000 * 60))).padStart(2, '0');
-      const seconds = String(Math.floor((remainingMs % (1000 * 60)) / 1000)).padStart(2, '0');
-      tdTime.textContent = `${hours}:${minutes}:${seconds}`;
-    } else {
-      tdTime.textContent = "-";
-    }
+    countdownCells.push([tdTime, row.nextFundingTime]);
 
     tr.appendChild(tdSymbol);
     tr.appendChild(tdBinance);
@@ -143,38 +170,40 @@ function renderTable() {
     tr.appendChild(tdTime);
     bodyEl.appendChild(tr);
   });
-}
-
-// 최초 실행
-fetchGapData();
-
-// 정각 맞추기
-function scheduleFetch() {
-  const now = new Date();
-  const msToNextMinute = (60 - now.getSeconds()) * 1000 - now.getMilliseconds();
 
-  setTimeout(() => {
-    fetchGapData(); // 정각에 실행
-    setInterval(fetchGapData, 60000); // 이후 매 60초마다 실행
-  }, msToNextMinute);
+  updateCountdowns();
+}
 
-  // ✅ 다음 업데이트까지 남은 시간 카운트다운
-  let countdown = Math.ceil(msToNextMinute / 1000);
-  if (nextUpdateEl) {
-    nextUpdateEl.innerText = `다음 업데이트까지: ${countdown}초`;
-  }
-  const countdownTimer = setInterval(() => {
-    countdown--;
-    if (countdown <= 0) {
-      countdown = 60;
-    }
-    if (nextUpdateEl) {
-      nextUpdateEl.innerText = `다음 업데이트까지: ${countdown}초`;
+// 펀딩 카운트다운 셀만 갱신 (테이블 전체를 다시 그리지 않음)
+function updateCountdowns() {
+  const now = Date.now();
+  countdownCells.forEach(([td, nextFundingTime]) => {
+    if (nextFundingTime) {
+      let remainingMs = Math.max(nextFundingTime - now, 0);
+      const hours = String(Math.floor(remainingMs / (1000 * 60 * 60))).padStart(2, '0');
+      const minutes = String(Math.floor((remainingMs % (1000 * 60 * 60)) / (1000 * 60))).padStart(2, '0');
+      const seconds = String(Math.floor((remainingMs % (1000 * 60)) / 1000)).padStart(2, '0');
+      td.textContent = `${hours}:${minutes}:${seconds}`;
+    } else {
+      td.textContent = "-";
     }
-  }, 1000);
+  });
 }
 
-scheduleFetch();
+// 최초 연결
+connect();
+
+// ✅ 서버 갱신(매 분 55초)까지 남은 시간 카운트다운
+function updateNextRefresh() {
+  if (!nextUpdateEl) return;
+  const sec = new Date().getSeconds();
+  const countdown = sec < 55 ? 55 - sec : 115 - sec;
+  nextUpdateEl.innerText = `다음 업데이트까지: ${countdown}초`;
+}
 
 // 카운트다운은 매초 갱신 (펀딩 타이머용)
-setInterval(renderTable, 1000);
\ No newline at end of file
+setInterval(() => {
+  updateCountdowns();
+  updateNextRefresh();
+}, 1000);
+updateNextRefresh();
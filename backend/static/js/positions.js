@@ -1,5 +1,7 @@
 const protocol = window.location.protocol === "https:" ? "wss://" : "ws://";
 const ws = new WebSocket(protocol + window.location.host + "/ws/positions");
+ws.binaryType = "arraybuffer";  // 서버는 한 번 직렬화한 JSON 을 바이너리 프레임으로 보냄
+const decoder = new TextDecoder();
 
 ws.onopen = () => {
   document.getElementById("status").innerText = "✅ WebSocket 연결 성공";
@@ -9,7 +11,7 @@ ws.onmessage = (event) => {
   const body = document.getElementById("positions-body");
   body.innerHTML = "";
 
-  let data = JSON.parse(event.data);
+  let data = JSON.parse(typeof event.data === "string" ? event.data : decoder.decode(event.data));
   if (data.msg) {
     body.innerHTML = `<tr><td colspan="8" style="text-align:center; color:gray;">${data.msg}</td></tr>`;
     return;
@@ -5,6 +5,7 @@
 
   let ws;
   let reconnectDelay = 1000; // 1s → 최대 10s
+  const decoder = new TextDecoder(); // 서버는 한 번 직렬화한 JSON 을 바이너리 프레임으로 보냄
 
   function setStatus(type, text) {
     statusEl.className = "badge";
@@ -64,6 +65,7 @@
   function connect() {
     setStatus("warn", "연결 중...");
     ws = new WebSocket(WS_URL);
+    ws.binaryType = "arraybuffer";
 
     ws.onopen = () => {
       setStatus("ok", "연결됨");
@@ -72,7 +74,7 @@
 
     ws.onmessage = (event) => {
       try {
-        const data = JSON.parse(event.data);
+        const data = JSON.parse(typeof event.data === "string" ? event.data : decoder.decode(event.data));
         renderRows(data);
       } catch (e) {
         console.error("메시지 파싱 오류:", e);
@@ -0,0 +1,145 @@
+import asyncio, logging, os, time
+from backend import metrics, rate_limit
+
+# 마크프라이스 틱 끝에서 끝 지연 추적 (거래소 이벤트 시각 → 수신 → 상태 적용 → 클라이언트 전송)
+# - 수신: position_store.submit 시각, 적용: handler 가 마크를 바꾼 시각. 레코드에 (이벤트 ms, 수신 ns, 적용 ns) 로 붙는다
+# - 전송: flush 가 새로 적용된 틱 중 거래소별로 가장 오래된 것을 채널에 넘기고, 실제로 보낸 시각과 비교
+#   (합쳐져서 늦게 나간 틱일수록 크게 잡히도록 가장 오래된 것 기준)
+# - 거래소 이벤트 시각은 거래소 서버 시계라 CLOCK_SYNC_SEC 마다 잰 시계 차이(offset)를 빼고 비교한다
+# 모든 시각은 벽시계(epoch) 기준: 거래소 시각, ingest 프로세스와 웹 워커 사이에서도 비교 가능
+# 시계 차이는 ingest(또는 APP_ROLE=all) 프로세스만 재고, 웹 워커는 ingest 버스로 받는다 (거래소 요청은 한 곳에서)
+WS_TRACE_TIMESTAMPS = os.getenv("WS_TRACE_TIMESTAMPS", "false").lower() in ("1", "true", "yes")  # 행에 "ts" 포함
+CLOCK_SYNC_SEC = int(os.getenv("CLOCK_SYNC_SEC", "300"))
+CLOCK_SYNC_SAMPLES = 5    # 한 번 잴 때 요청 수 (왕복이 가장 짧은 값 사용)
+
+BINANCE_TIME_URL = "https://fapi.binance.com/fapi/v1/time"
+BITGET_TIME_URL = "https://api.bitget.com/api/v2/public/time"
+
+log = logging.getLogger("tick-trace")
+
+clock = {}             # {exchange: {"offset_ms", "rtt_ms", "at"}}  offset = 거래소 시계 - 로컬 시계
+listeners = []         # 시계 차이를 잴 때마다 listener(clock) 호출 (ingest 버스 발행)
+last_collect_ns = 0    # 직전 flush 시각 (그 뒤에 적용된 틱만 새 틱)
+
+latency_seconds = metrics.Histogram(
+    "tick_latency_seconds",
+    "마크 틱 단계별 지연: exchange_to_receive / receive_to_apply 는 틱마다, apply_to_send / total 은 클라이언트 전송마다",
+    ("exchange", "stage"),
+    (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+metrics.Collected(
+    "exchange_clock_offset_seconds", "거래소 서버 시계 - 로컬 시계",
+    lambda: {(e,): c["offset_ms"] / 1000 for e, c in clock.items()}, ("exchange",),
+)
+metrics.Collected(
+    "exchange_clock_rtt_seconds", "시계 차이를 잰 요청의 왕복 시간 (offset 오차 범위)",
+    lambda: {(e,): c["rtt_ms"] / 1000 for e, c in clock.items()}, ("exchange",),
+)
+
+
+def event_ns(exchange: str, event_ms) -> int:
+    """거래소 이벤트 시각(ms) → 로컬 시계 기준 ns"""
+    return int((float(event_ms) - clock.get(exchange, {}).get("offset_ms", 0)) * 1_000_000)
+
+
+def applied(exchange: str, event_ms, received_ns: int):
+    """handler 가 마크를 바꿀 때: 레코드에 붙일 trace 를 만들고 틱 단위 단계를 기록"""
+    now = time.time_ns()
+    if event_ms:
+        latency_seconds.observe(max(received_ns - event_ns(exchange, event_ms), 0) / 1e9, exchange, "exchange_to_receive")
+    latency_seconds.observe((now - received_ns) / 1e9, exchange, "receive_to_apply")
+    return (event_ms, received_ns, now)
+
+
+def collect(snapshot) -> dict:
+    """flush 마다: 직전 flush 이후 적용된 틱 중 거래소별로 가장 오래된 trace"""
+    global last_collect_ns
+    since, last_collect_ns = last_collect_ns, time.time_ns()
+    oldest = {}
+    for exchange, positions in (("binance", snapshot.binance_positions), ("bitget", snapshot.bitget_positions)):
+        for rec in positions.values():
+            trace = rec.trace
+            if trace is not None and trace[2] > since and (exchange not in oldest or trace[1] < oldest[exchange][1]):
+                oldest[exchange] = trace
+    return oldest
+
+
+def only(traces: dict, exchanges) -> dict:
+    return {e: traces[e] for e in exchanges if e in traces}
+
+
+def merge(pending, traces):
+    """아직 못 보낸 채널의 trace 에 새 trace 를 합침 (거래소별 오래된 쪽 유지)"""
+    if not pending:
+        return dict(traces) if traces else None
+    for exchange, trace in (traces or {}).items():
+        if exchange not in pending or trace[1] < pending[exchange][1]:
+            pending[exchange] = trace
+    return pending
+
+
+def sent(traces: dict):
+    """클라이언트에 프레임을 실제로 쓴 직후"""
+    now = time.time_ns()
+    for exchange, (event_ms, received_ns, applied_ns) in traces.items():
+        latency_seconds.observe((now - applied_ns) / 1e9, exchange, "apply_to_send")
+        start = event_ns(exchange, event_ms) if event_ms else received_ns
+        latency_seconds.observe(max(now - start, 0) / 1e9, exchange, "total")
+
+
+def row_stamps(trace) -> dict:
+    """WS_TRACE_TIMESTAMPS 일 때 행에 넣는 시각 (ms). 전송 시각은 클라이언트가 받은 시각과 비교"""
+    event_ms, received_ns, applied_ns = trace
+    return {"event": event_ms, "received": received_ns // 1_000_000, "applied": applied_ns // 1_000_000}
+
+
+# -----------------------------
+# 거래소 시계 차이
+# -----------------------------
+def binance_server_ms(body) -> int:
+    return int(body["serverTime"])
+
+
+def bitget_server_ms(body) -> int:
+    return int(body["data"]["serverTime"])
+
+
+async def measure_offset(client, url: str, parse, scheduler) -> dict:
+    """NTP 와 같은 방식: 요청 전후 시각의 중간을 서버 시각과 비교, 왕복이 가장 짧은 표본 사용.
+    요청마다 rate_limit 예산을 가장 낮은 우선순위로 받는다 (예산을 받은 뒤에 시각을 재서 대기는 안 섞임)"""
+    best = None
+    for _ in range(CLOCK_SYNC_SAMPLES):
+        await scheduler.acquire(1, rate_limit.BACKGROUND)
+        t0 = time.time_ns()
+        res = await client.get(url, timeout=3.0)
+        t1 = time.time_ns()
+        scheduler.observe(res.status_code, res.headers)
+        res.raise_for_status()
+        rtt_ms = (t1 - t0) / 1e6
+        if best is None or rtt_ms < best["rtt_ms"]:
+            best = {"offset_ms": parse(res.json()) - (t0 + t1) / 2e6, "rtt_ms": rtt_ms, "at": t1 // 1_000_000}
+    return best
+
+
+async def clock_sync_loop(get_http_client):
+    """get_http_client: update_task 의 공유 httpx 클라이언트"""
+    sources = {
+        "binance": (BINANCE_TIME_URL, binance_server_ms, rate_limit.binance),
+        "bitget": (BITGET_TIME_URL, bitget_server_ms, rate_limit.bitget),
+    }
+    while True:
+        for exchange, (url, parse, scheduler) in sources.items():
+            try:
+                clock[exchange] = await measure_offset(get_http_client(), url, parse, scheduler)
+            except Exception as e:
+                log.error(f"{exchange} 서버 시각 조회 실패: {e}")
+        for listener in listeners:
+            listener(clock)
+        log.info("⏱ 거래소 시계 차이 " + ", ".join(
+            f"{e}={c['offset_ms']:+.1f}ms (rtt {c['rtt_ms']:.1f}ms)" for e, c in clock.items()
+        ))
+        await asyncio.sleep(CLOCK_SYNC_SEC)
+
+
+def stats() -> dict:
+    return {e: {k: round(v, 2) for k, v in c.items()} for e, c in clock.items()}
@@ -0,0 +1,144 @@
+import asyncio, logging, math, os, time
+from decimal import Decimal, ROUND_DOWN
+from backend.exchange_clients import get_binance_client, get_bitget_client
+
+# 심볼별 주문 규칙 인덱스 (시작 시 로드, RULES_TTL_SEC 마다 백그라운드 갱신)
+# 주문마다 수백 KB 짜리 exchange_info / contracts 를 받아 선형 탐색하던 것을 dict 조회로 바꿈
+RULES_TTL_SEC = int(os.getenv("RULES_TTL_SEC", "3600"))
+
+log = logging.getLogger("trading-rules")
+
+rules = {"Binance": {}, "Bitget": {}}   # {exchange: {symbol: TradingRule}}
+loaded_at = {"Binance": 0.0, "Bitget": 0.0}
+refresh_locks = {"Binance": asyncio.Lock(), "Bitget": asyncio.Lock()}
+
+
+class TradingRule:
+    """수량/가격 단위와 최소 주문 조건 (모두 Decimal)"""
+    __slots__ = ("symbol", "step_size", "tick_size", "min_qty", "min_notional", "quantity_place")
+
+    def __init__(self, symbol, step_size, tick_size, min_qty, min_notional, quantity_place):
+        self.symbol = symbol
+        self.step_size = step_size
+        self.tick_size = tick_size
+        self.min_qty = min_qty
+        self.min_notional = min_notional
+        self.quantity_place = quantity_place
+
+    def quantity(self, usd_amount, price) -> Decimal:
+        """USDT 금액 → stepSize 단위로 내림한 수량"""
+        return quantize(Decimal(str(usd_amount)) / Decimal(str(price)), self.step_size)
+
+    def price(self, value) -> Decimal:
+        return quantize(value, self.tick_size)
+
+
+def quantize(value, step: Decimal) -> Decimal:
+    """step 의 배수로 내림 (float 나눗셈 오차 없이)"""
+    value = Decimal(str(value))
+    if not step:
+        return value
+    return (value / step).to_integral_value(rounding=ROUND_DOWN) * step
+
+
+def common_step(*steps) -> Decimal:
+    """여러 step 의 최소공배수: 이 단위의 배수면 모든 step 의 배수 (0 = 제한 없음은 건너뜀).
+    한 step 이 다른 step 을 나누지 않아도 (예: 0.003 / 0.002 → 0.006) 정확하게 정수로 계산"""
+    steps = [Decimal(str(s)).normalize() for s in steps if s]
+    if not steps:
+        return Decimal(0)
+    places = max(max(-s.as_tuple().exponent, 0) for s in steps)
+    return Decimal(math.lcm(*(int(s.scaleb(places)) for s in steps))).scaleb(-places)
+
+
+def to_str(value: Decimal) -> str:
+    """거래소 파라미터용 문자열 (지수 표기 없이)"""
+    return format(value.normalize(), "f")
+
+
+def places_to_step(places) -> Decimal:
+    return Decimal(1).scaleb(-int(places or 0))
+
+
+def parse_binance(info: dict) -> dict:
+    parsed = {}
+    for s in info["symbols"]:
+        filters = {f["filterType"]: f for f in s["filters"]}
+        lot = filters.get("LOT_SIZE", {})
+        price_filter = filters.get("PRICE_FILTER", {})
+        step = Decimal(lot.get("stepSize", "0"))
+        parsed[s["symbol"]] = TradingRule(
+            symbol=s["symbol"],
+            step_size=step,
+            tick_size=Decimal(price_filter.get("tickSize", "0")),
+            min_qty=Decimal(lot.get("minQty", "0")),
+            min_notional=Decimal(filters.get("MIN_NOTIONAL", {}).get("notional", "0")),
+            quantity_place=s.get("quantityPrecision", max(-step.normalize().as_tuple().exponent, 0)),
+        )
+    return parsed
+
+
+def parse_bitget(res: dict) -> dict:
+    parsed = {}
+    for s in res.get("data", []):
+        quantity_place = int(s.get("quantityPlace") or s.get("volumePlace", 0))
+        step = places_to_step(quantity_place)
+        if s.get("sizeMultiplier"):
+            step = max(step, Decimal(s["sizeMultiplier"]))
+        tick = places_to_step(s.get("pricePlace")) * Decimal(s.get("priceEndStep") or 1)
+        parsed[s["symbol"]] = TradingRule(
+            symbol=s["symbol"],
+            step_size=step,
+            tick_size=tick,
+            min_qty=Decimal(s.get("minTradeNum") or "0"),
+            min_notional=Decimal(s.get("minTradeUSDT") or "0"),
+            quantity_place=quantity_place,
+        )
+    return parsed
+
+
+async def fetch_binance() -> dict:
+    client = await get_binance_client()
+    return parse_binance(await client.futures_exchange_info())
+
+
+async def fetch_bitget() -> dict:
+    return parse_bitget(await get_bitget_client().mix_get_symbols_info("umcbl"))
+
+
+FETCHERS = {"Binance": fetch_binance, "Bitget": fetch_bitget}
+
+
+async def refresh(exchange: str, max_age: float = 0):
+    """규칙 다시 로드. 동시에 여러 주문이 요청해도 한 번만 받는다 (max_age 이내면 생략)"""
+    seen = loaded_at[exchange]
+    async with refresh_locks[exchange]:
+        # 락을 기다리는 동안 다른 요청이 이미 로드했으면 그 결과를 쓴다
+        if loaded_at[exchange] != seen:
+            return
+        if max_age and time.monotonic() - seen < max_age:
+            return
+        rules[exchange] = await FETCHERS[exchange]()
+        loaded_at[exchange] = time.monotonic()
+        log.info(f"📐 {exchange} 주문 규칙 {len(rules[exchange])}개 로드")
+
+
+async def get_rule(exchange: str, symbol: str) -> TradingRule:
+    """캐시된 규칙 반환. 없는 심볼(신규 상장 등)이면 짧은 간격으로 한 번 다시 로드"""
+    rule = rules[exchange].get(symbol)
+    if rule is None:
+        await refresh(exchange, max_age=60 if rules[exchange] else 0)
+        rule = rules[exchange].get(symbol)
+    if rule is None:
+        raise ValueError(f"{exchange} 심볼 규칙을 찾을 수 없습니다: {symbol}")
+    return rule
+
+
+async def refresh_loop():
+    """시작 시 로드 후 RULES_TTL_SEC 마다 갱신 (실패 시 이전 인덱스 유지)"""
+    while True:
+        results = await asyncio.gather(*(refresh(ex) for ex in FETCHERS), return_exceptions=True)
+        for exchange, result in zip(FETCHERS, results):
+            if isinstance(result, Exception):
+                log.error(f"{exchange} 주문 규칙 로드 실패: {result}")
+        await asyncio.sleep(RULES_TTL_SEC)
@@ -1,117 +1,355 @@
-import asyncio, httpx
-from datetime import datetime
+import asyncio, httpx, logging, os, time
+from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 from backend.database import SessionLocal
-from backend.models import FundingRate
-from sqlalchemy.future import select
+from backend.models import FundingRate, FundingRateHistory
+from backend import funding_cache, metrics, rate_limit
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 # Binance & Bitget API
 BINANCE_URL = "https://fapi.binance.com/fapi/v1/premiumIndex"
 BITGET_CONTRACTS_URL = "https://api.bitget.com/api/v2/mix/market/contracts"
 BITGET_FUNDING_URL   = "https://api.bitget.com/api/v2/mix/market/current-fund-rate"
 
+# 거래소별 요청 타임아웃(초): 55초에 시작해서 정각 전에 끝나야 하므로 짧게 잡는다
+BINANCE_TIMEOUT = 3.0
+BITGET_TIMEOUT = 3.0
+
+# 실시간 값은 live_funding WS 스트림이 채우고, 매 분 갱신은 그 값을 DB 에 배치로 저장만 한다.
+# REST 는 FUNDING_RECONCILE_SEC 마다(또는 스트림이 LIVE_STALE_SEC 넘게 조용하면) 대조용으로만 호출
+FUNDING_RECONCILE_SEC = int(os.getenv("FUNDING_RECONCILE_SEC", "600"))
+LIVE_STALE_SEC = 10
+last_rest = {}   # {exchange: 마지막 REST 조회 시각(monotonic)}
+
+log = logging.getLogger("funding-update")
+
+# 갱신 사이에 재사용하는 HTTP/2 커넥션 풀 (매번 TLS 핸드셰이크를 하지 않도록)
+http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """공유 AsyncClient 반환 (없거나 닫혔으면 새로 생성)"""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(5.0, connect=2.0),
+            limits=httpx.Limits(
+                max_connections=20,
+                max_keepalive_connections=10,
+                keepalive_expiry=120,
+            ),
+        )
+    return http_client
+
+
+async def close_http_client():
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+
+# dialect 별 INSERT ... ON CONFLICT 구문 (Postgres/asyncpg, SQLite/aiosqlite)
+UPSERT_INSERTS = {
+    "postgresql": pg_insert,
+    "sqlite": sqlite_insert,
+}
+
+
+# 한 문장에 넣는 행 수 (5열 × 150 = 750 바인드 파라미터, SQLite 3.32 이전의 999 제한 아래)
+UPSERT_CHUNK = 150
+
+
+def chunks(rows: list, size: int):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def dialect_insert(db):
+    dialect = db.get_bind().dialect.name
+    insert = UPSERT_INSERTS.get(dialect)
+    if insert is None:
+        raise RuntimeError(f"bulk upsert 를 지원하지 않는 DB 입니다: {dialect}")
+    return insert
+
+
+async def upsert_funding_rates(db, rows: list[dict]):
+    """한 거래소 스냅샷 전체를 (exchange, symbol) 기준 upsert 로 저장.
+    UPSERT_CHUNK 행씩 나눠 같은 트랜잭션에서 실행 (심볼 수가 늘어도 파라미터 수 제한을 넘지 않게)"""
+    if not rows:
+        return
+
+    insert = dialect_insert(db)
+    for chunk in chunks(rows, UPSERT_CHUNK):
+        stmt = insert(FundingRate).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["exchange", "symbol"],
+            set_={
+                "funding_rate": stmt.excluded.funding_rate,
+                "next_funding_time": stmt.excluded.next_funding_time,
+                "timestamp": stmt.excluded.timestamp,
+            },
+        )
+        await db.execute(stmt)
+
+
+# -----------------------------
+# 펀딩레이트 이력 (funding_rate_history, append-only)
+# -----------------------------
+history_partitions = set()  # 이미 만들어 둔 월 파티션 시작 시각 (Postgres 전용)
+
+
+def month_start(ts: datetime) -> datetime:
+    ts = ts.astimezone(timezone.utc)
+    return datetime(ts.year, ts.month, 1, tzinfo=timezone.utc)
+
+
+def next_month(start: datetime) -> datetime:
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+async def ensure_history_partitions(db, ts: datetime) -> list[datetime]:
+    """Postgres 에서 ts 가 속한 달과 다음 달 파티션을 미리 만들어 둔다 (SQLite 는 단일 테이블).
+    이번에 만든 파티션 시작 시각을 반환: 트랜잭션이 롤백되면 없어지므로 commit 뒤에 history_partitions 에 넣는다"""
+    created = []
+    if db.get_bind().dialect.name != "postgresql":
+        return created
+
+    start = month_start(ts)
+    for _ in range(2):
+        end = next_month(start)
+        if start not in history_partitions:
+            await db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS funding_rate_history_{start:%Y%m} "
+                f"PARTITION OF funding_rate_history "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+            created.append(start)
+        start = end
+    return created
+
+
+async def save_history(db, rows: list[dict]) -> list[datetime]:
+    """이번 갱신 스냅샷을 이력 테이블에 UPSERT_CHUNK 행씩 추가 (같은 ts 재저장은 무시).
+    새로 만든 파티션을 반환 (commit 성공 후 history_partitions 에 기록)"""
+    if not rows:
+        return []
+
+    created = await ensure_history_partitions(db, rows[0]["timestamp"])
+
+    insert = dialect_insert(db)
+    for chunk in chunks(rows, UPSERT_CHUNK):
+        stmt = insert(FundingRateHistory).values([
+            {
+                "exchange": r["exchange"],
+                "symbol": r["symbol"],
+                "ts": r["timestamp"],
+                "funding_rate": r["funding_rate"],
+                "next_funding_time": r["next_funding_time"],
+            }
+            for r in chunk
+        ])
+        await db.execute(stmt.on_conflict_do_nothing())
+    return created
+
 
 # -----------------------------
 # Binance: fundingRate + nextFundingTime
 # -----------------------------
-async def fetch_and_save_binance():
+async def fetch_binance(client: httpx.AsyncClient):
+    await rate_limit.binance.acquire(10)  # premiumIndex 전체 심볼 = weight 10
+    res = await client.get(BINANCE_URL)
+    rate_limit.binance.observe(res.status_code, res.headers)
+    res.raise_for_status()
+    return res
+
+
+def parse_binance(res: httpx.Response, now: datetime) -> list[dict]:
     kst = ZoneInfo("Asia/Seoul")
-    now = datetime.now(kst)
-
-    async with httpx.AsyncClient() as client:
-        res = await client.get(BINANCE_URL)
-        binance_data = res.json()
-
-    async with SessionLocal() as db:
-        for d in binance_data:
-            if d["symbol"].endswith("USDT"):
-                nft = datetime.fromtimestamp(int(d["nextFundingTime"]) // 1000, tz=kst)
-
-                existing = await db.execute(
-                    select(FundingRate).where(
-                        (FundingRate.symbol == d["symbol"]) &
-                        (FundingRate.exchange == "Binance")
-                    )
-                )
-                row = existing.scalars().first()
-
-                if row:
-                    row.funding_rate = float(d["lastFundingRate"])
-                    row.next_funding_time = nft
-                    row.timestamp = now
-                else:
-                    fr = FundingRate(
-                        symbol=d["symbol"],
-                        exchange="Binance",
-                        funding_rate=float(d["lastFundingRate"]),
-                        next_funding_time=nft,
-                        timestamp=now
-                    )
-                    db.add(fr)
-
-        await db.commit()
+    binance_data = res.json()
+
+    # 같은 심볼이 두 번 오면 ON CONFLICT 가 한 문장에서 같은 행을 두 번 건드리므로 심볼로 중복 제거
+    rows = {}
+    for d in binance_data:
+        if d["symbol"].endswith("USDT"):
+            nft = datetime.fromtimestamp(int(d["nextFundingTime"]) // 1000, tz=kst)
+            rows[d["symbol"]] = {
+                "symbol": d["symbol"],
+                "exchange": "Binance",
+                "funding_rate": float(d["lastFundingRate"]),
+                "next_funding_time": nft,
+                "timestamp": now,
+            }
+    return list(rows.values())
 
 
 # -----------------------------
 # Bitget: fundingRate + nextFundingTime (contracts + current-fund-rate)
 # -----------------------------
-async def fetch_and_save_bitget():
-    """매 분마다 실행: contracts 기준으로 실제 거래 가능한 심볼만 저장"""
+async def fetch_bitget(client: httpx.AsyncClient):
+    """contracts(거래 가능한 심볼) 와 current-fund-rate 를 동시에 요청"""
+    params = {"productType": "USDT-FUTURES"}
+    await rate_limit.bitget.acquire(2)   # 요청 2개
+    res_contracts, res_funding = await asyncio.gather(
+        client.get(BITGET_CONTRACTS_URL, params=params),
+        client.get(BITGET_FUNDING_URL, params=params),
+    )
+    rate_limit.bitget.observe(res_contracts.status_code, res_contracts.headers)
+    rate_limit.bitget.observe(res_funding.status_code, res_funding.headers)
+    res_contracts.raise_for_status()
+    res_funding.raise_for_status()
+    return res_contracts, res_funding
+
+
+def parse_bitget(responses, now: datetime) -> list[dict]:
+    """contracts 기준으로 실제 거래 가능한 심볼만 남김"""
     kst = ZoneInfo("Asia/Seoul")
-    now = datetime.now(kst)
+    res_contracts, res_funding = responses
 
-    async with httpx.AsyncClient() as client:
-        # 1) contracts: 실제 거래 가능한 심볼 목록
-        res_contracts = await client.get(
-            BITGET_CONTRACTS_URL,
-            params={"productType": "USDT-FUTURES"}
-        )
-        contracts_data = res_contracts.json().get("data", [])
-        valid_symbols = {c["symbol"] for c in contracts_data}
+    contracts_data = res_contracts.json().get("data", [])
+    valid_symbols = {c["symbol"] for c in contracts_data}
+    funding_data = res_funding.json().get("data", [])
 
-        # 2) current-fund-rate: 펀딩레이트 + nextFundingTime
-        res_funding = await client.get(
-            BITGET_FUNDING_URL,
-            params={"productType": "USDT-FUTURES"}
-        )
-        funding_data = res_funding.json().get("data", [])
+    rows = {}
+    for d in funding_data:
+        symbol = d["symbol"]
+        if symbol not in valid_symbols:
+            continue
 
-        async with SessionLocal() as db:
-            for d in funding_data:
-                symbol = d["symbol"]
-                if symbol not in valid_symbols:
-                    continue
-
-                funding_rate = float(d.get("fundingRate") or 0)
-
-                next_update_ms = d.get("nextUpdate")
-                nft = None
-                if next_update_ms:
-                    nft = datetime.fromtimestamp(int(next_update_ms) / 1000, tz=kst)
-
-                existing = await db.execute(
-                    select(FundingRate).where(
-                        (FundingRate.symbol == symbol) &
-                        (FundingRate.exchange == "Bitget")
-                    )
-                )
-                row = existing.scalars().first()
-
-                if row:
-                    row.funding_rate = funding_rate
-                    row.next_funding_time = nft
-                    row.timestamp = now
-                else:
-                    fr = FundingRate(
-                        symbol=symbol,
-                        exchange="Bitget",
-                        funding_rate=funding_rate,
-                        next_funding_time=nft,
-                        timestamp=now
-                    )
-                    db.add(fr)
+        funding_rate = float(d.get("fundingRate") or 0)
+
+        next_update_ms = d.get("nextUpdate")
+        nft = None
+        if next_update_ms:
+            nft = datetime.fromtimestamp(int(next_update_ms) / 1000, tz=kst)
+
+        rows[symbol] = {
+            "symbol": symbol,
+            "exchange": "Bitget",
+            "funding_rate": funding_rate,
+            "next_funding_time": nft,
+            "timestamp": now,
+        }
+    return list(rows.values())
+
+
+# 거래소 이름 → (fetch, parse, timeout)
+EXCHANGES = {
+    "Binance": (fetch_binance, parse_binance, BINANCE_TIMEOUT),
+    "Bitget": (fetch_bitget, parse_bitget, BITGET_TIMEOUT),
+}
+
+
+async def timed_fetch(name: str, client: httpx.AsyncClient, timings: dict):
+    fetch, _, timeout = EXCHANGES[name]
+    t0 = time.perf_counter()
+    try:
+        return await asyncio.wait_for(fetch(client), timeout)
+    finally:
+        timings[name]["network"] = time.perf_counter() - t0
 
+
+# -----------------------------
+# 한 번의 갱신: 모든 거래소 동시 조회 → 파싱 → 한 세션에 저장
+# -----------------------------
+def needs_rest(name: str) -> bool:
+    """스트림이 살아 있고 대조 주기가 안 됐으면 REST 생략"""
+    if not funding_cache.live_fresh(name, LIVE_STALE_SEC):
+        return True
+    return time.monotonic() - last_rest.get(name, 0) >= FUNDING_RECONCILE_SEC
+
+
+# timings 키 → /metrics phase 라벨
+METRIC_PHASES = {"network": "fetch", "parse": "parse", "db": "db", "history": "history", "total": "total"}
+
+
+def observe_timings(timings: dict):
+    """거래소별 fetch / parse, 공통 db / history / total 을 히스토그램에 기록"""
+    for name in EXCHANGES:
+        for key in ("network", "parse"):
+            if key in timings[name]:
+                metrics.refresh_seconds.observe(timings[name][key], name, METRIC_PHASES[key])
+    for key in ("db", "history", "total"):
+        if key in timings:
+            metrics.refresh_seconds.observe(timings[key], "all", METRIC_PHASES[key])
+
+
+async def refresh_funding_rates(force_rest: bool = False) -> dict:
+    """거래소 요청을 동시에 보내고 단계별(network / parse / db) 소요시간을 남긴다.
+    한 거래소가 실패/타임아웃 나도 나머지 거래소는 저장한다.
+    WS 스트림이 살아 있는 거래소는 REST 대신 실시간 테이블 값을 저장한다."""
+    now = datetime.now(ZoneInfo("Asia/Seoul"))
+    client = get_http_client()
+    started = time.perf_counter()
+    timings = {name: {} for name in EXCHANGES}
+
+    rest_names = [name for name in EXCHANGES if force_rest or needs_rest(name)]
+    results = await asyncio.gather(
+        *(timed_fetch(name, client, timings) for name in rest_names),
+        return_exceptions=True,
+    )
+
+    rows_by_exchange = {}
+    for name, result in zip(rest_names, results):
+        if isinstance(result, BaseException):
+            log.error(f"{name} 펀딩레이트 조회 실패: {result!r}")
+            continue
+        _, parse, _ = EXCHANGES[name]
+        t0 = time.perf_counter()
+        rows_by_exchange[name] = parse(result, now)
+        last_rest[name] = time.monotonic()
+        funding_cache.updated_at[name] = time.time()
+        timings[name]["parse"] = time.perf_counter() - t0
+        timings[name]["rows"] = len(rows_by_exchange[name])
+        timings[name]["source"] = "rest"
+
+    # 스트림 값은 이미 발행돼 있으므로 DB 저장만
+    live_by_exchange = {}
+    for name in EXCHANGES:
+        if name not in rest_names:
+            live_by_exchange[name] = funding_cache.live_rows(name, now)
+            timings[name]["rows"] = len(live_by_exchange[name])
+            timings[name]["source"] = "live"
+
+    t0 = time.perf_counter()
+    all_rows = {**live_by_exchange, **rows_by_exchange}
+    if any(all_rows.values()):
+        async with SessionLocal() as db:
+            for rows in all_rows.values():
+                await upsert_funding_rates(db, rows)
             await db.commit()
+            timings["db"] = time.perf_counter() - t0
+
+            # REST 로 받은 거래소만 API 스냅샷 교체 (실시간 값은 이미 반영됨)
+            if rows_by_exchange:
+                funding_cache.publish(rows_by_exchange)
+
+            # 이력 저장은 별도 트랜잭션: 실패해도 최신값 저장에는 영향 없음
+            t0 = time.perf_counter()
+            try:
+                created = await save_history(db, [r for rows in all_rows.values() for r in rows])
+                await db.commit()
+                history_partitions.update(created)
+            except Exception as e:
+                await db.rollback()
+                log.error(f"펀딩레이트 이력 저장 실패: {e}")
+            timings["history"] = time.perf_counter() - t0
+    timings["total"] = time.perf_counter() - started
+    observe_timings(timings)
+
+    detail = " | ".join(
+        f"{name}[{timings[name].get('source', '-')}] net={timings[name].get('network', 0):.3f}s "
+        f"parse={timings[name].get('parse', 0):.3f}s rows={timings[name].get('rows', 0)}"
+        for name in EXCHANGES
+    )
+    log.info(
+        f"펀딩레이트 갱신 {timings['total']:.3f}s | {detail} | "
+        f"db={timings.get('db', 0):.3f}s history={timings.get('history', 0):.3f}s"
+    )
+    return timings
 
 
 # -----------------------------
@@ -119,10 +357,9 @@ async def fetch_and_save_bitget():
 # -----------------------------
 async def update_loop():
     try:
-        await fetch_and_save_binance()
-        await fetch_and_save_bitget()
-    except Exception:
-        pass
+        await refresh_funding_rates(force_rest=True)
+    except Exception as e:
+        log.error(f"펀딩레이트 갱신 실패: {e}", exc_info=True)
 
     while True:
         now = datetime.now(ZoneInfo("Asia/Seoul"))
@@ -137,7 +374,6 @@ async def update_loop():
         await asyncio.sleep(sleep_seconds)
 
         try:
-            await fetch_and_save_binance()
-            await fetch_and_save_bitget()
-        except Exception:
-            pass
\ No newline at end of file
+            await refresh_funding_rates()
+        except Exception as e:
+            log.error(f"펀딩레이트 갱신 실패: {e}", exc_info=True)
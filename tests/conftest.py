@@ -0,0 +1,25 @@
+import os
+from collections import deque
+
+import pytest
+
+# backend.database 가 import 시점에 DATABASE_URL 을 요구한다 (테스트는 DB 에 연결하지 않음)
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+# 거래소 WS 라우터도 import 시점에 API 키를 확인한다 (테스트는 거래소에 연결하지 않음)
+for name in ("BINANCE_API_KEY", "BINANCE_API_SECRET", "BITGET_API_KEY", "BITGET_API_SECRET", "BITGET_API_PASS"):
+    os.environ.setdefault(name, "test")
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    """funding_cache 모듈 전역 상태를 테스트마다 비움 (다른 모듈 import 때 붙은 리스너도 떼어냄)"""
+    from backend import funding_cache
+
+    monkeypatch.setattr(funding_cache, "current", None)
+    monkeypatch.setattr(funding_cache, "version", 100)
+    monkeypatch.setattr(funding_cache, "deltas", deque())
+    monkeypatch.setattr(funding_cache, "delta_times", deque())
+    monkeypatch.setattr(funding_cache, "listeners", [])
+    monkeypatch.setattr(funding_cache, "live_pending", {})
+    monkeypatch.setattr(funding_cache, "live_seen", {})
+    monkeypatch.setattr(funding_cache, "updated_at", {})
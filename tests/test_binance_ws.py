@@ -0,0 +1,44 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from backend.routers import binance_ws
+
+
+@pytest.fixture
+def state(monkeypatch):
+    monkeypatch.setattr(binance_ws, "reconcile_requested", asyncio.Event())
+    monkeypatch.setattr(binance_ws, "symbols_changed", asyncio.Event())
+    monkeypatch.setattr(binance_ws, "subscribed_symbols", set())
+    monkeypatch.setattr(binance_ws, "hedge_mode_warned", False)
+    rec = binance_ws.position_record("PEPEUSDT", "100", "2.0", "0", "1.0", None, "cross", "2.5")
+    return SimpleNamespace(binance_positions={"PEPEUSDT": rec}, binance_marks={"PEPEUSDT": "2.5"})
+
+
+def test_account_update_applies_one_way_positions(state):
+    binance_ws.apply_account_update(state, [
+        {"s": "PEPEUSDT", "pa": "150", "ep": "2.0", "up": "0", "mt": "cross", "iw": "0", "ps": "BOTH"},
+        {"s": "DOGEUSDT", "pa": "-10", "ep": "0.1", "up": "0", "mt": "cross", "iw": "0", "ps": "BOTH"},
+    ])
+    rec = state.binance_positions["PEPEUSDT"]
+    assert rec.size == 150
+    assert rec.upl == pytest.approx(75)   # 기존 마크 유지
+    assert rec.liq == "1.0"
+    assert state.binance_positions["DOGEUSDT"].size == -10
+
+    binance_ws.apply_account_update(state, [{"s": "DOGEUSDT", "pa": "0", "ps": "BOTH"}])
+    assert "DOGEUSDT" not in state.binance_positions
+    assert not binance_ws.reconcile_requested.is_set()
+
+
+def test_account_update_ignores_hedge_mode_legs(state):
+    before = state.binance_positions["PEPEUSDT"]
+    binance_ws.apply_account_update(state, [
+        {"s": "PEPEUSDT", "pa": "0", "ep": "0", "up": "0", "ps": "SHORT"},
+        {"s": "PEPEUSDT", "pa": "300", "ep": "2.1", "up": "0", "ps": "LONG"},
+    ])
+    # 한 방향 이벤트가 심볼 키 포지션 / 마크를 덮어쓰거나 지우지 않고 REST 대조로 넘김
+    assert state.binance_positions["PEPEUSDT"] is before
+    assert state.binance_marks == {"PEPEUSDT": "2.5"}
+    assert binance_ws.reconcile_requested.is_set()
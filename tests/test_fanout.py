@@ -0,0 +1,73 @@
+import asyncio
+
+from backend import fanout
+
+
+class FakeWebSocket:
+    client = ("127.0.0.1", 50000)
+
+    def __init__(self):
+        self.sent = []
+        self.close_code = None
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_offers_are_conflated_to_latest_frame():
+    async def main():
+        ws = FakeWebSocket()
+        channel = fanout.attach(ws, "test")
+        for data in (b"1", b"2", b"3"):
+            channel.offer(data)
+        await settle()
+        fanout.detach(ws)
+        return ws, channel
+
+    ws, channel = asyncio.run(main())
+    assert ws.sent == [b"3"]
+    assert channel.conflated == 2
+    assert channel.frames_sent == 1
+
+
+def test_notices_go_out_in_order_before_state():
+    async def main():
+        ws = FakeWebSocket()
+        channel = fanout.attach(ws, "test")
+        channel.offer(b"state")
+        channel.notice(b"error-1")
+        channel.notice(b"error-2")
+        await settle()
+        fanout.detach(ws)
+        return ws
+
+    assert asyncio.run(main()).sent == [b"error-1", b"error-2", b"state"]
+
+
+def test_take_failure_closes_connection():
+    dropped = []
+
+    def take():
+        raise KeyError("broken state")
+
+    async def main():
+        ws = FakeWebSocket()
+        channel = fanout.attach(ws, "test", on_drop=lambda: dropped.append(True), take=take)
+        channel.offer()
+        await settle()
+        return ws, channel
+
+    ws, channel = asyncio.run(main())
+    assert ws.close_code == 1011
+    assert ws.sent == []
+    assert channel.closed
+    assert dropped == [True]
+    assert ws not in fanout.channels
@@ -0,0 +1,149 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from backend import funding_cache
+
+pytestmark = pytest.mark.usefixtures("fresh_cache")
+
+NFT = datetime(2026, 1, 1, 9, 0)
+
+
+def rest_row(symbol, rate):
+    return {"symbol": symbol, "funding_rate": rate, "next_funding_time": NFT}
+
+
+def test_build_gap_only_symbols_on_both_exchanges():
+    rates = {
+        "Binance": {"A": {"funding_rate": 0.3, "next_funding_time": "t"}, "B": {"funding_rate": 0.1, "next_funding_time": "t"}},
+        "Bitget": {"A": {"funding_rate": 0.1, "next_funding_time": "u"}},
+    }
+    (gap,) = funding_cache.build_gap(rates)
+    assert gap["symbol"] == "A"
+    assert gap["gap"] == pytest.approx(0.2)
+    assert gap["next_funding_time"] == "t"
+
+
+def test_publish_bumps_version_and_records_gap_delta():
+    first = funding_cache.publish({"Binance": [rest_row("A", 0.1), rest_row("B", 0.1)], "Bitget": [rest_row("A", 0.2), rest_row("B", 0.2)]})
+    assert first.version == 101
+    assert {row["symbol"] for row in funding_cache.deltas[-1]["changed"]} == {"A", "B"}
+
+    second = funding_cache.publish({"Bitget": [rest_row("A", 0.5)]})
+    assert second.version == 102
+    delta = funding_cache.deltas[-1]
+    assert [row["symbol"] for row in delta["changed"]] == ["A"]
+    assert delta["changed"][0]["bitget_rate"] == 0.5
+    assert delta["removed"] == ["B"]
+    # 이번에 안 가져온 거래소는 이전 값 유지
+    assert second.rates["Binance"] is first.rates["Binance"]
+
+
+def test_deltas_since():
+    funding_cache.publish({"Binance": [rest_row("A", 0.1)], "Bitget": [rest_row("A", 0.2)]})
+    funding_cache.publish({"Bitget": [rest_row("A", 0.3)]})
+    latest = funding_cache.current.version
+
+    assert funding_cache.deltas_since(latest) == []
+    assert [d["version"] for d in funding_cache.deltas_since(latest - 1)] == [latest]
+    assert [d["version"] for d in funding_cache.deltas_since(latest - 2)] == [latest - 1, latest]
+    # 보관 범위 밖 / 미래 버전이면 스냅샷부터
+    assert funding_cache.deltas_since(latest - 3) is None
+    assert funding_cache.deltas_since(latest + 1) is None
+
+
+def test_listeners_get_snapshot_and_delta():
+    seen = []
+    funding_cache.listeners.append(lambda snapshot, delta: seen.append((snapshot.version, delta["version"])))
+    snapshot = funding_cache.publish({"Binance": [rest_row("A", 0.1)], "Bitget": [rest_row("A", 0.2)]})
+    assert seen == [(snapshot.version, snapshot.version)]
+
+
+def test_etag_follows_view_content():
+    first = funding_cache.publish({"Binance": [rest_row("A", 0.1)], "Bitget": [rest_row("A", 0.2)]})
+    second = funding_cache.publish({"Bitget": [rest_row("A", 0.3)]})
+    assert second.etag("binance") == first.etag("binance")
+    assert second.etag("bitget") != first.etag("bitget")
+    assert second.etag("gap") != first.etag("gap")
+
+
+def test_unchanged_rest_rows_do_not_publish():
+    first = funding_cache.publish({"Binance": [rest_row("A", 0.1)], "Bitget": [rest_row("A", 0.2)]})
+    again = funding_cache.publish({"Binance": [rest_row("A", 0.1)], "Bitget": [rest_row("A", 0.2)]})
+    assert again is first
+    assert len(funding_cache.deltas) == 1
+
+
+def test_unchanged_views_reuse_encoded_body():
+    first = funding_cache.publish({"Binance": [rest_row("A", 0.1)], "Bitget": [rest_row("A", 0.2), rest_row("B", 0.2)]})
+    second = funding_cache.publish({"Bitget": [rest_row("A", 0.2), rest_row("B", 0.3)]})
+    assert second.views["binance"] is first.views["binance"]
+    # B 는 Bitget 에만 있어서 gap 은 그대로
+    assert second.views["gap"] is first.views["gap"]
+    assert second.views["bitget"] is not first.views["bitget"]
+
+
+def test_publish_live_merges_pending_rows():
+    funding_cache.publish({"Binance": [rest_row("A", 0.1)], "Bitget": [rest_row("A", 0.2)]})
+    assert funding_cache.publish_live() is None
+
+    funding_cache.update_live("Bitget", {"A": (0.2, NFT), "NEW": (0.9, NFT)})
+    assert funding_cache.publish_live() is None   # 값이 같거나 모르는 심볼이면 발행 안 함
+
+    before = funding_cache.current
+    funding_cache.update_live("Bitget", {"A": (0.4, NFT)})
+    snapshot = funding_cache.publish_live()
+    assert snapshot.version == before.version + 1
+    assert snapshot.rates["Bitget"]["A"]["funding_rate"] == 0.4
+    assert snapshot.rates["Binance"] is before.rates["Binance"]
+    assert funding_cache.live_pending == {}
+
+
+def test_deltas_expire_by_age(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(funding_cache.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(funding_cache, "DELTA_RETENTION_SEC", 60)
+    funding_cache.publish({"Binance": [rest_row("A", 0.1)], "Bitget": [rest_row("A", 0.2)]})
+    now[0] += 30
+    funding_cache.publish({"Bitget": [rest_row("A", 0.3)]})
+    now[0] += 40
+    funding_cache.publish({"Bitget": [rest_row("A", 0.4)]})
+    # 첫 델타만 60초를 넘김
+    assert len(funding_cache.deltas) == len(funding_cache.delta_times) == 2
+    assert funding_cache.deltas_since(funding_cache.current.version - 2) is not None
+    assert funding_cache.deltas_since(funding_cache.current.version - 3) is None
+
+
+def test_deltas_capped_by_count(monkeypatch):
+    monkeypatch.setattr(funding_cache, "MAX_DELTAS", 3)
+    funding_cache.publish({"Binance": [rest_row("A", 0.1)], "Bitget": [rest_row("A", 0.2)]})
+    for i in range(5):
+        funding_cache.publish({"Bitget": [rest_row("A", 0.3 + i)]})
+    assert [d["version"] for d in funding_cache.deltas] == [104, 105, 106]
+
+
+def test_replicate_drops_deltas_on_version_gap():
+    funding_cache.replicate(200, {"Binance": {}, "Bitget": {}})
+    funding_cache.replicate(201, {"Binance": {}, "Bitget": {"A": {}}})
+    assert [d["version"] for d in funding_cache.deltas] == [200, 201]
+    funding_cache.replicate(205, {"Binance": {}, "Bitget": {}})
+    assert [d["version"] for d in funding_cache.deltas] == [205]
+    assert funding_cache.deltas_since(201) is None
+
+
+def test_bitget_symbol_change_wakes_keepalive(monkeypatch):
+    from backend import live_funding
+
+    event = asyncio.Event()
+    monkeypatch.setattr(live_funding, "bitget_known", set())
+    monkeypatch.setattr(live_funding, "bitget_symbols_changed", event)
+    funding_cache.listeners.append(live_funding.on_snapshot)
+
+    funding_cache.publish({"Binance": [rest_row("A", 0.1)], "Bitget": [rest_row("A", 0.2)]})
+    assert event.is_set()
+    event.clear()
+    funding_cache.publish({"Bitget": [rest_row("A", 0.5)]})
+    assert not event.is_set()   # 값만 바뀐 건 구독과 무관
+    funding_cache.publish({"Bitget": [rest_row("A", 0.5), rest_row("B", 0.1)]})
+    assert event.is_set()
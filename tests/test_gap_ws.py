@@ -0,0 +1,46 @@
+import orjson
+
+from backend.routers.gap_ws import GapClient
+
+
+def row(symbol, gap):
+    return {"symbol": symbol, "gap": gap}
+
+
+def test_merge_keeps_latest_row_per_symbol():
+    client = GapClient()
+    client.merge({"version": 1, "changed": [row("A", 1), row("B", 1)], "removed": []})
+    client.merge({"version": 2, "changed": [row("A", 2)], "removed": ["B"]})
+    client.merge({"version": 3, "changed": [], "removed": ["C"]})
+
+    frame = orjson.loads(client.take())
+    assert frame["type"] == "delta"
+    assert frame["version"] == 3
+    assert frame["changed"] == [row("A", 2)]
+    assert sorted(frame["removed"]) == ["B", "C"]
+    assert client.take() is None
+
+
+def test_removed_symbol_that_comes_back_is_a_change():
+    client = GapClient()
+    client.merge({"version": 1, "changed": [], "removed": ["A"]})
+    client.merge({"version": 2, "changed": [row("A", 5)], "removed": []})
+    frame = orjson.loads(client.take())
+    assert frame["changed"] == [row("A", 5)]
+    assert frame["removed"] == []
+
+
+def test_snapshot_replaces_pending_delta(monkeypatch):
+    from backend import funding_cache
+
+    class Snapshot:
+        version = 7
+        gap = [row("A", 9)]
+
+    monkeypatch.setattr(funding_cache, "current", Snapshot())
+    client = GapClient()
+    client.needs_snapshot = True
+    client.merge({"version": 7, "changed": [row("A", 9)], "removed": []})
+
+    assert orjson.loads(client.take()) == {"type": "snapshot", "version": 7, "rows": [row("A", 9)]}
+    assert client.take() is None
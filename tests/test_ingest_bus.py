@@ -0,0 +1,100 @@
+from types import MappingProxyType, SimpleNamespace
+
+import orjson
+import pytest
+
+from backend import funding_cache, ingest_bus
+from backend.position_store import STATE_MAPS, PositionRecord, StoreSnapshot, apply_replica, snapshot_diff
+
+pytestmark = pytest.mark.usefixtures("fresh_cache")
+
+
+def snapshot(version, **maps):
+    return StoreSnapshot(version, **{name: MappingProxyType(value) for name, value in maps.items()})
+
+
+def replica_state():
+    return SimpleNamespace(**{name: {} for name in STATE_MAPS})
+
+
+def over_bus(frame: bytes) -> dict:
+    return orjson.loads(frame)
+
+
+def bitget_short(mark_raw=None):
+    return PositionRecord("PEPEUSDT_UMCBL", "PEPEUSDT", "short", "10", "4", sign=-1, mark_raw=mark_raw)
+
+
+def test_positions_replicate_over_bus():
+    rec = bitget_short("3")
+    key = ("PEPEUSDT_UMCBL", "short")
+    first = snapshot(1, bitget_positions={key: rec}, bitget_pos_to_base={key: "PEPEUSDT"}, binance_marks={"A": "1"})
+    st = replica_state()
+    apply_replica(st, over_bus(ingest_bus.positions_frame(StoreSnapshot(), first, reset=True)))
+
+    copy = st.bitget_positions[key]   # JSON 리스트 키 → 튜플 키
+    assert copy is not rec
+    assert (copy.side, copy.size, copy.mark_raw, copy.upl) == ("short", 10, "3", rec.upl)
+    assert st.bitget_pos_to_base == {key: "PEPEUSDT"}
+
+    # 같은 레코드 객체면 변경분에 안 실리고, 사라진 키는 지워짐
+    second = snapshot(2, bitget_positions={key: rec}, bitget_pos_to_base={key: "PEPEUSDT"}, binance_marks={"B": "2"})
+    diff = over_bus(ingest_bus.positions_frame(first, second))
+    assert diff["changed"] == {"binance_marks": [["B", "2"]]}
+    assert diff["removed"] == {"binance_marks": ["A"]}
+    apply_replica(st, diff)
+    assert st.binance_marks == {"B": "2"}
+    assert st.bitget_positions[key] is copy
+
+    assert ingest_bus.positions_frame(second, second) is None
+
+
+def test_positions_reset_replaces_replica_state():
+    st = replica_state()
+    st.binance_marks["STALE"] = "1"
+    st.bitget_positions[("X", "long")] = bitget_short()
+    fresh = snapshot(5, binance_marks={"A": "1"})
+    apply_replica(st, over_bus(ingest_bus.positions_frame(StoreSnapshot(), fresh, reset=True)))
+    assert st.binance_marks == {"A": "1"}
+    assert st.bitget_positions == {}
+
+
+def test_snapshot_diff_compares_records_by_identity():
+    rec = bitget_short("3")
+    prev = snapshot(1, binance_positions={"A": rec})
+    moved = snapshot(2, binance_positions={"A": rec.with_mark("2")})
+    (item,) = snapshot_diff(prev, moved)["changed"]["binance_positions"]
+    assert item[0] == "A"
+    assert PositionRecord(*item[1]).mark_raw == "2"
+
+
+def test_rates_diff():
+    row = {"symbol": "A", "funding_rate": 0.1}
+    prev = {"Binance": {"A": row, "B": {"symbol": "B", "funding_rate": 0.2}}}
+    rates = {"Binance": {"A": row, "C": {"symbol": "C", "funding_rate": 0.3}}, "Bitget": {}}
+    changed, removed = ingest_bus.rates_diff(prev, rates)
+    assert changed == {"Binance": {"C": {"symbol": "C", "funding_rate": 0.3}}}
+    assert removed == {"Binance": ["B"]}
+
+
+def test_funding_frames_replicate_versions():
+    rows = {"Binance": {"A": {"symbol": "A", "funding_rate": 0.1, "next_funding_time": None}},
+            "Bitget": {"A": {"symbol": "A", "funding_rate": 0.3, "next_funding_time": None}}}
+    published = funding_cache.FundingSnapshot(500, rows)
+    ingest_bus.apply_funding(over_bus(ingest_bus.funding_frame({}, published, reset=True)))
+    assert funding_cache.current.version == 500
+    assert funding_cache.current.rates == rows
+    assert funding_cache.current.gap[0]["gap"] == pytest.approx(-0.2)
+
+    moved = {**rows, "Bitget": {}}
+    ingest_bus.apply_funding(over_bus(ingest_bus.funding_frame(rows, funding_cache.FundingSnapshot(501, moved))))
+    assert funding_cache.current.version == 501
+    assert funding_cache.current.rates["Bitget"] == {}
+    assert funding_cache.current.rates["Binance"] == rows["Binance"]
+    assert [d["version"] for d in funding_cache.deltas] == [500, 501]
+    assert funding_cache.deltas[-1]["removed"] == ["A"]
+
+    # 재접속 후 reset 프레임: 이전 행은 버리고, 버전이 끊겼으니 이어받기 델타도 비움
+    ingest_bus.apply_funding(over_bus(ingest_bus.funding_frame({}, funding_cache.FundingSnapshot(900, {"Bitget": rows["Bitget"]}), reset=True)))
+    assert funding_cache.current.rates == {"Bitget": rows["Bitget"]}
+    assert [d["version"] for d in funding_cache.deltas] == [900]
@@ -0,0 +1,55 @@
+import pytest
+
+from backend import metrics
+
+
+@pytest.fixture(autouse=True)
+def empty_registry(monkeypatch):
+    """테스트 지표가 전역 /metrics 출력에 섞이지 않게"""
+    monkeypatch.setattr(metrics, "registry", [])
+
+
+def test_counter_labels_and_escaping():
+    counter = metrics.Counter("test_total", "help", ("stream",))
+    counter.inc("a")
+    counter.inc("a", amount=2)
+    counter.inc('say "hi"\n')
+    assert counter.render() == [
+        'arb_test_total{stream="a"} 3',
+        'arb_test_total{stream="say \\"hi\\"\\n"} 1',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("test_seconds", "help", ("kind",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 5):
+        histogram.observe(value, "x")
+    assert histogram.render() == [
+        'arb_test_seconds_bucket{kind="x",le="0.1"} 2',   # le 는 경계 포함
+        'arb_test_seconds_bucket{kind="x",le="1"} 3',
+        'arb_test_seconds_bucket{kind="x",le="+Inf"} 4',
+        'arb_test_seconds_sum{kind="x"} 5.65',
+        'arb_test_seconds_count{kind="x"} 4',
+    ]
+
+
+def test_collected_skips_missing_values():
+    gauge = metrics.Collected("test_age", "help", lambda: {("binance",): 1.5, ("bitget",): None}, ("exchange",))
+    assert gauge.render() == ['arb_test_age{exchange="binance"} 1.5']
+    assert metrics.Collected("test_clients", "help", lambda: 3).render() == ["arb_test_clients 3"]
+
+
+def test_render_reports_failed_collector():
+    def broken():
+        raise RuntimeError("down")
+
+    metrics.Collected("test_broken", "help", broken)
+    metrics.Counter("test_ok_total", "help").inc()
+    assert metrics.render().splitlines() == [
+        "# HELP arb_test_broken help",
+        "# TYPE arb_test_broken gauge",
+        "# arb_test_broken 수집 실패: down",
+        "# HELP arb_test_ok_total help",
+        "# TYPE arb_test_ok_total counter",
+        "arb_test_ok_total 1",
+    ]
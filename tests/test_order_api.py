@@ -0,0 +1,120 @@
+import asyncio
+import gc
+from decimal import Decimal
+
+import pytest
+
+from backend.routers import order_api
+from backend.trading_rules import TradingRule
+
+
+def rule(step):
+    return TradingRule("X", Decimal(step), Decimal("0.01"), Decimal("0"), Decimal("0"), 3)
+
+
+def test_arb_quantity_fits_both_steps():
+    quantity = order_api.arb_quantity(100, Decimal("1"), rule("0.003"), rule("0.002"))
+    # 두 step 이 서로 나누어떨어지지 않아도 공통 배수(0.006)로 내림
+    assert quantity == Decimal("99.996")
+    assert quantity % Decimal("0.003") == 0
+    assert quantity % Decimal("0.002") == 0
+
+
+def test_filled_quantity_uses_reported_fill():
+    async def poll():
+        raise AssertionError("체결 수량이 있으면 다시 조회하지 않음")
+
+    leg = {"fill": {"qty": "0.5"}}
+    assert asyncio.run(order_api.filled_quantity(leg, poll)) == Decimal("0.5")
+
+
+def test_filled_quantity_polls_when_fill_is_zero(monkeypatch):
+    monkeypatch.setattr(order_api, "UNWIND_POLL_SEC", 0)
+    answers = iter(["0", "0.25"])
+
+    async def poll():
+        return next(answers)
+
+    # "0" 은 문자열이라 truthy: 예전 `or qty` 대체가 통하지 않던 경우
+    leg = {"fill": {"qty": "0"}}
+    assert asyncio.run(order_api.filled_quantity(leg, poll)) == Decimal("0.25")
+
+
+def test_filled_quantity_raises_when_nothing_filled(monkeypatch):
+    monkeypatch.setattr(order_api, "UNWIND_POLL_SEC", 0)
+    calls = []
+
+    async def poll():
+        calls.append(1)
+        return None
+
+    with pytest.raises(ValueError):
+        asyncio.run(order_api.filled_quantity({"fill": {"error": "timeout"}}, poll))
+    assert len(calls) == order_api.UNWIND_POLLS
+
+
+def test_throttle_spaces_starts():
+    async def main():
+        throttle = order_api.OrderThrottle(concurrency=5, rate=20)
+        starts = []
+
+        async def run():
+            async with throttle:
+                starts.append(asyncio.get_running_loop().time())
+
+        await asyncio.gather(*(run() for _ in range(3)))
+        return starts
+
+    starts = asyncio.run(main())
+    assert starts[2] - starts[0] >= 2 * 0.05 * 0.9
+
+
+def test_throttle_releases_permit_when_cancelled_while_waiting():
+    async def main():
+        throttle = order_api.OrderThrottle(concurrency=1, rate=2)
+        async with throttle:
+            pass
+        reserved = throttle.next_start
+
+        async def waiter():
+            async with throttle:
+                pass
+
+        task = asyncio.create_task(waiter())
+        await asyncio.sleep(0.05)   # 시작 간격(0.5초) 대기 중
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return throttle, reserved
+
+    throttle, reserved = asyncio.run(main())
+    assert not throttle.semaphore.locked()
+    # 뒤에 예약한 요청이 없으니 예약한 자리도 반납
+    assert throttle.next_start == reserved
+
+
+def test_batch_orders_finish_after_client_disconnects(monkeypatch):
+    finished = []
+
+    async def fake_item(index, item):
+        await asyncio.sleep(0.01 * index)
+        finished.append(index)
+        return {"index": index, "status": "success"}
+
+    monkeypatch.setattr(order_api, "run_batch_item", fake_item)
+    req = order_api.BatchOrderRequest(orders=[
+        {"exchange": "binance", "symbol": "PEPEUSDT", "side": "BUY", "usdAmount": 10} for _ in range(5)
+    ])
+
+    async def main():
+        response = await order_api.batch_order(req)
+        stream = response.body_iterator
+        first = await stream.__anext__()
+        await stream.aclose()   # 클라이언트 끊김
+        gc.collect()
+        await asyncio.wait_for(asyncio.gather(*order_api.batch_tasks), 1)
+        return first
+
+    assert '"index": 0' in asyncio.run(main())
+    assert sorted(finished) == [0, 1, 2, 3, 4]
+    assert order_api.batch_tasks == set()
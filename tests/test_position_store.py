@@ -0,0 +1,49 @@
+import pytest
+
+from backend.position_store import PositionRecord, put_position, set_mark
+
+
+def long_position(**kwargs):
+    return PositionRecord("PEPEUSDT", "PEPEUSDT", "LONG", "100", "2.0", upl_raw="5", **kwargs)
+
+
+def test_upl_from_mark_or_exchange_value():
+    assert long_position().upl == "5"   # 마크가 없으면 거래소 UPL
+    assert long_position(mark_raw="2.5").upl == pytest.approx(50)
+    short = PositionRecord("X_UMCBL", "XUSDT", "short", "10", "4", sign=-1, mark_raw="3")
+    assert short.upl == pytest.approx(10)
+
+
+def test_with_mark_leaves_original_untouched():
+    rec = long_position(mark_raw="2.5")
+    rec.row = {"cached": True}
+    trace = (1, 2, 3)
+    moved = rec.with_mark("3.0", trace)
+    assert moved is not rec
+    assert moved.upl == pytest.approx(100)
+    assert moved.trace == trace
+    assert moved.row is None   # 포맷 캐시는 새로 만듦
+    assert rec.mark_raw == "2.5" and rec.upl == pytest.approx(50)
+    assert rec.row == {"cached": True}
+
+
+def test_set_mark_only_replaces_changed_records():
+    rec = long_position(mark_raw="2.5")
+    positions = {"A": rec, "B": long_position(mark_raw="2.0")}
+    set_mark(positions, ["A", "missing"], "2.5")
+    assert positions["A"] is rec
+    set_mark(positions, ["A"], "3.0")
+    assert positions["A"] is not rec
+    assert positions["A"].mark_raw == "3.0"
+    assert positions["B"].mark_raw == "2.0"
+
+
+def test_put_position_keeps_identical_record():
+    rec = long_position()
+    positions = {"A": rec}
+    put_position(positions, "A", long_position(mark_raw="9"))   # 마크는 비교 대상 아님
+    assert positions["A"] is rec
+    changed = PositionRecord("PEPEUSDT", "PEPEUSDT", "LONG", "200", "2.0", upl_raw="5")
+    put_position(positions, "A", changed)
+    assert positions["A"] is changed
+    assert not rec.same_position(None)
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from backend import rate_limit
+from backend.rate_limit import ACCOUNT, BACKGROUND, ORDER, RateLimitScheduler
+
+
+def test_order_jumps_ahead_of_background_when_budget_is_short():
+    async def main():
+        scheduler = RateLimitScheduler("test", capacity=20, window=1)
+        scheduler.tokens = 0
+        done = []
+
+        async def request(name, level):
+            await scheduler.acquire(1, level)
+            done.append(name)
+
+        background = asyncio.create_task(request("background", BACKGROUND))
+        await asyncio.sleep(0)   # 백그라운드가 먼저 줄을 섬
+        order = asyncio.create_task(request("order", ORDER))
+        await asyncio.gather(background, order)
+        return done
+
+    assert asyncio.run(main()) == ["order", "background"]
+
+
+def test_background_keeps_reserve_for_orders():
+    async def main():
+        scheduler = RateLimitScheduler("test", capacity=100, window=60)
+        scheduler.tokens = 20   # 백그라운드 예비분(25%) 아래
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.acquire(1, BACKGROUND), 0.05)
+        await asyncio.wait_for(scheduler.acquire(1, ACCOUNT), 0.05)
+        await asyncio.wait_for(scheduler.acquire(1, ORDER), 0.05)
+        return scheduler
+
+    scheduler = asyncio.run(main())
+    assert scheduler.granted == {ORDER: 1, ACCOUNT: 1, BACKGROUND: 0}
+    assert scheduler.waiters == []   # 취소된 요청은 대기열에서 빠짐
+
+
+def test_priority_context():
+    assert rate_limit.current_priority.get() == BACKGROUND
+    with rate_limit.priority(ORDER):
+        assert rate_limit.current_priority.get() == ORDER
+    assert rate_limit.current_priority.get() == BACKGROUND
+
+
+def test_used_weight_header_counts_against_full_limit():
+    scheduler = RateLimitScheduler("test", capacity=2400, window=60, used_weight_header="X-MBX-USED-WEIGHT-1M")
+    scheduler.set_share(0.5)
+    scheduler.observe(200, {"X-MBX-USED-WEIGHT-1M": "2000"})
+    # 다른 프로세스 사용량까지 포함된 값이라 IP 전체 한도에서 뺀 만큼만 남음
+    assert scheduler.tokens == pytest.approx(400, abs=1)
+
+
+def test_429_pauses_all_requests():
+    scheduler = RateLimitScheduler("test", capacity=10, window=1)
+    scheduler.observe(429, {"Retry-After": "3"})
+    stats = scheduler.stats()
+    assert stats["rate_limited"] == 1
+    assert 2 < stats["paused_for_sec"] <= 3
+    assert scheduler.tokens < 1
+
+
+def test_split_for_processes(monkeypatch):
+    schedulers = {"A": RateLimitScheduler("A", 2400, 60), "B": RateLimitScheduler("B", 20, 1)}
+    monkeypatch.setattr(rate_limit, "schedulers", schedulers)
+    monkeypatch.setattr(rate_limit, "WEB_CONCURRENCY", 3)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_SHARE", None)
+    rate_limit.split_for_processes()
+    assert schedulers["A"].capacity == 600
+    assert schedulers["B"].capacity == 5
+    assert schedulers["B"].refill_rate == 5
+
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_SHARE", "0.5")
+    rate_limit.split_for_processes()
+    assert schedulers["A"].capacity == 1200
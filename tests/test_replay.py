@@ -0,0 +1,31 @@
+import asyncio, gzip
+
+import orjson
+import pytest
+
+from backend import replay
+from backend.position_store import store
+
+
+def write_recording(path, frames):
+    with gzip.open(path, "wb") as f:
+        for i, (source, payload) in enumerate(frames):
+            f.write(orjson.dumps([1_000_000_000 + i * 1_000_000, source, orjson.dumps(payload).decode()]) + b"\n")
+
+
+def test_recorded_marks_move_positions_from_rest_snapshot(tmp_path):
+    pos = {"symbol": "PEPEUSDT", "positionAmt": "100", "entryPrice": "2.0",
+           "unRealizedProfit": "0", "liquidationPrice": "1.0"}
+    path = tmp_path / "frames-test.ndjson.gz"
+    write_recording(path, [
+        ("binance_positions", {"PEPEUSDT": [pos, None, "cross"]}),
+        ("binance_marks", {"stream": "pepeusdt@markPrice", "data": {
+            "e": "markPriceUpdate", "E": 1700000000000, "s": "PEPEUSDT", "p": "2.5"}}),
+    ])
+
+    result = asyncio.run(replay.replay([str(path)], 0))
+    assert result["errors"] == {}
+    assert result["frames"] == {"binance_positions": 1, "binance_marks": 1}
+    rec = store.snapshot.binance_positions["PEPEUSDT"]
+    assert rec.mark_raw == "2.5"
+    assert rec.upl == pytest.approx(50)
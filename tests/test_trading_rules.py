@@ -0,0 +1,73 @@
+from decimal import Decimal
+
+from backend import trading_rules
+from backend.trading_rules import TradingRule, quantize, to_str
+
+
+def test_quantize_floors_to_step_without_float_error():
+    assert quantize("0.3", Decimal("0.1")) == Decimal("0.3")
+    assert quantize(0.1 + 0.2, Decimal("0.1")) == Decimal("0.3")
+    assert quantize("1.999", Decimal("0.01")) == Decimal("1.99")
+    assert quantize("7", Decimal("5")) == Decimal("5")
+
+
+def test_quantize_without_step_keeps_value():
+    assert quantize("1.2345", Decimal("0")) == Decimal("1.2345")
+
+
+def test_to_str_never_uses_exponent():
+    assert to_str(Decimal("0.00001")) == "0.00001"
+    assert to_str(Decimal("1E+2")) == "100"
+    assert to_str(Decimal("1.500")) == "1.5"
+
+
+def test_rule_quantity_and_price():
+    rule = TradingRule("BTCUSDT", Decimal("0.001"), Decimal("0.1"), Decimal("0.001"), Decimal("5"), 3)
+    assert rule.quantity(100, "65000") == Decimal("0.001")
+    assert rule.quantity("1000", Decimal("3")) == Decimal("333.333")
+    assert rule.price("65000.17") == Decimal("65000.1")
+
+
+def test_parse_binance_filters():
+    info = {"symbols": [{
+        "symbol": "ETHUSDT",
+        "quantityPrecision": 3,
+        "filters": [
+            {"filterType": "LOT_SIZE", "stepSize": "0.001", "minQty": "0.001"},
+            {"filterType": "PRICE_FILTER", "tickSize": "0.01"},
+            {"filterType": "MIN_NOTIONAL", "notional": "20"},
+        ],
+    }]}
+    rule = trading_rules.parse_binance(info)["ETHUSDT"]
+    assert (rule.step_size, rule.tick_size, rule.min_qty, rule.min_notional) == (
+        Decimal("0.001"), Decimal("0.01"), Decimal("0.001"), Decimal("20"),
+    )
+    assert rule.quantity_place == 3
+
+
+def test_parse_bitget_places_and_multiplier():
+    res = {"data": [{
+        "symbol": "ETHUSDT_UMCBL",
+        "volumePlace": "2",
+        "sizeMultiplier": "0.1",
+        "pricePlace": "2",
+        "priceEndStep": "5",
+        "minTradeNum": "0.1",
+        "minTradeUSDT": "5",
+    }]}
+    rule = trading_rules.parse_bitget(res)["ETHUSDT_UMCBL"]
+    # 소수점 2자리보다 sizeMultiplier 가 크면 그 단위
+    assert rule.step_size == Decimal("0.1")
+    assert rule.tick_size == Decimal("0.05")
+    assert rule.min_qty == Decimal("0.1")
+    assert rule.min_notional == Decimal("5")
+
+
+def test_common_step_is_lcm_of_steps():
+    common = trading_rules.common_step
+    assert common(Decimal("0.001"), Decimal("0.01")) == Decimal("0.01")
+    assert common(Decimal("0.003"), Decimal("0.002")) == Decimal("0.006")
+    assert common(Decimal("0.6"), Decimal("0.4")) == Decimal("1.2")
+    assert common(Decimal("10"), Decimal("0.4")) == Decimal("10")
+    assert common(Decimal("0"), Decimal("0.1")) == Decimal("0.1")
+    assert common() == Decimal("0")
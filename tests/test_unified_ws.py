@@ -0,0 +1,36 @@
+import pytest
+
+from backend import fanout
+from backend.routers.unified_ws import SUBSCRIBE_MAX_SYMBOLS, parse_subscribe
+
+
+def test_parse_subscribe_normalises_filters():
+    exchanges, symbols, max_hz = parse_subscribe({"op": "subscribe", "exchanges": ["Binance"], "symbols": ["pepeusdt"], "max_hz": 2})
+    assert exchanges == {"binance"}
+    assert symbols == {"PEPEUSDT"}
+    assert max_hz == 2
+
+
+def test_parse_subscribe_defaults_to_everything():
+    assert parse_subscribe({"op": "subscribe"}) == (set(), set(), None)
+
+
+def test_parse_subscribe_caps_max_hz_at_broadcast_rate():
+    assert parse_subscribe({"max_hz": fanout.BROADCAST_MAX_HZ})[2] == 0
+
+
+@pytest.mark.parametrize("msg", [
+    {"exchanges": "binance"},
+    {"exchanges": ["okx"]},
+    {"symbols": [1, 2]},
+    {"symbols": [f"S{i}" for i in range(SUBSCRIBE_MAX_SYMBOLS + 1)]},
+    {"max_hz": 0},
+    {"max_hz": -1},
+    {"max_hz": True},
+    {"max_hz": "5"},
+    {"max_hz": float("nan")},
+    {"max_hz": float("inf")},
+])
+def test_parse_subscribe_rejects_bad_messages(msg):
+    with pytest.raises(ValueError):
+        parse_subscribe(msg)
@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+from datetime import datetime, timezone
+
+from backend import update_task
+
+
+class FakeDb:
+    """dialect 이름과 실행한 문장만 기록하는 세션 대역"""
+
+    def __init__(self, dialect: str):
+        self.dialect = SimpleNamespace(name=dialect)
+        self.statements = []
+
+    def get_bind(self):
+        return self
+
+    async def execute(self, stmt):
+        self.statements.append(str(stmt))
+
+
+def test_month_boundaries():
+    assert update_task.month_start(datetime(2026, 3, 17, 5, tzinfo=timezone.utc)) == datetime(2026, 3, 1, tzinfo=timezone.utc)
+    assert update_task.next_month(datetime(2026, 12, 1, tzinfo=timezone.utc)) == datetime(2027, 1, 1, tzinfo=timezone.utc)
+
+
+def test_partitions_are_returned_not_cached(monkeypatch):
+    monkeypatch.setattr(update_task, "history_partitions", set())
+    db = FakeDb("postgresql")
+    created = asyncio.run(update_task.ensure_history_partitions(db, datetime(2026, 12, 20, tzinfo=timezone.utc)))
+
+    assert created == [datetime(2026, 12, 1, tzinfo=timezone.utc), datetime(2027, 1, 1, tzinfo=timezone.utc)]
+    assert "funding_rate_history_202612" in db.statements[0]
+    assert "funding_rate_history_202701" in db.statements[1]
+    # commit 전이라 캐시에는 아직 없음 (롤백되면 다시 만들어야 함)
+    assert update_task.history_partitions == set()
+
+
+def test_cached_partitions_are_skipped(monkeypatch):
+    monkeypatch.setattr(update_task, "history_partitions", {datetime(2026, 12, 1, tzinfo=timezone.utc)})
+    db = FakeDb("postgresql")
+    created = asyncio.run(update_task.ensure_history_partitions(db, datetime(2026, 12, 20, tzinfo=timezone.utc)))
+    assert created == [datetime(2027, 1, 1, tzinfo=timezone.utc)]
+    assert len(db.statements) == 1
+
+
+def test_sqlite_has_no_partitions():
+    db = FakeDb("sqlite")
+    assert asyncio.run(update_task.ensure_history_partitions(db, datetime(2026, 1, 1, tzinfo=timezone.utc))) == []
+    assert db.statements == []
+
+
+def funding_row(symbol, rate, now):
+    return {"symbol": symbol, "exchange": "Binance", "funding_rate": rate, "next_funding_time": now, "timestamp": now}
+
+
+def test_upsert_funding_rates_on_sqlite():
+    from sqlalchemy import func, select
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.pool import StaticPool
+    from backend.database import Base
+    from backend.models import FundingRate
+
+    statements = []
+
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        async with AsyncSession(engine) as db:
+            execute = db.execute
+
+            async def counted(stmt, *args, **kwargs):
+                statements.append(stmt)
+                return await execute(stmt, *args, **kwargs)
+
+            db.execute = counted
+            # 5열 × 400행 = 2000 파라미터: 한 문장이면 옛 SQLite 의 999 제한을 넘는다
+            await update_task.upsert_funding_rates(db, [funding_row(f"S{i}", 0.1, now) for i in range(400)])
+            await update_task.upsert_funding_rates(db, [funding_row("S0", 0.5, now), funding_row("NEW", 0.2, now)])
+            await db.commit()
+            db.execute = execute
+            count = await db.scalar(select(func.count()).select_from(FundingRate))
+            updated = await db.scalar(select(FundingRate.funding_rate).where(FundingRate.symbol == "S0"))
+        await engine.dispose()
+        return count, updated
+
+    assert asyncio.run(main()) == (401, 0.5)
+    assert len(statements) == 4   # UPSERT_CHUNK(150) 씩 150 + 150 + 100, 그리고 2행
+
+
+def test_save_history_is_chunked():
+    db = FakeDb("sqlite")
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    rows = [funding_row(f"S{i}", 0.1, now) for i in range(update_task.UPSERT_CHUNK + 1)]
+    assert asyncio.run(update_task.save_history(db, rows)) == []
+    assert len(db.statements) == 2